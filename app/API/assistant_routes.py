@@ -0,0 +1,108 @@
+import json
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from app.Core.config import settings
+from app.Database.db import get_async_read_db, get_read_db
+from app.Services.LLMService import LLMService
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+STREAM_ERROR_DETAIL = "Falha ao gerar a resposta, tente novamente"
+
+class AssistantRequest(BaseModel):
+    message: str
+    category_id: Optional[int] = None
+    top_k: int = Field(5, ge=0, le=50)  # 0 desativa a recuperação de contexto
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def answer(payload: AssistantRequest, db: Session = Depends(get_read_db)):
+    response = LLMService.generate_response(db, payload.message, top_k=payload.top_k, category_id=payload.category_id)
+    return {"answer": response}
+
+async def answer_async(payload: AssistantRequest, db: AsyncSession = Depends(get_async_read_db)):
+    response = await LLMService.agenerate_response(db, payload.message, top_k=payload.top_k, category_id=payload.category_id)
+    return {"answer": response}
+
+def stream_answer(payload: AssistantRequest, request: Request, db: Session = Depends(get_read_db)):
+    # A recuperação roda antes do streaming, enquanto a sessão do banco ainda está aberta
+    messages = LLMService.build_rag_messages(db, payload.message, top_k=payload.top_k, category_id=payload.category_id)
+
+    async def event_source():
+        chat = None
+        try:
+            # Dentro do try: a chamada inclui a espera do rate limit e os retries do gateway
+            chat = await run_in_threadpool(LLMService.stream_chat, messages)
+            tokens = iter(chat)
+            while True:
+                if await request.is_disconnected():
+                    return
+                delta = await run_in_threadpool(next, tokens, None)
+                if delta is None:
+                    break
+                yield _sse({"delta": delta})
+            yield _sse({"time_to_first_token_ms": _ms(chat.time_to_first_token)}, event="done")
+        except Exception:
+            logger.exception("Falha no streaming da resposta do assistente")
+            yield _sse({"detail": STREAM_ERROR_DETAIL}, event="error")
+        finally:
+            # Também executado quando o cliente desconecta: aborta a geração na OpenAI
+            if chat is not None:
+                chat.close()
+
+    return _event_stream(event_source())
+
+async def stream_answer_async(payload: AssistantRequest, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    messages = await LLMService.abuild_rag_messages(db, payload.message, top_k=payload.top_k, category_id=payload.category_id)
+
+    async def event_source():
+        stats = {}
+        tokens = LLMService.astream_chat(messages, stats)
+        try:
+            async for delta in tokens:
+                if await request.is_disconnected():
+                    return
+                yield _sse({"delta": delta})
+            yield _sse({"time_to_first_token_ms": _ms(stats.get("time_to_first_token"))}, event="done")
+        except Exception:
+            logger.exception("Falha no streaming da resposta do assistente")
+            yield _sse({"detail": STREAM_ERROR_DETAIL}, event="error")
+        finally:
+            # Também executado quando o cliente desconecta: aborta a geração na OpenAI
+            await tokens.aclose()
+
+    return _event_stream(event_source())
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+def _event_stream(source) -> StreamingResponse:
+    return StreamingResponse(
+        source,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# No modo assíncrono as rotas ligadas ao LLM não ocupam threads do threadpool
+router.add_api_route(
+    "/answer", answer_async if settings.ASYNC_MODE else answer,
+    methods=["POST"], summary="Responder pergunta com IA (RAG)",
+)
+router.add_api_route(
+    "/stream", stream_answer_async if settings.ASYNC_MODE else stream_answer,
+    methods=["POST"], summary="Responder pergunta com IA (RAG) via Server-Sent Events",
+)
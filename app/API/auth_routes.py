@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-from app.Database.db import get_db
+from app.Core.config import settings
+from app.Database.db import get_async_db, get_db
 from app.Services.AuthService import AuthService
 from app.Services.UserService import UserService
+from app.Services.UserPrincipalCache import UserPrincipal, user_cache
 
 router = APIRouter()
 
@@ -37,29 +40,38 @@ def get_current_user(token: str = Depends(AuthService.verify_token), db: Session
     user_id = token.get("sub")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuário não encontrado")
-    user = UserService.get_user_by_id(db, int(user_id))
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não existe")
-    return user
+
+    # Ordem: dados assinados no token (se habilitado) -> cache -> banco
+    principal = AuthService.principal_from_claims(token)
+    if principal is None and settings.USER_CACHE_ENABLED:
+        principal = user_cache.get(int(user_id))
+    if principal is None:
+        user = UserService.get_user_by_id(db, int(user_id))
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não existe")
+        principal = UserPrincipal.from_user(user)
+        if settings.USER_CACHE_ENABLED:
+            user_cache.set(principal)
+    return principal
 
 @router.post("/register", summary="Registrar novo usuário")
-def register_user(payload: RegisterRequest, db: Session = Depends(get_db)):
-    if UserService.get_user_by_email(db, payload.email):
+async def register_user(payload: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    if await db.run_sync(UserService.get_user_by_email, payload.email):
         raise HTTPException(status_code=400, detail="Email já cadastrado")
 
-    hashed_password = AuthService.hash_password(payload.password)
-    user = UserService.create_user(db, payload.full_name, payload.email, hashed_password, payload.role)
+    hashed_password = await AuthService.ahash_password(payload.password)
+    user = await db.run_sync(UserService.create_user, payload.full_name, payload.email, hashed_password, payload.role)
 
     return {"message": "Usuário criado com sucesso", "id": user.id, "email": user.email}
 
 
 @router.post("/login", response_model=TokenResponse, summary="Fazer login")
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = AuthService.authenticate_user(db, payload.email, payload.password)
+async def login(payload: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await AuthService.aauthenticate_user(db, payload.email, payload.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciais inválidas")
 
-    token = AuthService.create_access_token({"sub": str(user.id), "email": user.email})
+    token = AuthService.create_access_token(AuthService.principal_claims(user))
     return {"access_token": token, "token_type": "bearer"}
 
 
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-from app.Database.db import get_db
+from app.Database.db import get_async_read_db, get_db
 from app.Services.CategoryService import CategoryService
+from app.Services.EmbeddingQueueService import EmbeddingQueueService, QueueUnavailable
 
 router = APIRouter()
 class CategoryCreateRequest(BaseModel):
@@ -16,6 +18,7 @@ class CategoryUpdateRequest(BaseModel):
 
 class ContextAddRequest(BaseModel):
     context_text: str
+    source: Optional[str] = None  # nome do documento; reenviar atualiza só os chunks alterados
 
 class CategoryResponse(BaseModel):
     id: int
@@ -30,10 +33,10 @@ def create_category(payload: CategoryCreateRequest, db: Session = Depends(get_db
     return category
 
 @router.get("/", response_model=List[CategoryResponse], summary="Listar categorias")
-def list_categories(db: Session = Depends(get_db)):
-    return CategoryService.list_categories(db)
+async def list_categories(db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(CategoryService.list_categories)
 
-@router.put("/{category_id}", response_model=CategoryResponse, summary="Atualizar nome e/ou adicionar contexto")
+@router.put("/{category_id}", response_model=CategoryResponse, summary="Atualizar nome e/ou o contexto principal")
 def update_category(category_id: int, payload: CategoryUpdateRequest, db: Session = Depends(get_db)):
     category = CategoryService.update_category(db, category_id, payload.name, payload.context_text)
     if not category:
@@ -42,10 +45,20 @@ def update_category(category_id: int, payload: CategoryUpdateRequest, db: Sessio
 
 @router.post("/{category_id}/context", summary="Adicionar contexto extra à categoria")
 def add_context(category_id: int, payload: ContextAddRequest, db: Session = Depends(get_db)):
-    result = CategoryService.add_context_to_category(db, category_id, payload.context_text)
+    result = CategoryService.add_context_to_category(db, category_id, payload.context_text, payload.source)
     if not result:
         raise HTTPException(status_code=404, detail="Categoria não encontrada")
-    return {"message": "Contexto adicionado com sucesso"}
+    return result
+
+@router.get("/context-jobs/{job_id}", summary="Status do processamento de contexto enfileirado")
+def get_context_job(job_id: str):
+    try:
+        job = EmbeddingQueueService.get_job_status(job_id)
+    except QueueUnavailable:
+        raise HTTPException(status_code=503, detail="Fila de processamento indisponível", headers={"Retry-After": "5"})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return {"job_id": job_id, **job}
 
 @router.delete("/{category_id}", summary="Excluir categoria")
 def delete_category(category_id: int, db: Session = Depends(get_db)):
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.Database.db import get_async_read_db
+from app.Services.DashboardService import DashboardService
+
+router = APIRouter()
+
+
+@router.get("/summary", summary="Tickets abertos/fechados por status, categoria, prioridade e responsável")
+async def get_summary(db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(DashboardService.get_summary)
+
+@router.get("/series", summary="Tickets criados e resolvidos por período")
+async def get_series(
+    bucket: str = Query("day", pattern="^(day|week|month)$"),
+    days: int = Query(30, ge=1, le=366, description="Janela em dias até hoje"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    return await db.run_sync(DashboardService.get_series, bucket, days)
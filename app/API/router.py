@@ -3,6 +3,9 @@ from app.API.auth_routes import router as auth_router
 from app.API.user_routes import router as user_router
 from app.API.category_routes import router as category_router
 from app.API.ticket_routes import router as ticket_router
+from app.API.assistant_routes import router as assistant_router
+from app.API.dashboard_routes import router as dashboard_router
+from app.API.search_routes import router as search_router
 
 api_router = APIRouter()
 
@@ -10,3 +13,6 @@ api_router.include_router(auth_router, prefix="/auth", tags=["Auth"])
 api_router.include_router(user_router, prefix="/users", tags=["Users"])
 api_router.include_router(category_router, prefix="/categories", tags=["Categories"])
 api_router.include_router(ticket_router, prefix="/tickets", tags=["Tickets"])
+api_router.include_router(assistant_router, prefix="/assistant", tags=["Assistant"])
+api_router.include_router(dashboard_router, prefix="/dashboard", tags=["Dashboard"])
+api_router.include_router(search_router, prefix="/search", tags=["Search"])
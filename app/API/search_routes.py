@@ -0,0 +1,20 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.Core.config import settings
+from app.Database.db import get_async_read_db
+from app.Services.SearchService import SearchService
+
+router = APIRouter()
+
+
+@router.get("/", summary="Busca híbrida (palavras-chave + semântica) em tickets e base de conhecimento")
+async def search(
+    q: str = Query(..., min_length=1, max_length=500, description="Texto livre; aceita \"frase exata\", OR e -termo"),
+    scope: str = Query("all", pattern="^(all|tickets|context)$"),
+    status: Optional[str] = Query(None, description="Filtra tickets por status"),
+    category_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, description="Resultados por lista (limitado por PAGE_SIZE_MAX)"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    return await SearchService.asearch(db, q, scope, status, category_id, min(limit, settings.PAGE_SIZE_MAX))
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-from app.Database.db import get_db
+from app.Core.pagination import InvalidCursor
+from app.Database.db import SessionLocal, get_async_read_db, get_db
+from app.Services.TicketImportService import ImportFormatError, TicketImportService
+from app.Services.TicketNeighborService import TicketNeighborService
 from app.Services.TicketService import TicketService
 
 router = APIRouter()
@@ -13,6 +20,8 @@ class TicketCreateRequest(BaseModel):
     user_id: int
     category_id: int
     priority: Optional[str] = "medium"
+    # Indexa na hora e devolve tickets abertos quase idênticos (mais lento que o padrão)
+    check_duplicates: bool = False
 
 class TicketUpdateRequest(BaseModel):
     status: Optional[str] = None
@@ -32,11 +41,77 @@ class TicketResponse(BaseModel):
     user_id: int
     category_id: int
     assigned_to: Optional[int]
+    embedding_status: Optional[str] = None
     class Config:
         orm_mode = True
 
+class TicketPageResponse(BaseModel):
+    items: List[TicketResponse]
+    next_cursor: Optional[str] = None
 
-@router.post("/", response_model=TicketResponse, summary="Criar ticket com IA (embeddings)")
+class SimilarTicketResponse(BaseModel):
+    ticket_id: int
+    title: str
+    status: Optional[str]
+    similarity: float
+
+class TicketCreateResponse(TicketResponse):
+    possible_duplicates: List[SimilarTicketResponse] = []
+
+class UserSummary(BaseModel):
+    id: int
+    full_name: str
+    email: str
+    class Config:
+        orm_mode = True
+
+class CategorySummary(BaseModel):
+    id: int
+    name: str
+    class Config:
+        orm_mode = True
+
+class MessageResponse(BaseModel):
+    id: int
+    sender_id: Optional[int]
+    sender: Optional[UserSummary] = None
+    message: str
+    created_at: Optional[datetime]
+    class Config:
+        orm_mode = True
+
+class HistoryResponse(BaseModel):
+    id: int
+    action: str
+    performed_by: Optional[int]
+    performer: Optional[UserSummary] = None
+    created_at: Optional[datetime]
+    class Config:
+        orm_mode = True
+
+class MessagePageResponse(BaseModel):
+    items: List[MessageResponse]
+    next_cursor: Optional[str] = None
+
+class HistoryPageResponse(BaseModel):
+    items: List[HistoryResponse]
+    next_cursor: Optional[str] = None
+
+class TicketDetail(TicketResponse):
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    resolved_at: Optional[datetime] = None
+    user: Optional[UserSummary] = None
+    assigned_to_user: Optional[UserSummary] = None
+    category: Optional[CategorySummary] = None
+
+class TicketDetailResponse(BaseModel):
+    ticket: TicketDetail
+    messages: MessagePageResponse
+    history: HistoryPageResponse
+
+
+@router.post("/", response_model=TicketCreateResponse, summary="Criar ticket com IA (embeddings)")
 def create_ticket(payload: TicketCreateRequest, db: Session = Depends(get_db)):
     ticket = TicketService.create_ticket(
         db,
@@ -44,26 +119,117 @@ def create_ticket(payload: TicketCreateRequest, db: Session = Depends(get_db)):
         description=payload.description,
         user_id=payload.user_id,
         category_id=payload.category_id,
-        priority=payload.priority
+        priority=payload.priority,
+        index_now=payload.check_duplicates
     )
-    return ticket
+    response = TicketCreateResponse.model_validate(ticket, from_attributes=True)
+    if payload.check_duplicates:
+        response.possible_duplicates = TicketNeighborService.get_possible_duplicates(db, ticket.id)
+    return response
 
-@router.get("/", response_model=List[TicketResponse], summary="Listar tickets com filtros")
-def list_tickets(
+@router.post("/import", summary="Importar tickets em massa (NDJSON ou CSV)")
+def import_tickets(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="ndjson ou csv (padrão: extensão do arquivo)"),
+):
+    """
+    Cada linha é validada como TicketCreateRequest. A resposta é um NDJSON com
+    eventos "progress" por lote, "error" por linha rejeitada e "done" no final.
+    """
+    try:
+        fmt = TicketImportService.detect_format(file.filename, format)
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    def events():
+        # Sessão própria: a importação continua enquanto a resposta é transmitida
+        db = SessionLocal()
+        try:
+            for event in TicketImportService.import_tickets(db, file.file, fmt, TicketCreateRequest):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/", response_model=TicketPageResponse, summary="Listar tickets com filtros (paginado por cursor)")
+async def list_tickets(
     status: Optional[str] = None,
     category_id: Optional[int] = None,
     user_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, description="Tamanho da página (limitado por PAGE_SIZE_MAX)"),
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor da página anterior"),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    return TicketService.list_tickets(db, status, category_id, user_id)
+    try:
+        tickets, next_cursor = await db.run_sync(TicketService.list_tickets, status, category_id, user_id, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"items": tickets, "next_cursor": next_cursor}
 
 @router.get("/{ticket_id}", response_model=TicketResponse, summary="Obter ticket por ID")
-def get_ticket(ticket_id: int, db: Session = Depends(get_db)):
-    ticket = TicketService.get_ticket_by_id(db, ticket_id)
+async def get_ticket(ticket_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    ticket = await db.run_sync(TicketService.get_ticket_by_id, ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket não encontrado")
     return ticket
 
+@router.get("/{ticket_id}/detail", response_model=TicketDetailResponse,
+            summary="Ticket com criador, responsável, categoria e as últimas mensagens e histórico")
+async def get_ticket_detail(
+    ticket_id: int,
+    messages_limit: Optional[int] = Query(None, ge=1, description="Mensagens na primeira página"),
+    history_limit: Optional[int] = Query(None, ge=1, description="Eventos de histórico na primeira página"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    detail = await db.run_sync(TicketService.get_ticket_detail, ticket_id, messages_limit, history_limit)
+    if not detail:
+        raise HTTPException(status_code=404, detail="Ticket não encontrado")
+    return detail
+
+@router.get("/{ticket_id}/messages", response_model=MessagePageResponse, summary="Mensagens do ticket (paginado por cursor)")
+async def list_messages(
+    ticket_id: int,
+    limit: Optional[int] = Query(None, ge=1, description="Tamanho da página (limitado por PAGE_SIZE_MAX)"),
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor da página anterior"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    try:
+        messages, next_cursor = await db.run_sync(TicketService.list_messages, ticket_id, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"items": messages, "next_cursor": next_cursor}
+
+@router.get("/{ticket_id}/history", response_model=HistoryPageResponse, summary="Histórico do ticket (paginado por cursor)")
+async def list_history(
+    ticket_id: int,
+    limit: Optional[int] = Query(None, ge=1, description="Tamanho da página (limitado por PAGE_SIZE_MAX)"),
+    cursor: Optional[str] = Query(None, description="Valor de next_cursor da página anterior"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    try:
+        history, next_cursor = await db.run_sync(TicketService.list_history, ticket_id, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"items": history, "next_cursor": next_cursor}
+
+@router.get("/{ticket_id}/similar", response_model=List[SimilarTicketResponse],
+            summary="Tickets semelhantes (pré-calculados na indexação)")
+async def get_similar_tickets(
+    ticket_id: int,
+    status: Optional[str] = Query(None, pattern="^(open|closed)$", description="open ou closed"),
+    limit: Optional[int] = Query(None, ge=1, description="Até SIMILAR_TICKETS_K"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    return await db.run_sync(TicketNeighborService.get_similar, ticket_id, limit, status)
+
+@router.get("/{ticket_id}/indexing", summary="Status da indexação (embeddings) do ticket")
+def get_ticket_indexing_status(ticket_id: int, db: Session = Depends(get_db)):
+    embedding_status = TicketService.get_indexing_status(db, ticket_id)
+    if not embedding_status:
+        raise HTTPException(status_code=404, detail="Ticket não encontrado")
+    return {"ticket_id": ticket_id, "embedding_status": embedding_status}
+
 @router.put("/{ticket_id}", response_model=TicketResponse, summary="Atualizar ticket")
 def update_ticket(ticket_id: int, payload: TicketUpdateRequest, db: Session = Depends(get_db)):
     ticket = TicketService.update_ticket(db, ticket_id, payload.status, payload.priority, payload.assigned_to)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-from app.Database.db import get_db
+from app.Database.db import get_async_db, get_async_read_db, get_db
 from app.Services.UserService import UserService
 
 router = APIRouter()
@@ -29,25 +30,25 @@ class UserResponse(BaseModel):
 
 
 @router.get("/", response_model=List[UserResponse], summary="Listar todos os usuários")
-def list_users(db: Session = Depends(get_db)):
-    return UserService.list_users(db)
+async def list_users(db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(UserService.list_users)
 
 @router.get("/{user_id}", response_model=UserResponse, summary="Obter usuário por ID")
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = UserService.get_user_by_id(db, user_id)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    user = await db.run_sync(UserService.get_user_by_id, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return user
 
 @router.post("/", response_model=UserResponse, summary="Criar usuário")
-def create_user(payload: UserCreateRequest, db: Session = Depends(get_db)):
-    if UserService.get_user_by_email(db, payload.email):
+async def create_user(payload: UserCreateRequest, db: AsyncSession = Depends(get_async_db)):
+    if await db.run_sync(UserService.get_user_by_email, payload.email):
         raise HTTPException(status_code=400, detail="Email já cadastrado")
 
     from app.Services.AuthService import AuthService
-    hashed_password = AuthService.hash_password(payload.password)
+    hashed_password = await AuthService.ahash_password(payload.password)
 
-    user = UserService.create_user(db, payload.full_name, payload.email, hashed_password, payload.role)
+    user = await db.run_sync(UserService.create_user, payload.full_name, payload.email, hashed_password, payload.role)
     return user
 
 @router.put("/{user_id}", response_model=UserResponse, summary="Atualizar usuário")
@@ -0,0 +1,252 @@
+import hashlib
+import io
+import logging
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from app.Core.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # opcional: sem tiktoken, usa a estimativa de ~4 caracteres por token
+    tiktoken = None
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+NEAR_DUPLICATE_MIN_WORDS = 8
+
+# Incrementar quando a divisão mudar para o mesmo texto: documentos já sincronizados
+# deixam de parecer inalterados e o próximo sync refaz o diff dos chunks
+CHUNKER_VERSION = 2
+
+Source = Union[str, Iterable[str]]
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as exc:  # encoding desconhecido ou arquivo BPE indisponível (download)
+        logger.warning("tiktoken indisponível para %s, usando estimativa de tokens: %s", name, exc)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding(settings.CHUNK_ENCODING)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def chunker_signature() -> str:
+    """
+    Identifica a versão e os parâmetros do chunker; com outro valor, o mesmo texto gera outros chunks.
+    """
+    return (f"v{CHUNKER_VERSION}:{settings.CHUNK_ENCODING}:{settings.CHUNK_MAX_TOKENS}:"
+            f"{settings.CHUNK_OVERLAP_TOKENS}:{settings.CHUNK_NEAR_DUPLICATE_DISTANCE}")
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash do conteúdo normalizado (caixa e espaços), usado para descartar chunks repetidos.
+    """
+    normalized = _WHITESPACE.sub(" ", text).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class ChunkDeduplicator:
+    """
+    Descarta chunks idênticos (hash normalizado) e quase idênticos (SimHash de
+    shingles de palavras, distância de Hamming <= max_distance). A busca de
+    vizinhos usa bandas do SimHash, então o custo não cresce com o número de chunks vistos.
+
+    Parágrafos e chunks ficam em conjuntos separados: um chunk formado por um
+    parágrafo inteiro não pode ser descartado como repetição do próprio parágrafo.
+    """
+
+    def __init__(self, max_distance: Optional[int] = None, known_hashes: Iterable[str] = ()):
+        self.max_distance = settings.CHUNK_NEAR_DUPLICATE_DISTANCE if max_distance is None else max_distance
+        self._hashes: Set[str] = set(known_hashes)
+        self._bands: Dict[Tuple[int, int], List[int]] = {}
+        self._paragraph_hashes: Set[str] = set()
+        self._paragraph_bands: Dict[Tuple[int, int], List[int]] = {}
+        self._word_hashes: Dict[str, int] = {}
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def is_duplicate(self, text: str) -> bool:
+        """
+        Retorna True se um chunk igual ou quase igual já foi visto; caso contrário, registra-o.
+        """
+        return self._seen(text, self._hashes, self._bands)
+
+    def is_duplicate_paragraph(self, text: str) -> bool:
+        """
+        Mesmo que is_duplicate, comparando só com os parágrafos já vistos.
+        """
+        return self._seen(text, self._paragraph_hashes, self._paragraph_bands)
+
+    def _seen(self, text: str, hashes: Set[str], bands: Dict[Tuple[int, int], List[int]]) -> bool:
+        digest = content_hash(text)
+        if digest in hashes:
+            self.exact_duplicates += 1
+            return True
+
+        fingerprint = self._simhash(text) if self.max_distance > 0 else None
+        if fingerprint is not None and self._has_neighbor(fingerprint, bands):
+            self.near_duplicates += 1
+            return True
+
+        hashes.add(digest)
+        if fingerprint is not None:
+            for band in self._band_keys(fingerprint):
+                bands.setdefault(band, []).append(fingerprint)
+        return False
+
+    def _simhash(self, text: str) -> Optional[int]:
+        words = _WORD.findall(text.lower())
+        if len(words) < NEAR_DUPLICATE_MIN_WORDS:
+            return None
+        word_hashes = np.fromiter((self._word_hash(word) for word in words), dtype=np.uint64, count=len(words))
+        # Shingle de 3 palavras: combinação das posições com deslocamentos distintos
+        shingles = word_hashes[:-2] ^ (word_hashes[1:-1] << np.uint64(1)) ^ (word_hashes[2:] << np.uint64(2))
+        bits = np.unpackbits(shingles.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+        votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+        return int(np.packbits(votes, bitorder="little").view(np.uint64)[0])
+
+    def _word_hash(self, word: str) -> int:
+        cached = self._word_hashes.get(word)
+        if cached is None:
+            cached = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            self._word_hashes[word] = cached
+        return cached
+
+    def _has_neighbor(self, fingerprint: int, bands: Dict[Tuple[int, int], List[int]]) -> bool:
+        # Com distância <= max_distance < SIMHASH_BANDS, pelo menos uma banda é idêntica
+        for band in self._band_keys(fingerprint):
+            for candidate in bands.get(band, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return True
+        return False
+
+    @staticmethod
+    def _band_keys(fingerprint: int) -> List[Tuple[int, int]]:
+        width = SIMHASH_BITS // SIMHASH_BANDS
+        return [(band, (fingerprint >> (band * width)) & ((1 << width) - 1)) for band in range(SIMHASH_BANDS)]
+
+
+class TextChunker:
+    """
+    Divide texto em chunks de até max_tokens tokens do modelo, quebrando em fim
+    de frase e, quando o chunk já tem min_tokens, em fim de parágrafo. Cada chunk
+    repete as últimas frases do anterior até overlap_tokens. Aceita uma string ou
+    um iterável de linhas (ex.: arquivo aberto) e produz os chunks sob demanda.
+    Com dedup, parágrafos e chunks repetidos ou quase repetidos são descartados.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None,
+                 min_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.min_tokens = self.max_tokens // 2 if min_tokens is None else min_tokens
+        if self.overlap_tokens >= self.max_tokens:
+            raise ValueError("overlap_tokens deve ser menor que max_tokens")
+
+    def iter_chunks(self, source: Source, dedup: Optional[ChunkDeduplicator] = None) -> Iterator[str]:
+        window: Deque[Tuple[str, int]] = deque()
+        total = 0
+        fresh = False  # há texto novo além da sobreposição herdada do chunk anterior
+
+        def emit() -> Iterator[str]:
+            nonlocal total, fresh
+            chunk = " ".join(piece for piece, _ in window)
+            fresh = False
+            while window and total > self.overlap_tokens:
+                total -= window.popleft()[1]
+            if dedup is None or not dedup.is_duplicate(chunk):
+                yield chunk
+
+        for paragraph in _paragraphs(source):
+            # Boilerplate (rodapés, avisos) se repete em parágrafos inteiros: descarta antes de montar os chunks
+            if dedup is not None and dedup.is_duplicate_paragraph(paragraph):
+                continue
+            for sentence in _SENTENCE_END.split(paragraph):
+                for piece, tokens in self._fit(sentence):
+                    if total + tokens > self.max_tokens:
+                        if fresh:
+                            yield from emit()
+                        while window and total + tokens > self.max_tokens:
+                            total -= window.popleft()[1]
+                    window.append((piece, tokens))
+                    total += tokens
+                    fresh = True
+            if fresh and total >= self.min_tokens:
+                yield from emit()
+
+        if fresh:
+            yield from emit()
+
+    def split(self, source: Source, dedup: Optional[ChunkDeduplicator] = None) -> List[str]:
+        return list(self.iter_chunks(source, dedup))
+
+    def _fit(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        """
+        Frases maiores que max_tokens são cortadas em janelas de tokens.
+        """
+        tokens = count_tokens(sentence)
+        if tokens <= self.max_tokens:
+            yield sentence, tokens
+            return
+
+        encoding = _encoding(settings.CHUNK_ENCODING)
+        if encoding is not None:
+            ids = encoding.encode(sentence, disallowed_special=())
+            for start in range(0, len(ids), self.max_tokens):
+                window = ids[start:start + self.max_tokens]
+                yield encoding.decode(window), len(window)
+            return
+
+        words: List[str] = []
+        size = 0
+        for word in sentence.split():
+            word_tokens = count_tokens(word)
+            if words and size + word_tokens > self.max_tokens:
+                yield " ".join(words), size
+                words, size = [], 0
+            words.append(word)
+            size += word_tokens
+        if words:
+            yield " ".join(words), size
+
+
+def _paragraphs(source: Source) -> Iterator[str]:
+    lines = io.StringIO(source) if isinstance(source, str) else source
+    buffer: List[str] = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            buffer.append(line)
+        elif buffer:
+            yield " ".join(buffer)
+            buffer = []
+    if buffer:
+        yield " ".join(buffer)
+
+
+def iter_chunks(source: Source, dedup: Optional[ChunkDeduplicator] = None) -> Iterator[str]:
+    """
+    Chunks com os parâmetros de Settings, sem repetições dentro do mesmo texto.
+    """
+    return TextChunker().iter_chunks(source, dedup if dedup is not None else ChunkDeduplicator())
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import PostgresDsn, AnyUrl, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -6,7 +6,156 @@ class Settings(BaseSettings):
     DATABASE_URL: Optional[PostgresDsn] = None
     BACKEND_CORS_ORIGINS: List[str] = Field(default_factory=list)
     OPENAI_API_KEY: Optional[str] = None  
+    OPENAI_BASE_URL: Optional[str] = None
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    OPENAI_CHAT_MODEL: str = "gpt-4o-mini"
     GEMINI_API_KEY: Optional[str] = None
+    JWT_SECRET_KEY: str = "supersecret"
+
+    # Inicialização do worker: engines e clientes são criados no startup do app (ou no primeiro uso).
+    # Com WARMUP_ENABLED, o startup também abre conexões do pool e pré-carrega os índices vetoriais
+    # antes de o worker aceitar requisições
+    WARMUP_ENABLED: bool = False
+    WARMUP_DB_CONNECTIONS: Optional[int] = None  # None = DB_POOL_SIZE
+    WARMUP_VECTOR_INDEXES: bool = True
+
+    # Pool de conexões do banco (primário e réplicas)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 desativa
+    # "always": ping a cada checkout; "idle": só em conexões paradas há mais de DB_POOL_PRE_PING_IDLE_SECONDS; "never"
+    DB_POOL_PRE_PING: str = "idle"
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = 30.0
+
+    # Réplicas de leitura (vazio = tudo no primário); rotas só de leitura usam a réplica com lag aceitável
+    DATABASE_REPLICA_URLS: List[str] = Field(default_factory=list)
+    DB_REPLICA_POOL_SIZE: Optional[int] = None  # None = DB_POOL_SIZE
+    DB_REPLICA_MAX_OVERFLOW: Optional[int] = None  # None = DB_MAX_OVERFLOW
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_LAG_CHECK_SECONDS: float = 2.0
+    # Depois de um commit, as leituras do mesmo cliente vão ao primário por este tempo (cookie)
+    DB_READ_YOUR_WRITES_SECONDS: float = 10.0
+
+    # Rotas ligadas ao LLM em modo assíncrono (AsyncSession + AsyncOpenAI)
+    ASYNC_MODE: bool = True
+
+    # Cache do usuário autenticado (evita consulta ao banco por requisição)
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_TTL_SECONDS: int = Field(60, gt=0)
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 10
+    USER_CACHE_MAX_ENTRIES: int = 10_000
+    # > 0: confia nos dados do usuário assinados no token por até N segundos após a emissão
+    AUTH_TRUST_TOKEN_CLAIMS_SECONDS: int = 0
+
+    # bcrypt em pool de processos dedicado (0 workers = na própria thread)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+
+    # Spans de requisição/SQL/LLM no log "app.tracing" (e no OpenTelemetry, se instalado)
+    TRACING_ENABLED: bool = False
+
+    # Paginação de listagens
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    TICKET_IMPORT_BATCH_SIZE: int = 2000
+
+    # Status que contam como "fechado" no dashboard (e preenchem Ticket.resolved_at)
+    DASHBOARD_CLOSED_STATUSES: List[str] = ["resolved", "closed"]
+
+    # Chunking de textos para embeddings (tokens do modelo; tiktoken é opcional)
+    CHUNK_MAX_TOKENS: int = 200
+    CHUNK_OVERLAP_TOKENS: int = 30
+    CHUNK_ENCODING: str = "cl100k_base"
+    # Distância de Hamming do SimHash para considerar chunks quase idênticos (0 = só idênticos, máx. 3)
+    CHUNK_NEAR_DUPLICATE_DISTANCE: int = 3
+
+    # Embeddings: limites por requisição enviada à API
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 200_000
+
+    # Redis (opcional): cache compartilhado entre workers
+    # O Redis roda com maxmemory-policy volatile-lru (docker-compose.yml): só chaves com TTL
+    # são removidas por falta de memória, então a fila de embeddings nunca é descartada e
+    # todo cache gravado no Redis precisa de TTL (por isso os TTLs abaixo são > 0)
+    REDIS_URL: Optional[str] = None
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+
+    # Cache de embeddings: LRU em memória + Redis
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 10_000
+    EMBEDDING_CACHE_TTL_SECONDS: int = Field(7 * 24 * 3600, gt=0)
+
+    # Gateway das chamadas ao LLM: limites do provedor por minuto (0 = sem limite), compartilhados via Redis
+    LLM_CHAT_RPM: int = 0
+    LLM_CHAT_TPM: int = 0
+    LLM_EMBEDDING_RPM: int = 0
+    LLM_EMBEDDING_TPM: int = 0
+    LLM_CHAT_COMPLETION_TOKENS_ESTIMATE: int = 500  # reservados por chamada de chat até o usage real chegar
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS: float = 60.0
+    # Retentativas com backoff exponencial + jitter (ou o tempo indicado pelos headers de rate limit)
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_SECONDS: float = 0.5
+    LLM_RETRY_MAX_SECONDS: float = 30.0
+    # Chamadas idênticas simultâneas no mesmo processo compartilham uma única requisição
+    LLM_COALESCE_REQUESTS: bool = True
+
+    # Cache semântico de respostas do assistente (por processo; invalidação entre workers via Redis)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MIN_SIMILARITY: float = 0.95
+    ANSWER_CACHE_CATEGORY_MIN_SIMILARITY: Dict[int, float] = Field(default_factory=dict)  # sobrescreve por categoria
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000
+    ANSWER_CACHE_TTL_SECONDS: int = 6 * 3600
+
+    # Fila de embeddings em background (requer REDIS_URL)
+    EMBEDDING_QUEUE_ENABLED: bool = True
+    EMBEDDING_QUEUE_BATCH_SIZE: int = 32
+    EMBEDDING_QUEUE_MAX_ATTEMPTS: int = 5
+    EMBEDDING_QUEUE_RETRY_BASE_SECONDS: float = 2.0
+    EMBEDDING_QUEUE_STATUS_TTL_SECONDS: int = 24 * 3600
+    # Varredura de jobs presos: listas de processamento de workers sem heartbeat e
+    # tickets "pending" há mais de STALE_PENDING segundos (job não publicado ou perdido)
+    EMBEDDING_QUEUE_WORKER_TTL_SECONDS: int = 300
+    EMBEDDING_QUEUE_SWEEP_SECONDS: int = 60
+    EMBEDDING_QUEUE_STALE_PENDING_SECONDS: int = 600
+
+    # Índice ANN (pgvector) em Context.embedding: "hnsw" ou "ivfflat"
+    VECTOR_INDEX_TYPE: str = "hnsw"
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: int = 40
+    VECTOR_IVFFLAT_LISTS: int = 100
+    VECTOR_IVFFLAT_PROBES: int = 10
+    # Iterative index scan (requer pgvector >= 0.8.0): com filtro (categoria, ticket), o índice
+    # continua varrendo até achar linhas suficientes em vez de filtrar só os ef_search candidatos.
+    # "relaxed_order", "strict_order" (só hnsw), "off" ou None (não envia o SET; pgvector < 0.8)
+    VECTOR_ITERATIVE_SCAN: Optional[str] = "relaxed_order"
+    # Índice compacto: "none" (vetor completo), "halfvec" (float16) ou "binary" (1 bit por dimensão).
+    # A busca pega top_k * VECTOR_RERANK_FACTOR candidatos e reordena pela distância exata
+    VECTOR_QUANTIZATION: str = "none"
+    VECTOR_RERANK_FACTOR: int = 4
+
+    # Motor de busca vetorial: "pgvector" ou "mmap" (índice em memória por categoria)
+    VECTOR_SEARCH_ENGINE: str = "pgvector"
+    VECTOR_MMAP_DIR: str = "data/vector_index"
+    VECTOR_MMAP_DTYPE: str = "float32"  # ou "float16"
+    VECTOR_MMAP_DIM: int = 1536
+    VECTOR_MMAP_CATEGORIES: List[int] = Field(default_factory=list)  # vazio = todas
+    VECTOR_MMAP_COMPACT_RATIO: float = 0.3
+
+    # Busca híbrida (full-text + vetorial). A configuração de texto entra na coluna gerada:
+    # mudá-la exige recriar as colunas search_vector
+    SEARCH_TEXT_CONFIG: str = "portuguese"
+    SEARCH_CANDIDATES: int = 100  # candidatos de cada ranking antes da fusão
+    SEARCH_RRF_K: int = 60
+
+    # Tickets semelhantes pré-calculados (ticket_neighbors), atualizados na indexação
+    SIMILAR_TICKETS_K: int = 10
+    SIMILAR_TICKETS_MIN_SCORE: float = 0.75
+    SIMILAR_TICKETS_CANDIDATES: int = 200  # chunks lidos do índice ANN por ticket indexado
+    DUPLICATE_TICKET_MIN_SCORE: float = 0.92
 
     model_config = SettingsConfigDict(
         env_file=".env",
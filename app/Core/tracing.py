@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from app.Core.config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # opcional: sem OpenTelemetry os spans só vão para o log
+    otel_trace = None
+
+logger = logging.getLogger("app.tracing")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.perf_counter)
+    error: Optional[str] = None
+    otel_span: Any = None
+    token: Optional[Token] = None
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def start_span(name: str, trace_id: Optional[str] = None, **attributes) -> Optional[Span]:
+    """
+    Abre um span filho do span atual (ou a raiz de um novo trace). Retorna None
+    com TRACING_ENABLED desligado, para o custo ser só um if nos pontos instrumentados.
+    """
+    if not settings.TRACING_ENABLED:
+        return None
+    parent = _current_span.get()
+    span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else (trace_id or os.urandom(16).hex()),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    if otel_trace is not None:
+        context = otel_trace.set_span_in_context(parent.otel_span) if parent and parent.otel_span else None
+        span.otel_span = otel_trace.get_tracer("app").start_span(name, context=context, attributes=attributes)
+    span.token = _current_span.set(span)
+    return span
+
+
+def end_span(span: Optional[Span], error: Optional[BaseException] = None, **attributes):
+    if span is None:
+        return
+    duration_ms = (time.perf_counter() - span.start) * 1000
+    span.attributes.update(attributes)
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    try:
+        _current_span.reset(span.token)
+    except ValueError:
+        # Encerrado em outro contexto (ex.: gerador consumido por outra thread)
+        pass
+    if span.otel_span is not None:
+        span.otel_span.set_attributes(attributes)
+        if error is not None:
+            span.otel_span.record_exception(error)
+        span.otel_span.end()
+    logger.info(json.dumps({
+        "trace_id": span.trace_id,
+        "span_id": span.span_id,
+        "parent_id": span.parent_id,
+        "name": span.name,
+        "duration_ms": round(duration_ms, 3),
+        "error": span.error,
+        "attributes": span.attributes,
+    }, default=str))
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    current = start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        end_span(current, error=exc)
+        raise
+    else:
+        end_span(current)
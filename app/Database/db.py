@@ -1,32 +1,532 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+import asyncio
+import itertools
+import logging
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.exc import DisconnectionError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from pgvector.asyncpg import register_vector
+from app.Core import metrics, tracing
 from app.Core.config import settings
 
+logger = logging.getLogger(__name__)
 
-if not settings.DATABASE_URL:
-    raise ValueError("A variável DATABASE_URL não está definida no .env")
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+READ_YOUR_WRITES_COOKIE = "db_primary_until"
+# Parâmetros de query que o asyncpg.connect() aceita como estão
+ASYNCPG_QUERY_PARAMS = {"target_session_attrs", "prepared_statement_cache_size", "command_timeout", "ssl"}
 
+# Segundos de atraso da réplica; 0 quando já reproduziu tudo o que recebeu do primário
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
 
-engine = create_engine(
-    str(settings.DATABASE_URL),
-    pool_pre_ping=True,  
-    future=True          
+DB_QUERY_SECONDS = metrics.histogram("db_query_duration_seconds", "Duração das queries SQL", ["engine", "operation"])
+DB_POOL_WAIT_SECONDS = metrics.histogram(
+    "db_pool_checkout_wait_seconds", "Espera por uma conexão livre no pool", ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
 )
+DB_POOL_TIMEOUTS = metrics.counter("db_pool_checkout_timeouts_total", "Checkouts que estouraram pool_timeout", ["engine"])
+DB_POOL_CHECKED_OUT = metrics.gauge("db_pool_checked_out", "Conexões em uso", ["engine"])
+DB_POOL_CAPACITY = metrics.gauge("db_pool_capacity", "Máximo de conexões do pool (pool_size + max_overflow)", ["engine"])
+DB_POOL_IDLE = metrics.gauge("db_pool_idle", "Conexões abertas e livres no pool", ["engine"])
+DB_POOL_CONNECTS = metrics.counter("db_pool_connections_opened_total", "Conexões novas abertas pelo pool", ["engine"])
+DB_POOL_PINGS = metrics.counter("db_pool_pings_total", "Pings de conexões paradas no checkout", ["engine", "result"])
+DB_REPLICA_LAG = metrics.gauge("db_replica_lag_seconds", "Atraso de replicação medido em cada réplica", ["replica"])
+DB_REPLICA_AVAILABLE = metrics.gauge(
+    "db_replica_available", "1 se a réplica responde e está dentro de DB_REPLICA_MAX_LAG_SECONDS", ["replica"]
+)
+DB_READS_ROUTED = metrics.counter("db_read_sessions_total", "Sessões de leitura por destino", ["target", "reason"])
+
+
+class _PoolMetricsMixin:
+    """
+    Mede a espera pelo checkout de uma conexão (não há evento do SQLAlchemy para isso).
+    """
+    metrics_label = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.inc(engine=self.metrics_label)
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start, engine=self.metrics_label)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_label = self.metrics_label
+        return pool
+
+
+class InstrumentedQueuePool(_PoolMetricsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(replica: bool = False) -> Dict[str, Any]:
+    pool_size, max_overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    if replica:
+        pool_size = settings.DB_REPLICA_POOL_SIZE if settings.DB_REPLICA_POOL_SIZE is not None else pool_size
+        max_overflow = settings.DB_REPLICA_MAX_OVERFLOW if settings.DB_REPLICA_MAX_OVERFLOW is not None else max_overflow
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "always",
+    }
+
+
+def _create_engines(url: str, replica: bool = False):
+    """
+    Engine síncrono (psycopg2) e assíncrono (asyncpg) para o mesmo banco.
+    """
+    sync_engine = create_engine(url, future=True, poolclass=InstrumentedQueuePool, **_pool_options(replica))
+    async_url, connect_args = _asyncpg_url(url)
+    async_engine = create_async_engine(
+        async_url,
+        poolclass=InstrumentedAsyncQueuePool,
+        connect_args=connect_args,
+        **_pool_options(replica),
+    )
+    event.listen(async_engine.sync_engine, "connect", _register_vector_type)
+    return sync_engine, async_engine
+
+
+def _asyncpg_url(url: str) -> Tuple[URL, Dict[str, Any]]:
+    """
+    Converte a URL do psycopg2 para o asyncpg. Os parâmetros de query são repassados
+    ao asyncpg.connect(), que não aceita os nomes da libpq: sslmode vira ssl (com um
+    SSLContext quando há certificados), connect_timeout vira timeout e
+    application_name vai em server_settings. Os demais parâmetros da libpq são descartados.
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    connect_args: Dict[str, Any] = {}
+
+    sslmode = query.pop("sslmode", None)
+    rootcert, cert, key = query.pop("sslrootcert", None), query.pop("sslcert", None), query.pop("sslkey", None)
+    if rootcert or cert:
+        context = ssl.create_default_context(cafile=rootcert)
+        if cert:
+            context.load_cert_chain(cert, key)
+        context.check_hostname = sslmode == "verify-full"
+        if sslmode not in ("verify-ca", "verify-full"):
+            context.verify_mode = ssl.CERT_NONE
+        connect_args["ssl"] = context
+    elif sslmode:
+        connect_args["ssl"] = sslmode
+    if "connect_timeout" in query:
+        connect_args["timeout"] = float(query.pop("connect_timeout"))
+    if "application_name" in query:
+        connect_args["server_settings"] = {"application_name": query.pop("application_name")}
+
+    dropped = sorted(set(query) - ASYNCPG_QUERY_PARAMS)
+    if dropped:
+        logger.warning("Parâmetros da URL ignorados pelo engine asyncpg: %s", ", ".join(dropped))
+    query = {name: value for name, value in query.items() if name in ASYNCPG_QUERY_PARAMS}
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+
+def _register_vector_type(dbapi_connection, connection_record):
+    dbapi_connection.run_async(register_vector)
+
+
+# Engines criados no primeiro uso (ou no startup do app): importar o módulo não exige DATABASE_URL
+_engines: Dict[str, Any] = {}
+_engines_lock = threading.Lock()
+
+
+def _init_engines() -> Dict[str, Any]:
+    if _engines:
+        return _engines
+    with _engines_lock:
+        if _engines:
+            return _engines
+        if not settings.DATABASE_URL:
+            raise ValueError("A variável DATABASE_URL não está definida no .env")
+        if settings.DB_POOL_PRE_PING not in PRE_PING_STRATEGIES:
+            raise ValueError(f"DB_POOL_PRE_PING deve ser um de {PRE_PING_STRATEGIES}")
+
+        sync_engine, async_engine = _create_engines(str(settings.DATABASE_URL))
+        _configure_engine(sync_engine, "primary")
+        _configure_engine(async_engine.sync_engine, "primary_async")
+        router = ReplicaRouter(settings.DATABASE_REPLICA_URLS)
+        for replica in router.replicas:
+            _configure_engine(replica.engine, replica.name)
+            _configure_engine(replica.async_engine.sync_engine, f"{replica.name}_async")
+        _engines.update(engine=sync_engine, async_engine=async_engine, replica_router=router)
+        return _engines
+
+
+def get_engine() -> Engine:
+    return _init_engines()["engine"]
+
+
+def get_async_engine():
+    return _init_engines()["async_engine"]
+
+
+def get_replica_router() -> "ReplicaRouter":
+    return _init_engines()["replica_router"]
+
+
+def engines_initialized() -> bool:
+    return bool(_engines)
+
+
+async def dispose_engines():
+    """
+    Fecha os pools (shutdown do app); o próximo uso cria engines novos.
+    """
+    with _engines_lock:
+        engines = dict(_engines)
+        _engines.clear()
+    if not engines:
+        return
+    targets = [(engines["engine"], engines["async_engine"])]
+    targets += [(replica.engine, replica.async_engine) for replica in engines["replica_router"].replicas]
+    for sync_engine, async_engine in targets:
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+
+class _PrimarySession(Session):
+    """
+    Sessão sem bind fixo: usa o engine primário, criado no primeiro uso.
+    """
+
+    def get_bind(self, mapper=None, **kw):
+        if self.bind is None:
+            self.bind = get_engine()
+        return super().get_bind(mapper, **kw)
+
+
+class _AsyncPrimarySession(Session):
+    """
+    Sessão síncrona por trás da AsyncSession; o bind é o engine asyncpg do primário.
+    """
+
+    def get_bind(self, mapper=None, **kw):
+        if self.bind is None:
+            self.bind = get_async_engine().sync_engine
+        return super().get_bind(mapper, **kw)
+
 
 SessionLocal = sessionmaker(
+    class_=_PrimarySession,
     autocommit=False,
     autoflush=False,
-    bind=engine,
+    expire_on_commit=False,  # evita um SELECT de refresh após cada commit
     future=True
 )
 def get_db():
     db = SessionLocal()
     try:
         yield db
-        db.commit()  
+        # Os serviços já fazem seu próprio commit; sem transação aberta não há round trip.
+        # Com transação aberta, commit em vez do rollback do close(): DML via Core
+        # (db.execute(update(...))) não aparece em new/dirty/deleted e seria desfeito
+        if db.in_transaction():
+            db.commit()
     except SQLAlchemyError:
-        db.rollback() 
+        db.rollback()
         raise
     finally:
         db.close()
+
+
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=_AsyncPrimarySession,
+    autoflush=False,
+    expire_on_commit=False,
+    class_=AsyncSession,
+)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            if db.in_transaction():
+                await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
+
+
+# Leituras em réplicas ---------------------------------------------------------
+
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def read_from_primary(enabled: bool = True):
+    """
+    Faz as sessões de leitura do contexto atual usarem o primário (read-your-writes).
+    """
+    token = _primary_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine, self.async_engine = _create_engines(url, replica=True)
+        self.lag: Optional[float] = None  # None = ainda não medido ou inacessível
+        self.failing = False
+
+
+class ReplicaRouter:
+    """
+    Escolhe a réplica de cada sessão de leitura (round-robin entre as que estão
+    com lag <= DB_REPLICA_MAX_LAG_SECONDS). O lag é medido por uma thread do
+    processo a cada DB_REPLICA_LAG_CHECK_SECONDS; sem réplica saudável, a
+    leitura vai para o primário.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica{idx}", url) for idx, url in enumerate(urls)]
+        self._counter = itertools.count()
+        self._monitor: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def pick(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        if _primary_reads.get():
+            DB_READS_ROUTED.inc(target="primary", reason="read_your_writes")
+            return None
+        self._ensure_monitor()
+        available = [replica for replica in self.replicas if self._is_available(replica)]
+        if not available:
+            DB_READS_ROUTED.inc(target="primary", reason="no_replica_available")
+            return None
+        replica = available[next(self._counter) % len(available)]
+        DB_READS_ROUTED.inc(target=replica.name, reason="replica")
+        return replica
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    replica.lag = float(conn.execute(REPLICA_LAG_SQL).scalar())
+                DB_REPLICA_LAG.set(replica.lag, replica=replica.name)
+                replica.failing = False
+            except Exception as exc:
+                # Qualquer falha (não só do banco) tira a réplica de rotação até a próxima medição ok
+                if not replica.failing:
+                    logger.warning("Réplica %s indisponível: %s", replica.name, exc)
+                replica.lag = None
+                replica.failing = True
+            DB_REPLICA_AVAILABLE.set(1 if self._is_available(replica) else 0, replica=replica.name)
+
+    @staticmethod
+    def _is_available(replica: Replica) -> bool:
+        return replica.lag is not None and replica.lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+
+    def _ensure_monitor(self):
+        # Iniciada no primeiro uso, já dentro do processo worker (depois de um eventual fork)
+        if self._monitor is not None:
+            return
+        with self._lock:
+            if self._monitor is None:
+                self._monitor = threading.Thread(target=self._watch, name="replica-lag-monitor", daemon=True)
+                self._monitor.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                # A thread não pode morrer: o último lag medido valeria para sempre
+                logger.exception("Falha no monitor de lag das réplicas")
+            time.sleep(settings.DB_REPLICA_LAG_CHECK_SECONDS)
+
+
+def get_read_db():
+    """
+    Sessão para rotas que só leem: réplica quando houver uma disponível, senão o primário.
+    Nunca faz commit.
+    """
+    replica = get_replica_router().pick()
+    db = SessionLocal(bind=replica.engine) if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    replica = get_replica_router().pick()
+    async with (AsyncSessionLocal(bind=replica.async_engine) if replica else AsyncSessionLocal()) as db:
+        yield db
+
+
+@dataclass
+class DbStats:
+    queries: int = 0
+    commits: int = 0
+
+
+_db_stats: ContextVar[Optional[DbStats]] = ContextVar("db_stats", default=None)
+
+
+@contextmanager
+def track_db_stats() -> Iterator[DbStats]:
+    """
+    Conta as queries e commits executados no contexto atual (requisição ou teste).
+    """
+    stats = DbStats()
+    token = _db_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _db_stats.reset(token)
+
+
+def instrument_engine(target: Engine, label: str):
+    """
+    Registra contadores por requisição, métricas de queries e do pool e spans de SQL.
+    """
+    target.pool.metrics_label = label
+    pool = target.pool
+    if hasattr(pool, "size"):
+        DB_POOL_CAPACITY.set(pool.size() + max(pool._max_overflow, 0), engine=label)
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        span = tracing.start_span("db.query", engine=label, operation=operation)
+        conn.info.setdefault("query_start", []).append((time.perf_counter(), operation, span))
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started, operation, span = conn.info["query_start"].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, engine=label, operation=operation)
+        tracing.end_span(span)
+
+    @event.listens_for(target, "handle_error")
+    def _handle_error(context):
+        pending = context.connection.info.get("query_start") if context.connection is not None else None
+        if pending:
+            started, operation, span = pending.pop()
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, engine=label, operation=operation)
+            tracing.end_span(span, error=context.original_exception)
+
+    @event.listens_for(target, "commit")
+    def _commit(conn):
+        stats = _db_stats.get()
+        if stats is not None:
+            stats.commits += 1
+
+    @event.listens_for(target, "connect")
+    def _connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTS.inc(engine=label)
+
+    @event.listens_for(target, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.set(target.pool.checkedout(), engine=label)
+        DB_POOL_IDLE.set(target.pool.checkedin(), engine=label)
+
+    @event.listens_for(target, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.set(target.pool.checkedout(), engine=label)
+        DB_POOL_IDLE.set(target.pool.checkedin(), engine=label)
+
+
+def install_idle_ping(target: Engine, label: str):
+    """
+    Pre-ping "idle": só testa no checkout as conexões paradas há mais de
+    DB_POOL_PRE_PING_IDLE_SECONDS, em vez de um ping por requisição. Se o ping
+    falhar, o pool descarta a conexão e abre outra.
+    """
+    @event.listens_for(target, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(target, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < settings.DB_POOL_PRE_PING_IDLE_SECONDS:
+            return
+        try:
+            target.dialect.do_ping(dbapi_connection)
+        except Exception as exc:
+            DB_POOL_PINGS.inc(engine=label, result="failed")
+            raise DisconnectionError() from exc
+        DB_POOL_PINGS.inc(engine=label, result="ok")
+
+
+def _configure_engine(target: Engine, label: str):
+    instrument_engine(target, label)
+    if settings.DB_POOL_PRE_PING == "idle":
+        install_idle_ping(target, label)
+
+
+def warm_up_pools(connections: Optional[int] = None) -> Dict[str, int]:
+    """
+    Abre conexões dos pools síncronos (primário e réplicas) e as devolve ao pool,
+    para as primeiras requisições não pagarem o connect. Retorna as abertas por engine.
+    """
+    engines = _init_engines()
+    targets = [("primary", engines["engine"])]
+    targets += [(replica.name, replica.engine) for replica in engines["replica_router"].replicas]
+    opened = {}
+    for label, target in targets:
+        count = connections if connections is not None else target.pool.size()
+        conns = []
+        try:
+            for _ in range(count):
+                conns.append(target.connect())
+        finally:
+            for conn in conns:
+                conn.close()
+        opened[label] = len(conns)
+    return opened
+
+
+async def warm_up_async_pools(connections: Optional[int] = None) -> Dict[str, int]:
+    """
+    Mesmo que warm_up_pools para os engines asyncpg (conexões abertas em paralelo).
+    """
+    engines = _init_engines()
+    targets = [("primary_async", engines["async_engine"])]
+    targets += [(f"{replica.name}_async", replica.async_engine) for replica in engines["replica_router"].replicas]
+    opened = {}
+    for label, target in targets:
+        count = connections if connections is not None else target.sync_engine.pool.size()
+        conns = [target.connect() for _ in range(count)]
+        results = await asyncio.gather(*(conn.start() for conn in conns), return_exceptions=True)
+        for conn, result in zip(conns, results):
+            if not isinstance(result, BaseException):
+                await conn.close()
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+        opened[label] = count
+    return opened
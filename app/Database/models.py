@@ -1,9 +1,12 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, Boolean, TIMESTAMP, ForeignKey
+    Column, Computed, Integer, String, Text, Boolean, Date, Float, TIMESTAMP, ForeignKey, Index, UniqueConstraint
 )
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship, declarative_base
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector 
+from app.Core.config import settings
+from app.Database.vector_index import build_vector_index
 
 Base = declarative_base()
 
@@ -26,6 +29,7 @@ class User(Base):
 class TicketCategory(Base):
     __tablename__ = "ticket_categories"
     __table_args__ = {"schema": "help_desk"}
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), unique=True, nullable=False)
@@ -36,7 +40,17 @@ class TicketCategory(Base):
 
 class Ticket(Base):
     __tablename__ = "tickets"
-    __table_args__ = {"schema": "help_desk"}
+    __table_args__ = (
+        # Paginação por (created_at, id), com e sem os filtros da listagem
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tickets_category_created_at_id", "category_id", "created_at", "id"),
+        Index("ix_tickets_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_tickets_search_vector", "search_vector", postgresql_using="gin"),
+        {"schema": "help_desk"},
+    )
+    # Valores gerados pelo banco (created_at, updated_at) voltam no RETURNING do flush
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(150), nullable=False)
@@ -46,8 +60,16 @@ class Ticket(Base):
     user_id = Column(Integer, ForeignKey("help_desk.users.id"))
     category_id = Column(Integer, ForeignKey("help_desk.ticket_categories.id"))
     assigned_to = Column(Integer, ForeignKey("help_desk.users.id"), nullable=True)
+    embedding_status = Column(String(20), nullable=False, default="pending", server_default="pending")  # pending, indexed, failed
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+    resolved_at = Column(TIMESTAMP, nullable=True)  # preenchido ao entrar em um status fechado
+    # Busca por palavras-chave (SearchService): título pesa mais que a descrição
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{settings.SEARCH_TEXT_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{settings.SEARCH_TEXT_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
 
     user = relationship("User", back_populates="tickets_created", foreign_keys=[user_id])
     assigned_to_user = relationship("User", back_populates="tickets_assigned", foreign_keys=[assigned_to])
@@ -58,7 +80,12 @@ class Ticket(Base):
 
 class TicketMessage(Base):
     __tablename__ = "ticket_messages"
-    __table_args__ = {"schema": "help_desk"}
+    __table_args__ = (
+        # Página mais recente da conversa de um ticket, paginada por (created_at, id)
+        Index("ix_ticket_messages_ticket_created_at_id", "ticket_id", "created_at", "id"),
+        {"schema": "help_desk"},
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True)
     ticket_id = Column(Integer, ForeignKey("help_desk.tickets.id", ondelete="CASCADE"))
@@ -67,11 +94,15 @@ class TicketMessage(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     ticket = relationship("Ticket", back_populates="messages")
+    sender = relationship("User")
 
 
 class TicketHistory(Base):
     __tablename__ = "ticket_history"
-    __table_args__ = {"schema": "help_desk"}
+    __table_args__ = (
+        Index("ix_ticket_history_ticket_created_at_id", "ticket_id", "created_at", "id"),
+        {"schema": "help_desk"},
+    )
 
     id = Column(Integer, primary_key=True)
     ticket_id = Column(Integer, ForeignKey("help_desk.tickets.id", ondelete="CASCADE"))
@@ -80,17 +111,93 @@ class TicketHistory(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     ticket = relationship("Ticket", back_populates="history")
+    performer = relationship("User")
+
+
+class TicketNeighbor(Base):
+    """
+    Tickets mais semelhantes a cada ticket (até SIMILAR_TICKETS_K), calculados na
+    indexação pelo TicketNeighborService. Título e status do vizinho ficam
+    copiados aqui para a consulta não precisar de join.
+    """
+    __tablename__ = "ticket_neighbors"
+    __table_args__ = {"schema": "help_desk"}
+
+    ticket_id = Column(Integer, ForeignKey("help_desk.tickets.id", ondelete="CASCADE"), primary_key=True)
+    neighbor_id = Column(Integer, ForeignKey("help_desk.tickets.id", ondelete="CASCADE"), primary_key=True, index=True)
+    similarity = Column(Float, nullable=False)
+    neighbor_title = Column(String(150), nullable=False)
+    neighbor_status = Column(String(20), nullable=True)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+
+class TicketStat(Base):
+    """
+    Contagem de tickets abertos/fechados por dimensão (status, category, priority, assignee),
+    mantida de forma incremental pelo DashboardService.
+    """
+    __tablename__ = "ticket_stats"
+    __table_args__ = {"schema": "help_desk"}
+
+    dimension = Column(String(20), primary_key=True)
+    value = Column(String(50), primary_key=True)  # "" = sem valor (ex.: ticket não atribuído)
+    state = Column(String(10), primary_key=True)  # open, closed
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TicketDailyStat(Base):
+    __tablename__ = "ticket_daily_stats"
+    __table_args__ = {"schema": "help_desk"}
+
+    day = Column(Date, primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+    resolved = Column(Integer, nullable=False, default=0)
+
+
+class ContextDocument(Base):
+    """
+    Documento de contexto versionado de uma categoria (ex.: manual da base de
+    conhecimento). Reenviar o mesmo documento só re-embeda os chunks alterados.
+    """
+    __tablename__ = "context_documents"
+    __table_args__ = (
+        UniqueConstraint("category_id", "name", name="uq_context_documents_category_name"),
+        {"schema": "help_desk"},
+    )
+
+    id = Column(Integer, primary_key=True)
+    category_id = Column(Integer, ForeignKey("help_desk.ticket_categories.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String(200), nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    content_hash = Column(String(40), nullable=True)  # hash do texto completo da última versão
+    chunk_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
 
 class Context(Base):
     __tablename__ = "context"
-    __table_args__ = {"schema": "help_desk"}
+    __table_args__ = (
+        # Chunks já gravados na categoria não são enviados de novo à API de embeddings
+        Index("ix_context_category_content_hash", "category_id", "content_hash"),
+        Index("ix_context_search_vector", "search_vector", postgresql_using="gin"),
+        {"schema": "help_desk"},
+    )
 
     id = Column(Integer, primary_key=True)
-    category_id = Column(Integer, ForeignKey("help_desk.ticket_categories.id", ondelete="CASCADE"))
+    category_id = Column(Integer, ForeignKey("help_desk.ticket_categories.id", ondelete="CASCADE"), index=True)
+    ticket_id = Column(Integer, ForeignKey("help_desk.tickets.id", ondelete="CASCADE"), nullable=True)
+    document_id = Column(Integer, ForeignKey("help_desk.context_documents.id", ondelete="CASCADE"), nullable=True, index=True)
     chunk_index = Column(Integer, nullable=False)
     chunk_text = Column(Text, nullable=False)
+    content_hash = Column(String(40), nullable=True)  # sha1 do texto normalizado (app.Core.chunking)
     embedding = Column(Vector(1536), nullable=False)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"to_tsvector('{settings.SEARCH_TEXT_CONFIG}', chunk_text)", persisted=True
+    )))
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     category = relationship("TicketCategory", back_populates="contexts")
+
+
+# Índice ANN (HNSW ou IVFFlat, conforme Settings) para a busca por similaridade
+build_vector_index(Context.__table__.c.embedding)
@@ -0,0 +1,217 @@
+"""
+Gerenciamento dos índices ANN (pgvector) de Context.embedding.
+
+Com VECTOR_QUANTIZATION = "halfvec" ou "binary", o índice é uma expressão
+sobre a coluna (embedding::halfvec ou binary_quantize(embedding)::bit): a busca
+ANN percorre o índice compacto e os melhores candidatos são reordenados pela
+distância exata contra os vetores completos, que continuam em Context.embedding.
+Por isso a migração não reescreve linhas: basta construir o novo índice.
+
+As buscas filtradas usam iterative index scan (VECTOR_ITERATIVE_SCAN, pgvector
+>= 0.8.0); em versões anteriores, defina VECTOR_ITERATIVE_SCAN vazio.
+
+Uso:
+    python -m app.Database.vector_index            # cria o índice configurado, se faltar
+    python -m app.Database.vector_index --rebuild  # recria (ex.: após mudar parâmetros)
+"""
+import argparse
+from typing import List, Optional
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import Index, cast, func, literal, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+from app.Core.config import settings
+
+INDEX_TYPES = ("hnsw", "ivfflat")
+QUANTIZATIONS = ("none", "halfvec", "binary")
+ITERATIVE_SCAN_MODES = ("off", "strict_order", "relaxed_order")
+QUANTIZED_OPS = {"none": "vector_cosine_ops", "halfvec": "halfvec_cosine_ops", "binary": "bit_hamming_ops"}
+HNSW_MAX_EF_SEARCH = 1000  # o pgvector rejeita hnsw.ef_search acima disso
+
+
+def _index_name(kind: str, quantization: str) -> str:
+    return f"ix_context_embedding_{kind}" if quantization == "none" else f"ix_context_embedding_{quantization}_{kind}"
+
+
+ALL_INDEX_NAMES = [_index_name(kind, quantization) for kind in INDEX_TYPES for quantization in QUANTIZATIONS]
+
+
+def _quantization() -> str:
+    if settings.VECTOR_QUANTIZATION not in QUANTIZATIONS:
+        raise ValueError(f"VECTOR_QUANTIZATION inválido: {settings.VECTOR_QUANTIZATION}")
+    return settings.VECTOR_QUANTIZATION
+
+
+def _iterative_scan() -> Optional[str]:
+    mode = settings.VECTOR_ITERATIVE_SCAN
+    if not mode:
+        return None
+    # SET não aceita parâmetros; o valor é validado antes de ir para o SQL
+    if mode not in ITERATIVE_SCAN_MODES:
+        raise ValueError(f"VECTOR_ITERATIVE_SCAN inválido: {mode}")
+    if mode == "strict_order" and settings.VECTOR_INDEX_TYPE != "hnsw":
+        raise ValueError("VECTOR_ITERATIVE_SCAN=strict_order só é suportado pelo hnsw")
+    return mode
+
+
+def configured_index_name() -> str:
+    return _index_name(settings.VECTOR_INDEX_TYPE, _quantization())
+
+
+def quantized_expression(column, quantization: Optional[str] = None):
+    """
+    Expressão indexada no modo compacto; precisa ser idêntica na busca para o índice ser usado.
+    """
+    quantization = quantization or _quantization()
+    if quantization == "halfvec":
+        return cast(column, HALFVEC(column.type.dim))
+    if quantization == "binary":
+        return cast(func.binary_quantize(column), BIT(column.type.dim))
+    return column
+
+
+def quantized_distance(column, query_embedding):
+    quantization = _quantization()
+    indexed = quantized_expression(column, quantization)
+    if quantization == "binary":
+        query = cast(func.binary_quantize(cast(literal(query_embedding, Vector(column.type.dim)), Vector(column.type.dim))),
+                     BIT(column.type.dim))
+        return indexed.hamming_distance(query)
+    return indexed.cosine_distance(query_embedding)
+
+
+def rerank_candidates(limit: int) -> int:
+    """
+    Quantos candidatos o índice compacto devolve para a reordenação exata. Limitado
+    a HNSW_MAX_EF_SEARCH (mas nunca abaixo de limit): o HNSW não devolve mais
+    candidatos que o ef_search.
+    """
+    if _quantization() == "none":
+        return limit
+    return max(limit, min(limit * max(1, settings.VECTOR_RERANK_FACTOR), HNSW_MAX_EF_SEARCH))
+
+
+def similarity_statement(column, columns, query_embedding, limit: int, *criteria):
+    """
+    SELECT das colunas pedidas mais "similarity" (1 - distância de cosseno), nos
+    `limit` vetores mais próximos. Em modo compacto, busca rerank_candidates(limit)
+    pelo índice quantizado e reordena esses candidatos pela distância exata.
+    """
+    if _quantization() == "none":
+        distance = column.cosine_distance(query_embedding)
+        statement = select(*columns, (1 - distance).label("similarity")).where(*criteria).order_by(distance).limit(limit)
+        if _iterative_scan() != "relaxed_order":
+            return statement
+        # Com relaxed_order o índice pode devolver os vizinhos levemente fora de ordem
+        nearest = statement.subquery()
+        return select(*[nearest.c[col.key] for col in columns], nearest.c.similarity).order_by(nearest.c.similarity.desc())
+
+    candidates = (
+        select(*columns, column.label("exact_embedding"))
+        .where(*criteria)
+        .order_by(quantized_distance(column, query_embedding))
+        .limit(rerank_candidates(limit))
+        .subquery()
+    )
+    exact = candidates.c.exact_embedding.cosine_distance(query_embedding)
+    return (
+        select(*[candidates.c[col.key] for col in columns], (1 - exact).label("similarity"))
+        .order_by(exact)
+        .limit(limit)
+    )
+
+
+def build_vector_index(column, kind: str = None) -> Index:
+    """
+    Monta o Index do SQLAlchemy para a coluna de embedding, com os parâmetros de Settings.
+    """
+    kind = kind or settings.VECTOR_INDEX_TYPE
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"VECTOR_INDEX_TYPE inválido: {kind}")
+    if kind == "hnsw":
+        params = {"m": settings.VECTOR_HNSW_M, "ef_construction": settings.VECTOR_HNSW_EF_CONSTRUCTION}
+    else:
+        params = {"lists": settings.VECTOR_IVFFLAT_LISTS}
+    quantization = _quantization()
+    expression = column if quantization == "none" else quantized_expression(column, quantization).label(column.name)
+    return Index(
+        _index_name(kind, quantization),
+        expression,
+        postgresql_using=kind,
+        postgresql_with=params,
+        postgresql_ops={column.name: QUANTIZED_OPS[quantization]},
+    )
+
+
+def search_param_statements(limit: int = 0) -> List[TextClause]:
+    """
+    Comandos SET LOCAL que ajustam a busca do índice apenas para a transação atual.
+    Com limit, o ef_search do HNSW cobre todos os candidatos da reordenação.
+    """
+    kind = settings.VECTOR_INDEX_TYPE
+    if kind == "hnsw":
+        ef_search = min(max(int(settings.VECTOR_HNSW_EF_SEARCH), rerank_candidates(limit)), HNSW_MAX_EF_SEARCH)
+        statements = [text(f"SET LOCAL hnsw.ef_search = {ef_search}")]
+    else:
+        statements = [text(f"SET LOCAL ivfflat.probes = {int(settings.VECTOR_IVFFLAT_PROBES)}")]
+    iterative_scan = _iterative_scan()
+    if iterative_scan:
+        statements.append(text(f"SET LOCAL {kind}.iterative_scan = {iterative_scan}"))
+    return statements
+
+
+def apply_search_params(db: Session, limit: int = 0):
+    for statement in search_param_statements(limit):
+        db.execute(statement)
+
+
+async def apply_search_params_async(db: AsyncSession, limit: int = 0):
+    for statement in search_param_statements(limit):
+        await db.execute(statement)
+
+
+def ensure_vector_index(conn: Connection, rebuild: bool = False):
+    """
+    Garante que apenas o índice configurado (tipo + quantização) exista em
+    Context.embedding. O novo índice é criado antes de remover os antigos, então
+    a busca continua indexada durante a troca de modo.
+    """
+    from app.Database.models import Context
+
+    name = configured_index_name()
+    if rebuild:
+        conn.execute(text(f'DROP INDEX IF EXISTS help_desk."{name}"'))
+    index = next(ix for ix in Context.__table__.indexes if ix.name == name)
+    index.create(conn, checkfirst=True)
+    for other in ALL_INDEX_NAMES:
+        if other != name:
+            conn.execute(text(f'DROP INDEX IF EXISTS help_desk."{other}"'))
+
+
+def prewarm_vector_index(conn: Connection) -> Optional[int]:
+    """
+    Carrega o índice configurado no shared_buffers com pg_prewarm, para as primeiras
+    buscas não lerem o grafo do disco. Retorna os blocos carregados, ou None se a
+    extensão não estiver instalada.
+    """
+    installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")).scalar()
+    if not installed:
+        return None
+    return conn.execute(
+        text("SELECT pg_prewarm(CAST(:name AS regclass))"), {"name": f'help_desk."{configured_index_name()}"'}
+    ).scalar()
+
+
+if __name__ == "__main__":
+    from app.Database.db import get_engine
+
+    parser = argparse.ArgumentParser(description="Gerencia o índice ANN de Context.embedding")
+    parser.add_argument("--rebuild", action="store_true", help="recria o índice com os parâmetros atuais")
+    args = parser.parse_args()
+
+    with get_engine().begin() as conn:
+        conn.execute(text("SET maintenance_work_mem = '512MB'"))
+        ensure_vector_index(conn, rebuild=args.rebuild)
+    print(f"Índice {configured_index_name()} pronto")
@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.Core import metrics
+from app.Core.config import settings
+from app.Core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "llm:answer:invalidate"
+SESSION_PENDING_KEY = "answer_cache_pending"
+SESSION_LISTENING_KEY = "answer_cache_listening"
+
+ANSWER_CACHE_LOOKUPS = metrics.counter(
+    "llm_answer_cache_lookups_total", "Consultas ao cache semântico de respostas", ["result"]
+)
+ANSWER_CACHE_SAVED_TOKENS = metrics.counter(
+    "llm_answer_cache_saved_tokens_total", "Tokens de chat economizados por respostas vindas do cache", ["kind"]
+)
+ANSWER_CACHE_INVALIDATIONS = metrics.counter(
+    "llm_answer_cache_invalidations_total", "Partições do cache de respostas descartadas por mudança de contexto"
+)
+ANSWER_CACHE_ENTRIES = metrics.gauge("llm_answer_cache_entries", "Respostas guardadas no cache deste processo")
+
+# (modelo de chat, categoria, top_k): a resposta só vale para a mesma recuperação
+Partition = Tuple[str, Optional[int], int]
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray  # embedding normalizado da pergunta
+    answer: str
+    prompt_tokens: int
+    completion_tokens: int
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    Cache semântico das respostas do assistente: uma pergunta cujo embedding
+    tem similaridade de cosseno >= ao limite da categoria com uma pergunta já
+    respondida (mesmo modelo, categoria e top_k) recebe a resposta guardada.
+
+    As entradas ficam em memória, com TTL e remoção LRU. Quando o Context de uma
+    categoria muda, as respostas dela e as sem categoria (que buscam em todo o
+    contexto) são descartadas neste processo e nos demais, via pub/sub.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[Partition, int], CachedAnswer]" = OrderedDict()
+        self._partitions: Dict[Partition, Dict[int, CachedAnswer]] = {}
+        self._matrices: Dict[Partition, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._subscriber = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def min_similarity(category_id: Optional[int]) -> float:
+        return settings.ANSWER_CACHE_CATEGORY_MIN_SIMILARITY.get(category_id, settings.ANSWER_CACHE_MIN_SIMILARITY)
+
+    def get(self, model: str, category_id: Optional[int], top_k: int, embedding: Sequence[float]) -> Optional[str]:
+        """
+        Resposta da pergunta mais parecida da partição, se passar do limite da categoria.
+        """
+        self._ensure_subscribed()
+        partition = (model, category_id, top_k)
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        entry = None
+        with self._lock:
+            ids, matrix = self._matrix(partition)
+            if ids:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                candidate = self._partitions[partition][ids[best]]
+                if scores[best] >= self.min_similarity(category_id) and candidate.expires_at > now:
+                    self._entries.move_to_end((partition, ids[best]))
+                    entry = candidate
+                elif candidate.expires_at <= now:
+                    self._drop(partition, ids[best])
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            ANSWER_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        ANSWER_CACHE_LOOKUPS.inc(result="hit")
+        ANSWER_CACHE_SAVED_TOKENS.inc(entry.prompt_tokens, kind="prompt")
+        ANSWER_CACHE_SAVED_TOKENS.inc(entry.completion_tokens, kind="completion")
+        return entry.answer
+
+    def set(self, model: str, category_id: Optional[int], top_k: int, embedding: Sequence[float], answer: str,
+            prompt_tokens: int = 0, completion_tokens: int = 0):
+        partition = (model, category_id, top_k)
+        entry = CachedAnswer(
+            vector=self._normalize(embedding),
+            answer=answer,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        with self._lock:
+            self._next_id += 1
+            self._entries[(partition, self._next_id)] = entry
+            self._partitions.setdefault(partition, {})[self._next_id] = entry
+            self._matrices.pop(partition, None)
+            while len(self._entries) > self.max_entries:
+                (old_partition, old_id), _ = next(iter(self._entries.items()))
+                self._drop(old_partition, old_id)
+            ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, category_id: Optional[int]):
+        """
+        Descarta as respostas da categoria (e as sem categoria) em todos os workers.
+        """
+        self._forget(category_id)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.publish(INVALIDATION_CHANNEL, "" if category_id is None else str(category_id))
+        except RedisError as exc:
+            logger.warning("Falha ao publicar invalidação do cache de respostas: %s", exc)
+
+    def invalidate_on_commit(self, db: Session, category_id: Optional[int]):
+        """
+        Agenda invalidate() para depois do commit da sessão: invalidar antes deixaria
+        outra requisição guardar de novo uma resposta montada com o contexto antigo.
+        """
+        if not db.info.get(SESSION_LISTENING_KEY):
+            event.listen(db, "after_commit", self._invalidate_pending)
+            event.listen(db, "after_soft_rollback", self._discard_pending)
+            db.info[SESSION_LISTENING_KEY] = True
+        db.info.setdefault(SESSION_PENDING_KEY, set()).add(category_id)
+
+    def clear(self):
+        """
+        Limpa apenas este processo.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._partitions.clear()
+            self._matrices.clear()
+            ANSWER_CACHE_ENTRIES.set(0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _invalidate_pending(self, db: Session):
+        for category_id in db.info.pop(SESSION_PENDING_KEY, set()):
+            self.invalidate(category_id)
+
+    @staticmethod
+    def _discard_pending(db: Session, previous_transaction):
+        db.info.pop(SESSION_PENDING_KEY, None)
+
+    def _forget(self, category_id: Optional[int]):
+        with self._lock:
+            for partition in list(self._partitions):
+                if partition[1] is None or partition[1] == category_id:
+                    for entry_id in list(self._partitions[partition]):
+                        self._drop(partition, entry_id)
+                    ANSWER_CACHE_INVALIDATIONS.inc()
+            ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+    def _drop(self, partition: Partition, entry_id: int):
+        # Chamado com o lock adquirido
+        self._entries.pop((partition, entry_id), None)
+        entries = self._partitions.get(partition)
+        if entries is not None:
+            entries.pop(entry_id, None)
+            if not entries:
+                del self._partitions[partition]
+        self._matrices.pop(partition, None)
+
+    def _matrix(self, partition: Partition) -> Tuple[List[int], Optional[np.ndarray]]:
+        # Chamado com o lock adquirido; a matriz só é remontada quando a partição muda
+        cached = self._matrices.get(partition)
+        if cached is None:
+            entries = self._partitions.get(partition)
+            if not entries:
+                return [], None
+            ids = list(entries)
+            cached = self._matrices[partition] = (ids, np.vstack([entries[entry_id].vector for entry_id in ids]))
+        return cached
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _ensure_subscribed(self):
+        """
+        Assina o canal de invalidação (uma vez por processo): o worker de embeddings
+        e os outros workers da API avisam quando o contexto de uma categoria muda.
+        """
+        if self._subscriber is not None:
+            return
+        client = get_redis()
+        if client is None:
+            self._subscriber = False
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+                self._subscriber = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            except RedisError as exc:
+                # Sem pub/sub, as respostas ainda expiram em ttl_seconds
+                logger.warning("Falha ao assinar invalidações do cache de respostas: %s", exc)
+                self._subscriber = False
+
+    def _on_invalidation(self, message):
+        data = message["data"]
+        data = data.decode() if isinstance(data, bytes) else data
+        self._forget(int(data) if data else None)
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+)
@@ -1,13 +1,15 @@
-import os
+import time
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from jose import jwt, JWTError
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.Core.config import settings
 from app.Services.UserService import UserService
+from app.Services.UserPrincipalCache import UserPrincipal
+from app.Services.PasswordHasher import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecret")
+SECRET_KEY = settings.JWT_SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
@@ -15,28 +17,76 @@ class AuthService:
 
     @staticmethod
     def hash_password(password: str) -> str:
-        return pwd_context.hash(password)
+        return password_hasher.hash(password)
+
+    @staticmethod
+    async def ahash_password(password: str) -> str:
+        return await password_hasher.ahash(password)
 
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(password, hashed_password)
+        valid, _ = password_hasher.verify_and_update(password, hashed_password)
+        return valid
 
     @staticmethod
     def authenticate_user(db: Session, email: str, password: str):
         user = UserService.get_user_by_email(db, email)
         if not user:
             return None
-        if not AuthService.verify_password(password, user.password_hash):
+        valid, new_hash = password_hasher.verify_and_update(password, user.password_hash)
+        if not valid:
             return None
+        if new_hash:
+            # Custo do bcrypt mudou (BCRYPT_ROUNDS): atualiza o hash de forma transparente
+            user.password_hash = new_hash
+            db.commit()
+        return user
+
+    @staticmethod
+    async def aauthenticate_user(db: AsyncSession, email: str, password: str):
+        user = await db.run_sync(UserService.get_user_by_email, email)
+        if not user:
+            return None
+        valid, new_hash = await password_hasher.averify_and_update(password, user.password_hash)
+        if not valid:
+            return None
+        if new_hash:
+            user.password_hash = new_hash
+            await db.commit()
         return user
 
     @staticmethod
     def create_access_token(data: dict, expires_delta: timedelta = None):
         to_encode = data.copy()
-        expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-        to_encode.update({"exp": expire})
+        now = datetime.utcnow()
+        expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+        to_encode.update({"exp": expire, "iat": now})
         return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+    @staticmethod
+    def principal_claims(user) -> dict:
+        """
+        Dados do usuário assinados no token, usados por principal_from_claims.
+        """
+        return {"sub": str(user.id), "email": user.email, "name": user.full_name,
+                "role": user.role, "active": bool(user.is_active)}
+
+    @staticmethod
+    def principal_from_claims(payload: dict) -> Optional[UserPrincipal]:
+        """
+        Monta o usuário a partir do token, sem consultar banco ou cache, se o token
+        foi emitido há menos de AUTH_TRUST_TOKEN_CLAIMS_SECONDS. Alterações no usuário
+        feitas nesse intervalo só valem após a janela expirar.
+        """
+        window = settings.AUTH_TRUST_TOKEN_CLAIMS_SECONDS
+        issued_at = payload.get("iat")
+        if window <= 0 or issued_at is None or "role" not in payload:
+            return None
+        if time.time() - float(issued_at) > window:
+            return None
+        return UserPrincipal(id=int(payload["sub"]), full_name=payload.get("name", ""), email=payload.get("email", ""),
+                             role=payload["role"], is_active=bool(payload.get("active", True)))
+
     @staticmethod
     def verify_token(token: str):
         try:
@@ -1,8 +1,21 @@
+import hashlib
+import logging
+from collections import defaultdict
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
-from app.Database.models import TicketCategory, Context
+from typing import Dict, List, Optional
+from app.Core.chunking import chunker_signature, content_hash, iter_chunks
+from app.Database.models import TicketCategory, Context, ContextDocument
+from app.Services.AnswerCache import answer_cache
 from app.Services.LLMService import LLMService
+from app.Services.EmbeddingQueueService import EmbeddingQueueService
+from app.Services.VectorIndexService import VectorIndexService
+
+logger = logging.getLogger(__name__)
+
+# Documento que recebe o context_text de create_category/update_category
+DEFAULT_CONTEXT_SOURCE = "default"
 
 class CategoryService:
 
@@ -13,13 +26,13 @@ class CategoryService:
         """
         new_category = TicketCategory(name=name)
         db.add(new_category)
-        db.commit()
-        db.refresh(new_category)
+        db.flush()
 
         # Se houver contexto, processar e gerar embeddings
         if context_text:
-            CategoryService._generate_context_embeddings(db, new_category.id, context_text)
+            EmbeddingQueueService.enqueue_category_context(db, new_category.id, context_text, DEFAULT_CONTEXT_SOURCE)
 
+        db.commit()
         return new_category
 
     @staticmethod
@@ -38,13 +51,12 @@ class CategoryService:
 
         if name:
             category.name = name
-        db.commit()
-        db.refresh(category)
 
-        # Se houver novo contexto, gerar embeddings
+        # Novo texto substitui o documento principal; só os chunks alterados são re-embedados
         if context_text:
-            CategoryService._generate_context_embeddings(db, category.id, context_text)
+            EmbeddingQueueService.enqueue_category_context(db, category.id, context_text, DEFAULT_CONTEXT_SOURCE)
 
+        db.commit()
         return category
 
     @staticmethod
@@ -54,54 +66,98 @@ class CategoryService:
             return None
         db.delete(category)
         db.commit()
+        VectorIndexService.drop_category(category_id)
+        answer_cache.invalidate(category_id)
         return True
 
     @staticmethod
-    def add_context_to_category(db: Session, category_id: int, context_text: str):
+    def add_context_to_category(db: Session, category_id: int, context_text: str, source: Optional[str] = None):
         """
-        Permite adicionar mais contexto a uma categoria existente.
+        Permite adicionar mais contexto a uma categoria existente. Com source, o texto
+        é a nova versão daquele documento; sem source, é acrescentado à categoria.
         """
         category = CategoryService.get_category_by_id(db, category_id)
         if not category:
             return None
 
-        CategoryService._generate_context_embeddings(db, category.id, context_text)
+        job_id = EmbeddingQueueService.enqueue_category_context(db, category.id, context_text, source)
+        db.commit()
+        if job_id:
+            return {"message": "Contexto enfileirado para processamento", "job_id": job_id}
         return {"message": "Contexto adicionado com sucesso"}
 
     @staticmethod
-    def _generate_context_embeddings(db: Session, category_id: int, text: str):
+    def _generate_context_embeddings(db: Session, category_id: int, text: str, source: Optional[str] = None):
         """
-        Divide o texto em chunks, gera embeddings e salva na tabela Context.
+        Divide o texto em chunks, gera embeddings e salva na tabela Context (sem commit).
         """
-        chunks = CategoryService._split_text(text)
-        for idx, chunk in enumerate(chunks):
-            embedding = LLMService.generate_embedding(chunk)
-            context = Context(
-                category_id=category_id,
-                chunk_index=idx,
-                chunk_text=chunk,
-                embedding=embedding,
-                created_at=datetime.utcnow()
-            )
-            db.add(context)
-        db.commit()
+        if source:
+            CategoryService.sync_context_document(db, category_id, source, text)
+            return
+        LLMService.store_context_chunks(db, iter_chunks(text), category_id=category_id)
 
     @staticmethod
-    def _split_text(text: str, chunk_size: int = 400) -> List[str]:
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_length = 0
-
-        for word in words:
-            if current_length + len(word) + 1 > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_length = 0
-            current_chunk.append(word)
-            current_length += len(word) + 1
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
+    def sync_context_document(db: Session, category_id: int, source: str, text: str) -> Dict[str, int]:
+        """
+        Grava uma nova versão do documento comparando os hashes dos chunks com os já
+        indexados: chunks iguais são mantidos (só o chunk_index é ajustado), os novos
+        ou alterados são embedados e os que sumiram são apagados em lote. Não faz commit.
+        """
+        db.execute(
+            pg_insert(ContextDocument)
+            .values(category_id=category_id, name=source, version=0, chunk_count=0)
+            .on_conflict_do_nothing(constraint="uq_context_documents_category_name")
+        )
+        # Lock da linha do documento: versões concorrentes do mesmo documento são aplicadas em série
+        document = db.scalars(
+            select(ContextDocument)
+            .where(ContextDocument.category_id == category_id, ContextDocument.name == source)
+            .with_for_update()
+        ).one()
+
+        # O hash inclui a assinatura do chunker: o mesmo texto sincronizado por um chunker
+        # anterior (ou com outros parâmetros) refaz o diff e repara os chunks que faltarem
+        text_hash = hashlib.sha1(f"{chunker_signature()}\n{text}".encode("utf-8")).hexdigest()
+        if document.content_hash == text_hash:
+            return {"version": document.version, "embedded": 0, "kept": document.chunk_count, "deleted": 0}
+
+        existing: Dict[str, List] = defaultdict(list)
+        for row in db.execute(
+            select(Context.id, Context.content_hash, Context.chunk_index)
+            .where(Context.document_id == document.id)
+            .order_by(Context.chunk_index)
+        ):
+            existing[row.content_hash].append(row)
+
+        reindexed, new_items = [], []
+        chunk_count = 0
+        for chunk_index, chunk in enumerate(iter_chunks(text)):
+            chunk_count += 1
+            digest = content_hash(chunk)
+            if existing.get(digest):
+                row = existing[digest].pop(0)
+                if row.chunk_index != chunk_index:
+                    reindexed.append({"id": row.id, "chunk_index": chunk_index})
+            else:
+                new_items.append((chunk_index, chunk, digest))
+
+        stale_ids = [row.id for rows in existing.values() for row in rows]
+        if stale_ids:
+            db.execute(delete(Context).where(Context.id.in_(stale_ids)))
+            VectorIndexService.remove_on_commit(db, category_id, stale_ids)
+            answer_cache.invalidate_on_commit(db, category_id)
+        if reindexed:
+            db.execute(update(Context), reindexed)
+        embedded = LLMService.insert_context_rows(db, new_items, category_id=category_id, document_id=document.id)
+
+        document.version += 1
+        document.content_hash = text_hash
+        document.chunk_count = chunk_count
+        stats = {
+            "version": document.version,
+            "embedded": embedded,
+            "kept": chunk_count - embedded,
+            "deleted": len(stale_ids),
+        }
+        logger.info("Documento %r da categoria %s sincronizado: %s", source, category_id, stats)
+        return stats
@@ -0,0 +1,239 @@
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import String, case, cast, delete, func, insert, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.Core import metrics
+from app.Core.config import settings
+from app.Database.models import Ticket, TicketDailyStat, TicketStat
+
+logger = logging.getLogger(__name__)
+
+STATE_OPEN = "open"
+STATE_CLOSED = "closed"
+
+# Dimensão do dashboard -> atributo do ticket
+DIMENSIONS = {
+    "status": "status",
+    "category": "category_id",
+    "priority": "priority",
+    "assignee": "assigned_to",
+}
+NUMERIC_DIMENSIONS = ("category", "assignee")
+
+SERIES_BUCKETS = ("day", "week", "month")
+
+STATS_DRIFT = metrics.counter("dashboard_stats_drift_total", "Contadores do dashboard corrigidos pela reconciliação", ["table"])
+
+StatKey = Tuple[str, str, str]
+
+
+class DashboardService:
+    """
+    Dashboard de tickets a partir de tabelas de resumo (ticket_stats e
+    ticket_daily_stats), atualizadas na mesma transação que cria ou altera o
+    ticket. A leitura não depende do volume de tickets; reconcile() recalcula
+    tudo a partir de tickets para corrigir desvios.
+    """
+
+    @staticmethod
+    def is_closed(status: Optional[str]) -> bool:
+        return status in settings.DASHBOARD_CLOSED_STATUSES
+
+    @staticmethod
+    def snapshot(ticket: Ticket) -> Dict[str, Any]:
+        """
+        Valores do ticket que entram nos contadores; tirar antes de alterá-lo.
+        """
+        snap = {attr: getattr(ticket, attr) for attr in DIMENSIONS.values()}
+        snap["resolved_at"] = ticket.resolved_at
+        return snap
+
+    @staticmethod
+    def record_created(db: Session, snapshots: Iterable[Dict[str, Any]], day: date):
+        stats: Counter = Counter()
+        created = 0
+        for snap in snapshots:
+            stats.update(DashboardService._keys(snap))
+            created += 1
+        DashboardService._apply(db, stats, {day: (created, 0)} if created else {})
+
+    @staticmethod
+    def record_change(db: Session, before: Dict[str, Any], after: Dict[str, Any]):
+        stats: Counter = Counter(DashboardService._keys(after))
+        stats.subtract(DashboardService._keys(before))
+
+        daily: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+        if before["resolved_at"] != after["resolved_at"]:
+            if before["resolved_at"]:
+                daily[before["resolved_at"].date()][1] -= 1
+            if after["resolved_at"]:
+                daily[after["resolved_at"].date()][1] += 1
+        DashboardService._apply(db, stats, {day: tuple(values) for day, values in daily.items()})
+
+    @staticmethod
+    def get_summary(db: Session) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {dimension: {} for dimension in DIMENSIONS}
+        totals = {STATE_OPEN: 0, STATE_CLOSED: 0}
+        for stat in db.scalars(select(TicketStat).where(TicketStat.count != 0)):
+            entry = summary[stat.dimension].setdefault(stat.value, {STATE_OPEN: 0, STATE_CLOSED: 0})
+            entry[stat.state] += stat.count
+            if stat.dimension == "status":
+                totals[stat.state] += stat.count
+
+        result: Dict[str, Any] = {"totals": totals}
+        for dimension, entries in summary.items():
+            result[f"by_{dimension}"] = [
+                {"value": DashboardService._parse_value(dimension, value), **counts}
+                for value, counts in sorted(entries.items())
+            ]
+        return result
+
+    @staticmethod
+    def get_series(db: Session, bucket: str = "day", days: int = 30) -> List[Dict[str, Any]]:
+        if bucket not in SERIES_BUCKETS:
+            raise ValueError(f"bucket deve ser um de {SERIES_BUCKETS}")
+        start = date.today() - timedelta(days=days - 1)
+        # Literal (já validado): com bind params distintos no SELECT e no GROUP BY o asyncpg rejeita a query
+        period = func.date_trunc(literal_column(f"'{bucket}'"), TicketDailyStat.day).label("period")
+        rows = db.execute(
+            select(period, func.sum(TicketDailyStat.created), func.sum(TicketDailyStat.resolved))
+            .where(TicketDailyStat.day >= start)
+            .group_by(period)
+            .order_by(period)
+        ).all()
+        return [
+            {"bucket": period.date().isoformat(), "created": int(created), "resolved": int(resolved)}
+            for period, created, resolved in rows
+        ]
+
+    @staticmethod
+    def reconcile(db: Session) -> Dict[str, int]:
+        """
+        Recalcula as tabelas de resumo a partir de tickets e corrige desvios.
+        O lock bloqueia atualizações incrementais concorrentes até o commit, então
+        nenhuma delas é perdida nem contada duas vezes. Também serve de carga inicial.
+        """
+        db.execute(text(
+            f"LOCK TABLE {DashboardService._table(TicketStat)}, {DashboardService._table(TicketDailyStat)} IN EXCLUSIVE MODE"
+        ))
+
+        state = case((Ticket.status.in_(settings.DASHBOARD_CLOSED_STATUSES), STATE_CLOSED), else_=STATE_OPEN)
+        fresh: Dict[StatKey, int] = {}
+        for dimension, attr in DIMENSIONS.items():
+            value = func.coalesce(cast(getattr(Ticket, attr), String), "")
+            for row_value, row_state, count in db.execute(select(value, state, func.count()).group_by(value, state)):
+                fresh[(dimension, row_value, row_state)] = count
+
+        created_day = cast(Ticket.created_at, TicketDailyStat.day.type)
+        resolved_day = cast(Ticket.resolved_at, TicketDailyStat.day.type)
+        daily: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+        for day, count in db.execute(select(created_day, func.count()).where(Ticket.created_at.isnot(None)).group_by(created_day)):
+            daily[day][0] = count
+        for day, count in db.execute(select(resolved_day, func.count()).where(Ticket.resolved_at.isnot(None)).group_by(resolved_day)):
+            daily[day][1] = count
+
+        current = {(s.dimension, s.value, s.state): s.count for s in db.scalars(select(TicketStat))}
+        current_daily = {s.day: [s.created, s.resolved] for s in db.scalars(select(TicketDailyStat))}
+        drift = {
+            "stats": DashboardService._count_drift(current, fresh, 0),
+            "daily": DashboardService._count_drift(current_daily, dict(daily), [0, 0]),
+        }
+
+        db.execute(delete(TicketStat))
+        db.execute(delete(TicketDailyStat))
+        if fresh:
+            db.execute(insert(TicketStat), [
+                {"dimension": d, "value": v, "state": s, "count": c} for (d, v, s), c in fresh.items()
+            ])
+        if daily:
+            db.execute(insert(TicketDailyStat), [
+                {"day": day, "created": created, "resolved": resolved} for day, (created, resolved) in daily.items()
+            ])
+        db.commit()
+
+        for table, count in drift.items():
+            if count:
+                STATS_DRIFT.inc(count, table=table)
+                logger.warning("Dashboard: %d contadores de %s corrigidos na reconciliação", count, table)
+        return drift
+
+    @staticmethod
+    def _keys(snap: Dict[str, Any]) -> List[StatKey]:
+        state = STATE_CLOSED if DashboardService.is_closed(snap["status"]) else STATE_OPEN
+        return [
+            (dimension, "" if snap[attr] is None else str(snap[attr]), state)
+            for dimension, attr in DIMENSIONS.items()
+        ]
+
+    @staticmethod
+    def _apply(db: Session, stats: Counter, daily: Dict[date, Tuple[int, int]]):
+        """
+        Soma os deltas com upsert (sem commit). Chaves em ordem fixa evitam
+        deadlock entre transações que atualizam as mesmas linhas.
+        """
+        stat_rows = [
+            {"dimension": d, "value": v, "state": s, "count": delta}
+            for (d, v, s), delta in sorted(stats.items()) if delta
+        ]
+        if stat_rows:
+            stmt = pg_insert(TicketStat).values(stat_rows)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[TicketStat.dimension, TicketStat.value, TicketStat.state],
+                set_={"count": TicketStat.count + stmt.excluded.count},
+            ))
+
+        daily_rows = [
+            {"day": day, "created": created, "resolved": resolved}
+            for day, (created, resolved) in sorted(daily.items()) if created or resolved
+        ]
+        if daily_rows:
+            stmt = pg_insert(TicketDailyStat).values(daily_rows)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[TicketDailyStat.day],
+                set_={
+                    "created": TicketDailyStat.created + stmt.excluded.created,
+                    "resolved": TicketDailyStat.resolved + stmt.excluded.resolved,
+                },
+            ))
+
+    @staticmethod
+    def _count_drift(current: Dict[Any, Any], fresh: Dict[Any, Any], empty: Any) -> int:
+        return sum(1 for key in current.keys() | fresh.keys() if current.get(key, empty) != fresh.get(key, empty))
+
+    @staticmethod
+    def _parse_value(dimension: str, value: str):
+        if value == "":
+            return None
+        return int(value) if dimension in NUMERIC_DIMENSIONS else value
+
+    @staticmethod
+    def _table(model) -> str:
+        return f"{model.__table__.schema}.{model.__table__.name}"
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.Database.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Reconcilia as tabelas de resumo do dashboard com tickets")
+    parser.add_argument("--interval", type=float, default=0, help="repete a cada N segundos (0 = executa uma vez)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    while True:
+        db = SessionLocal()
+        try:
+            drift = DashboardService.reconcile(db)
+            logger.info("Dashboard reconciliado em %s: %s", datetime.utcnow().isoformat(timespec="seconds"), drift)
+        except Exception:
+            db.rollback()
+            logger.exception("Falha na reconciliação do dashboard")
+        finally:
+            db.close()
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
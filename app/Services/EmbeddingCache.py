@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from redis.exceptions import RedisError
+from app.Core.config import settings
+from app.Core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "emb:v1"
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings em dois níveis, endereçado por hash de (modelo, texto):
+    1. LRU em memória, limitado por número de entradas e com TTL
+    2. Redis compartilhado, sempre com TTL: com a política volatile-lru, o Redis
+       remove por tamanho só as chaves com TTL (os caches), nunca as da fila de embeddings
+
+    Os vetores são guardados como float32 binário. Como o modelo faz parte da
+    chave, trocar EMBEDDING_MODEL invalida todas as entradas anteriores.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        digest = hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+        return f"{REDIS_KEY_PREFIX}:{model}:{digest}"
+
+    @staticmethod
+    def pack(vector: List[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def unpack(data: bytes) -> List[float]:
+        vector = array("f")
+        vector.frombytes(data)
+        return vector.tolist()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, List[float]]:
+        """
+        Retorna {posição: vetor} para os textos encontrados em algum dos níveis.
+        """
+        found: Dict[int, List[float]] = {}
+        keys = [self.make_key(model, text) for text in texts]
+        pending: List[int] = []
+
+        now = time.monotonic()
+        with self._lock:
+            for pos, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[pos] = self.unpack(entry[1])
+                    self.hits_memory += 1
+                else:
+                    if entry:
+                        del self._entries[key]
+                    pending.append(pos)
+
+        if pending:
+            for pos, data in zip(pending, self._redis_mget([keys[pos] for pos in pending])):
+                if data is None:
+                    continue
+                found[pos] = self.unpack(data)
+                self._remember(keys[pos], data)
+                with self._lock:
+                    self.hits_redis += 1
+
+        with self._lock:
+            self.misses += len(texts) - len(found)
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text]).get(0)
+
+    def set_many(self, model: str, items: List[Tuple[str, List[float]]]):
+        packed = [(self.make_key(model, text), self.pack(vector)) for text, vector in items]
+        for key, data in packed:
+            self._remember(key, data)
+        client = get_redis()
+        if client is None or not packed:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, data in packed:
+                pipe.set(key, data, ex=self.ttl_seconds)
+            pipe.execute()
+        except RedisError as exc:
+            logger.warning("Falha ao gravar embeddings no Redis: %s", exc)
+
+    def set(self, model: str, text: str, vector: List[float]):
+        self.set_many(model, [(text, vector)])
+
+    def clear(self):
+        """
+        Limpa apenas o nível em memória deste processo.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits_memory": self.hits_memory,
+                "hits_redis": self.hits_redis,
+                "misses": self.misses,
+            }
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _redis_mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        client = get_redis()
+        if client is None:
+            return [None] * len(keys)
+        try:
+            return client.mget(keys)
+        except RedisError as exc:
+            logger.warning("Falha ao ler embeddings do Redis: %s", exc)
+            return [None] * len(keys)
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,358 @@
+import json
+import logging
+import random
+import socket
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+from redis.exceptions import RedisError
+from sqlalchemy import event, func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.Core.config import settings
+from app.Core.redis_client import get_redis
+from app.Database.models import Ticket
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "embq:pending"
+DELAYED_KEY = "embq:delayed"
+DEAD_KEY = "embq:dead"
+PROCESSING_KEY = "embq:processing:{worker}"
+JOB_STATUS_KEY = "embq:job:{job_id}"
+WORKER_KEY = "embq:worker:{worker}"
+SWEEP_LOCK_KEY = "embq:sweep:lock"
+REQUEUED_KEY = "embq:requeued:{ticket_id}"
+
+# Tickets reenfileirados por varredura
+SWEEP_BATCH_SIZE = 1000
+
+SESSION_PENDING_KEY = "embedding_jobs_pending"
+SESSION_LISTENING_KEY = "embedding_jobs_listening"
+
+# Move os jobs vencidos de DELAYED_KEY para PENDING_KEY de forma atômica: não há
+# janela em que o job saia de um conjunto sem entrar no outro, nem dois workers
+# devolvendo o mesmo job
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, raw in ipairs(due) do
+    redis.call('ZREM', KEYS[1], raw)
+    redis.call('LPUSH', KEYS[2], raw)
+end
+return #due
+"""
+
+STATUS_PENDING = "pending"
+STATUS_INDEXED = "indexed"
+STATUS_FAILED = "failed"
+
+
+class QueueUnavailable(RuntimeError):
+    """
+    Redis fora do ar ao consultar a fila; a API responde 503 (e não 404 ou 500).
+    """
+
+
+class EmbeddingQueueService:
+    """
+    Fila de embeddings no Redis. A API apenas enfileira; o worker (worker.py)
+    consome em lotes, com novas tentativas e lista de jobs mortos (dead-letter).
+    Sem Redis configurado, os jobs são processados na hora (comportamento antigo).
+    """
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.EMBEDDING_QUEUE_ENABLED and get_redis() is not None
+
+    @staticmethod
+    def enqueue_ticket(db: Session, ticket_id: int, inline: bool = False) -> Optional[str]:
+        """
+        Agenda a indexação de um ticket na transação atual (não faz commit).
+        Com fila, o job só é publicado depois do commit; sem fila (ou com inline),
+        os embeddings são gerados agora e gravados no mesmo commit de quem chamou.
+        """
+        return EmbeddingQueueService._enqueue(db, {"type": "ticket", "ticket_id": ticket_id}, inline)
+
+    @staticmethod
+    def enqueue_category_context(db: Session, category_id: int, text: str, source: Optional[str] = None) -> Optional[str]:
+        """
+        Agenda a geração de embeddings de um texto de contexto da categoria (não faz commit).
+        Com source, o texto é uma nova versão do documento e só o que mudou é re-embedado.
+        """
+        return EmbeddingQueueService._enqueue(
+            db, {"type": "category_context", "category_id": category_id, "text": text, "source": source}
+        )
+
+    @staticmethod
+    def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            data = client.hgetall(JOB_STATUS_KEY.format(job_id=job_id))
+        except RedisError as exc:
+            logger.warning("Falha ao consultar o status do job %s: %s", job_id, exc)
+            raise QueueUnavailable("Fila de embeddings indisponível") from exc
+        if not data:
+            return None
+        return {key.decode(): value.decode() for key, value in data.items()}
+
+    @staticmethod
+    def process_jobs(db: Session, jobs: List[Dict[str, Any]], commit: bool = True):
+        """
+        Processa um lote de jobs com uma única sequência de chamadas em lote à API
+        de embeddings e um único commit. Levanta exceção se algo falhar.
+        """
+        from app.Services.CategoryService import CategoryService
+        from app.Services.TicketNeighborService import TicketNeighborService
+        from app.Services.TicketService import TicketService
+
+        ticket_ids = [job["ticket_id"] for job in jobs if job["type"] == "ticket"]
+        tickets = db.query(Ticket).filter(Ticket.id.in_(ticket_ids)).all() if ticket_ids else []
+
+        for ticket in tickets:
+            TicketService._index_ticket(db, ticket)
+        for job in jobs:
+            if job["type"] == "category_context":
+                CategoryService._generate_context_embeddings(db, job["category_id"], job["text"], job.get("source"))
+
+        if tickets:
+            TicketNeighborService.refresh(db, [ticket.id for ticket in tickets])
+            db.execute(
+                update(Ticket)
+                .where(Ticket.id.in_([ticket.id for ticket in tickets]))
+                .values(embedding_status=STATUS_INDEXED)
+            )
+        if commit:
+            db.commit()
+
+    @staticmethod
+    def _enqueue(db: Session, job: Dict[str, Any], inline: bool = False) -> Optional[str]:
+        if inline or not EmbeddingQueueService.is_enabled():
+            EmbeddingQueueService.process_jobs(db, [job], commit=False)
+            return None
+
+        job = {**job, "id": uuid.uuid4().hex, "attempts": 0}
+        # O worker não pode ver o job antes do commit das linhas que ele referencia
+        if not db.info.get(SESSION_LISTENING_KEY):
+            event.listen(db, "after_commit", EmbeddingQueueService._publish_pending)
+            event.listen(db, "after_soft_rollback", EmbeddingQueueService._discard_pending)
+            db.info[SESSION_LISTENING_KEY] = True
+        db.info.setdefault(SESSION_PENDING_KEY, []).append(job)
+        return job["id"]
+
+    @staticmethod
+    def _publish_pending(db: Session):
+        jobs = db.info.pop(SESSION_PENDING_KEY, [])
+        if not jobs:
+            return
+        try:
+            EmbeddingQueueService._push(jobs)
+        except RedisError as exc:
+            # Os dados já foram gravados; os tickets ficam com embedding_status "pending"
+            logger.error("Falha ao publicar %d jobs de embedding: %s", len(jobs), exc)
+
+    @staticmethod
+    def _discard_pending(db: Session, previous_transaction):
+        db.info.pop(SESSION_PENDING_KEY, None)
+
+    @staticmethod
+    def _push(jobs: List[Dict[str, Any]]):
+        client = get_redis()
+        pipe = client.pipeline()
+        for job in jobs:
+            status_key = JOB_STATUS_KEY.format(job_id=job["id"])
+            pipe.hset(status_key, mapping={"status": STATUS_PENDING, "type": job["type"]})
+            pipe.expire(status_key, settings.EMBEDDING_QUEUE_STATUS_TTL_SECONDS)
+            pipe.lpush(PENDING_KEY, json.dumps(job))
+        pipe.execute()
+
+
+class EmbeddingWorker:
+    """
+    Consome a fila de forma confiável: cada job é movido para uma lista de
+    processamento do worker e só sai dela após commit ou reagendamento.
+    """
+
+    def __init__(self, session_factory, name: Optional[str] = None):
+        self.session_factory = session_factory
+        self.name = name or socket.gethostname()
+        self.processing_key = PROCESSING_KEY.format(worker=self.name)
+        self.client = get_redis()
+        if self.client is None:
+            raise ValueError("REDIS_URL precisa estar definida para rodar o worker de embeddings")
+        self._promote_script = self.client.register_script(PROMOTE_SCRIPT)
+
+    def run_forever(self):
+        self.recover()
+        logger.info("Worker de embeddings '%s' iniciado", self.name)
+        while True:
+            try:
+                self.heartbeat()
+                self.sweep_if_due()
+                if not self.run_once(block_timeout=1):
+                    continue
+            except RedisError as exc:
+                logger.error("Erro de Redis no worker: %s", exc)
+                time.sleep(1)
+
+    def heartbeat(self):
+        """
+        Marca o worker como vivo; sem heartbeat, a varredura devolve a lista de processamento dele à fila.
+        """
+        self.client.set(WORKER_KEY.format(worker=self.name), int(time.time()),
+                        ex=settings.EMBEDDING_QUEUE_WORKER_TTL_SECONDS)
+
+    def sweep_if_due(self) -> Optional[Dict[str, int]]:
+        # O lock expira sozinho: no máximo uma varredura por intervalo entre todos os workers
+        if not self.client.set(SWEEP_LOCK_KEY, self.name, nx=True, ex=settings.EMBEDDING_QUEUE_SWEEP_SECONDS):
+            return None
+        try:
+            return self.sweep()
+        except SQLAlchemyError as exc:
+            logger.error("Falha na varredura de tickets pendentes: %s", exc)
+            return None
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        Recupera jobs que nenhum worker vai processar: os que estão na lista de
+        processamento de workers mortos e os de tickets que continuam "pending"
+        (publicação falhou após o commit). Reprocessar um job é seguro, a indexação
+        substitui os chunks do ticket.
+        """
+        return {"orphaned": self._recover_orphans(), "stale_tickets": self._requeue_stale_tickets()}
+
+    def _recover_orphans(self) -> int:
+        prefix = PROCESSING_KEY.format(worker="")
+        moved = 0
+        for key in self.client.scan_iter(match=PROCESSING_KEY.format(worker="*")):
+            worker = key.decode()[len(prefix):]
+            if worker == self.name or self.client.exists(WORKER_KEY.format(worker=worker)):
+                continue
+            while self.client.lmove(key, PENDING_KEY, "RIGHT", "LEFT"):
+                moved += 1
+        if moved:
+            logger.warning("%d jobs de workers sem heartbeat devolvidos à fila", moved)
+        return moved
+
+    def _requeue_stale_tickets(self) -> int:
+        stale_seconds = settings.EMBEDDING_QUEUE_STALE_PENDING_SECONDS
+        db = self.session_factory()
+        try:
+            ticket_ids = db.scalars(
+                select(Ticket.id)
+                .where(Ticket.embedding_status == STATUS_PENDING,
+                       Ticket.updated_at < func.now() - timedelta(seconds=stale_seconds))
+                .order_by(Ticket.id)
+                .limit(SWEEP_BATCH_SIZE)
+            ).all()
+        finally:
+            db.close()
+        if not ticket_ids:
+            return 0
+
+        # O marcador evita reenfileirar o mesmo ticket a cada varredura enquanto o job ainda está na fila
+        pipe = self.client.pipeline()
+        for ticket_id in ticket_ids:
+            pipe.set(REQUEUED_KEY.format(ticket_id=ticket_id), 1, nx=True, ex=stale_seconds)
+        claimed = [ticket_id for ticket_id, created in zip(ticket_ids, pipe.execute()) if created]
+        if not claimed:
+            return 0
+        EmbeddingQueueService._push([
+            {"type": "ticket", "ticket_id": ticket_id, "id": uuid.uuid4().hex, "attempts": 0}
+            for ticket_id in claimed
+        ])
+        logger.warning("%d tickets pendentes há mais de %ds reenfileirados", len(claimed), stale_seconds)
+        return len(claimed)
+
+    def recover(self):
+        """
+        Devolve à fila jobs que ficaram presos na lista de processamento (ex.: worker reiniciado).
+        """
+        while self.client.lmove(self.processing_key, PENDING_KEY, "RIGHT", "LEFT"):
+            pass
+
+    def run_once(self, block_timeout: float = 0) -> int:
+        self._promote_delayed()
+        raw_jobs = []
+        first = self.client.blmove(PENDING_KEY, self.processing_key, block_timeout, "RIGHT", "LEFT")
+        if first is None:
+            return 0
+        raw_jobs.append(first)
+        while len(raw_jobs) < settings.EMBEDDING_QUEUE_BATCH_SIZE:
+            raw = self.client.lmove(PENDING_KEY, self.processing_key, "RIGHT", "LEFT")
+            if raw is None:
+                break
+            raw_jobs.append(raw)
+
+        jobs = [json.loads(raw) for raw in raw_jobs]
+        db = self.session_factory()
+        try:
+            try:
+                EmbeddingQueueService.process_jobs(db, jobs)
+            except Exception as exc:
+                db.rollback()
+                if len(jobs) == 1:
+                    logger.warning("Job %s falhou: %s", jobs[0]["id"], exc)
+                    self._fail(db, raw_jobs, jobs, exc)
+                    return 1
+                # Um job com problema não pode gastar as tentativas dos outros: cada um
+                # é reprocessado sozinho e só quem falhar de novo é reagendado
+                logger.warning("Lote de %d jobs falhou (%s); reprocessando um a um", len(jobs), exc)
+                for raw, job in zip(raw_jobs, jobs):
+                    self._run_single(db, raw, job)
+                return len(jobs)
+            # Fora do except: após o commit, um erro de Redis aqui não reagenda os jobs
+            self._finish(raw_jobs, jobs)
+        finally:
+            db.close()
+        return len(jobs)
+
+    def _run_single(self, db: Session, raw: bytes, job: Dict[str, Any]):
+        try:
+            EmbeddingQueueService.process_jobs(db, [job])
+        except Exception as exc:
+            db.rollback()
+            logger.warning("Job %s falhou: %s", job["id"], exc)
+            self._fail(db, [raw], [job], exc)
+            return
+        self._finish([raw], [job])
+
+    def _finish(self, raw_jobs: List[bytes], jobs: List[Dict[str, Any]]):
+        pipe = self.client.pipeline()
+        for raw, job in zip(raw_jobs, jobs):
+            pipe.lrem(self.processing_key, 1, raw)
+            pipe.hset(JOB_STATUS_KEY.format(job_id=job["id"]), "status", STATUS_INDEXED)
+        pipe.execute()
+
+    def _fail(self, db: Session, raw_jobs: List[bytes], jobs: List[Dict[str, Any]], exc: Exception):
+        failed_ticket_ids = []
+        pipe = self.client.pipeline()
+        for raw, job in zip(raw_jobs, jobs):
+            job["attempts"] += 1
+            job["last_error"] = str(exc)[:500]
+            pipe.lrem(self.processing_key, 1, raw)
+            status_key = JOB_STATUS_KEY.format(job_id=job["id"])
+            if job["attempts"] >= settings.EMBEDDING_QUEUE_MAX_ATTEMPTS:
+                pipe.lpush(DEAD_KEY, json.dumps(job))
+                pipe.hset(status_key, mapping={"status": STATUS_FAILED, "error": job["last_error"]})
+                if job["type"] == "ticket":
+                    failed_ticket_ids.append(job["ticket_id"])
+            else:
+                delay = settings.EMBEDDING_QUEUE_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1))
+                delay *= random.uniform(0.5, 1.5)
+                pipe.zadd(DELAYED_KEY, {json.dumps(job): time.time() + delay})
+                pipe.hset(status_key, mapping={"attempts": job["attempts"]})
+        pipe.execute()
+
+        if failed_ticket_ids:
+            db.execute(
+                update(Ticket)
+                .where(Ticket.id.in_(failed_ticket_ids))
+                .values(embedding_status=STATUS_FAILED)
+            )
+            db.commit()
+
+    def _promote_delayed(self):
+        self._promote_script(keys=[DELAYED_KEY, PENDING_KEY], args=[time.time(), 100])
@@ -0,0 +1,532 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from redis.exceptions import RedisError
+from app.Core import metrics, tracing
+from app.Core.config import settings
+from app.Core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+BUCKET_KEY = "llm:bucket:{kind}:{model}"
+PAUSE_KEY = "llm:pause:{kind}:{model}"
+BUCKET_IDLE_TTL_MS = 120_000
+
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_duration_seconds", "Duração das chamadas à API do LLM", ["model", "operation"]
+)
+LLM_REQUEST_ERRORS = metrics.counter(
+    "llm_request_errors_total", "Chamadas à API do LLM que falharam", ["model", "operation"]
+)
+LLM_BATCH_SIZE = metrics.histogram(
+    "llm_embedding_batch_size", "Textos por requisição de embeddings", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens cobrados pela API do LLM", ["model", "kind"])
+LLM_RATE_LIMIT_WAIT = metrics.histogram(
+    "llm_rate_limit_wait_seconds", "Espera no token bucket antes de chamar a API do LLM", ["kind"]
+)
+LLM_RETRIES = metrics.counter(
+    "llm_request_retries_total", "Retentativas de chamadas à API do LLM", ["kind", "reason"]
+)
+LLM_COALESCED = metrics.counter(
+    "llm_requests_coalesced_total", "Chamadas atendidas pela requisição idêntica já em andamento", ["kind"]
+)
+
+# Token bucket duplo (requisições e tokens por minuto) em um hash do Redis.
+# Devolve 0 quando a chamada pode seguir ou quantos ms esperar antes de tentar de novo.
+ACQUIRE_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then return pause end
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+if rpm <= 0 and tpm <= 0 then return 0 end
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'r', 't', 'ts')
+local r = tonumber(state[1]) or rpm
+local t = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local wait = 0
+if rpm > 0 then
+    r = math.min(rpm, r + elapsed * rpm / 60000)
+    if r < 1 then wait = math.max(wait, (1 - r) * 60000 / rpm) end
+end
+if tpm > 0 then
+    cost = math.min(cost, tpm)
+    t = math.min(tpm, t + elapsed * tpm / 60000)
+    if t < cost then wait = math.max(wait, (cost - t) * 60000 / tpm) end
+end
+if wait == 0 then
+    r = r - 1
+    t = t - cost
+end
+redis.call('HSET', KEYS[1], 'r', r, 't', t, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+return math.ceil(wait)
+"""
+
+# Devolve ao bucket a diferença entre os tokens reservados e os cobrados (pode ser negativa)
+SETTLE_SCRIPT = """
+local t = tonumber(redis.call('HGET', KEYS[1], 't'))
+if not t then return 0 end
+redis.call('HSET', KEYS[1], 't', math.min(tonumber(ARGV[1]), t + tonumber(ARGV[2])))
+return 0
+"""
+
+
+@contextmanager
+def observe_llm(operation: str, model: str, batch_size: Optional[int] = None):
+    """
+    Mede uma chamada à API (latência, erros, tamanho do lote e tokens) e abre um span.
+    Quem chama grava a resposta em call["response"] para contabilizar o usage.
+    """
+    call: Dict[str, Any] = {}
+    span = tracing.start_span(f"llm.{operation}", model=model, batch_size=batch_size)
+    started = time.perf_counter()
+    if batch_size is not None:
+        LLM_BATCH_SIZE.observe(batch_size, model=model)
+    try:
+        yield call
+    except Exception as exc:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=model, operation=operation)
+        LLM_REQUEST_ERRORS.inc(model=model, operation=operation)
+        tracing.end_span(span, error=exc)
+        raise
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=model, operation=operation)
+    usage = getattr(call.get("response"), "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    tracing.end_span(span, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def get_client():
+    """
+    Cliente OpenAI síncrono compartilhado, criado no primeiro uso (ou no startup do app).
+    O SDK só é importado aqui: importar o módulo não custa o import da openai.
+    """
+    return _get_client("sync")
+
+
+def get_async_client():
+    return _get_client("async")
+
+
+def _get_client(kind: str):
+    client = _clients.get(kind)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(kind)
+            if client is None:
+                from openai import AsyncOpenAI, OpenAI
+
+                client_cls = OpenAI if kind == "sync" else AsyncOpenAI
+                # As retentativas ficam com o gateway (que conhece o rate limit compartilhado), não com o SDK
+                client = _clients[kind] = client_cls(
+                    api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=0
+                )
+    return client
+
+
+async def close_clients():
+    """
+    Fecha as conexões HTTP dos clientes (shutdown do app); o próximo uso cria clientes novos.
+    """
+    with _clients_lock:
+        clients = dict(_clients)
+        _clients.clear()
+    if "sync" in clients:
+        clients["sync"].close()
+    if "async" in clients:
+        await clients["async"].close()
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Converte durações dos headers da OpenAI ("20ms", "1.5s", "6m0s") ou segundos simples em segundos.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+class RateLimitTimeout(RuntimeError):
+    """
+    A chamada esperou mais que LLM_RATE_LIMIT_MAX_WAIT_SECONDS por espaço no rate limit.
+    """
+
+
+class LocalBucket:
+    """
+    Mesmo token bucket do script Redis, por processo; usado sem REDIS_URL ou se o Redis falhar.
+    """
+
+    def __init__(self):
+        self._state: Dict[str, Tuple[float, float, float]] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, pause_key: str, rpm: int, tpm: int, cost: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            pause = self._paused_until.get(pause_key, 0.0) - now
+            if pause > 0:
+                return pause
+            if rpm <= 0 and tpm <= 0:
+                return 0.0
+            requests, tokens, updated = self._state.get(key, (rpm, tpm, now))
+            elapsed = max(0.0, now - updated)
+            wait = 0.0
+            if rpm > 0:
+                requests = min(rpm, requests + elapsed * rpm / 60)
+                if requests < 1:
+                    wait = max(wait, (1 - requests) * 60 / rpm)
+            if tpm > 0:
+                cost = min(cost, tpm)
+                tokens = min(tpm, tokens + elapsed * tpm / 60)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) * 60 / tpm)
+            if wait == 0:
+                requests -= 1
+                tokens -= cost
+            self._state[key] = (requests, tokens, now)
+            return wait
+
+    def settle(self, key: str, tpm: int, refund: int):
+        with self._lock:
+            if key in self._state:
+                requests, tokens, updated = self._state[key]
+                self._state[key] = (requests, min(tpm, tokens + refund), updated)
+
+    def pause(self, pause_key: str, seconds: float):
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until[pause_key] = max(self._paused_until.get(pause_key, 0.0), until)
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento no processo: a primeira
+    executa, as demais esperam e recebem o mesmo resultado (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, kind: str, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+        if not leader:
+            LLM_COALESCED.inc(kind=kind)
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as exc:
+            call["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+
+    async def ado(self, kind: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            LLM_COALESCED.inc(kind=kind)
+        # shield: quem desiste (ex.: cliente desconectou) não cancela a chamada dos demais
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # evita o aviso de exceção não lida quando ninguém mais espera
+
+
+class LLMGateway:
+    """
+    Ponto único de saída para a API do LLM. Cada chamada:
+    1. espera espaço no token bucket (requisições e tokens por minuto) compartilhado via Redis;
+    2. em 429/5xx/timeout, repete com backoff exponencial + jitter, respeitando retry-after
+       e x-ratelimit-reset-* e pausando o bucket para todos os workers;
+    3. quando idêntica a outra em andamento no processo, reaproveita a resposta dela.
+    """
+
+    def __init__(self):
+        self._local = LocalBucket()
+        self._flights = SingleFlight()
+        self._scripts: Dict[str, Any] = {}
+
+    # Chamadas -------------------------------------------------------------------
+
+    def embeddings(self, texts, model: str, tokens: int):
+        request = {"input": texts, "model": model}
+        return self._coalesced("embeddings", request, lambda: self._call(
+            "embeddings", "embeddings", model, tokens, lambda: get_client().embeddings.with_raw_response.create(**request),
+            batch_size=len(texts),
+        ))
+
+    async def aembeddings(self, texts, model: str, tokens: int):
+        request = {"input": texts, "model": model}
+        return await self._acoalesced("embeddings", request, lambda: self._acall(
+            "embeddings", "embeddings", model, tokens,
+            lambda: get_async_client().embeddings.with_raw_response.create(**request), batch_size=len(texts),
+        ))
+
+    def chat(self, messages, model: str, tokens: int, **params):
+        request = {"messages": messages, "model": model, **params}
+        return self._coalesced("chat", request, lambda: self._call(
+            "chat", "chat", model, tokens, lambda: get_client().chat.completions.with_raw_response.create(**request)
+        ))
+
+    async def achat(self, messages, model: str, tokens: int, **params):
+        request = {"messages": messages, "model": model, **params}
+        return await self._acoalesced("chat", request, lambda: self._acall(
+            "chat", "chat", model, tokens, lambda: get_async_client().chat.completions.with_raw_response.create(**request)
+        ))
+
+    def chat_stream(self, messages, model: str, tokens: int, **params):
+        """
+        Abre um stream de chat. Streams não são coalescidos; o rate limit e as
+        retentativas valem até a resposta começar.
+        """
+        return self._call("chat", "chat_stream", model, tokens, lambda: get_client().chat.completions.with_raw_response.create(
+            messages=messages, model=model, stream=True, **params
+        ))
+
+    async def achat_stream(self, messages, model: str, tokens: int, **params):
+        return await self._acall("chat", "chat_stream", model, tokens, lambda: get_async_client().chat.completions.with_raw_response.create(
+            messages=messages, model=model, stream=True, **params
+        ))
+
+    # Execução -------------------------------------------------------------------
+
+    def _call(self, kind: str, operation: str, model: str, tokens: int, send, batch_size: Optional[int] = None):
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            self._acquire(kind, model, tokens)
+            try:
+                with observe_llm(operation, model, batch_size) as call:
+                    raw = send()
+                    response = call["response"] = raw.parse()
+            except Exception as exc:
+                delay = self._retry_delay(kind, model, exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._after_response(kind, model, tokens, raw.headers, response)
+            return response
+
+    async def _acall(self, kind: str, operation: str, model: str, tokens: int, send, batch_size: Optional[int] = None):
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            await self._aacquire(kind, model, tokens)
+            try:
+                with observe_llm(operation, model, batch_size) as call:
+                    raw = await send()
+                    response = call["response"] = raw.parse()
+            except Exception as exc:
+                delay = await asyncio.to_thread(self._retry_delay, kind, model, exc, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            await asyncio.to_thread(self._after_response, kind, model, tokens, raw.headers, response)
+            return response
+
+    def _coalesced(self, kind: str, request: Dict[str, Any], fn):
+        if not settings.LLM_COALESCE_REQUESTS:
+            return fn()
+        return self._flights.do(kind, self._request_key(request), fn)
+
+    async def _acoalesced(self, kind: str, request: Dict[str, Any], fn):
+        if not settings.LLM_COALESCE_REQUESTS:
+            return await fn()
+        return await self._flights.ado(kind, self._request_key(request), fn)
+
+    @staticmethod
+    def _request_key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    # Rate limit -----------------------------------------------------------------
+
+    @staticmethod
+    def _limits(kind: str) -> Tuple[int, int]:
+        if kind == "embeddings":
+            return settings.LLM_EMBEDDING_RPM, settings.LLM_EMBEDDING_TPM
+        return settings.LLM_CHAT_RPM, settings.LLM_CHAT_TPM
+
+    def _acquire(self, kind: str, model: str, tokens: int):
+        deadline = time.monotonic() + settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(kind, model, tokens)
+            if wait <= 0:
+                break
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Rate limit de {kind} ({model}) não liberou em {settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS}s")
+            time.sleep(wait)
+        LLM_RATE_LIMIT_WAIT.observe(time.monotonic() - started, kind=kind)
+
+    async def _aacquire(self, kind: str, model: str, tokens: int):
+        deadline = time.monotonic() + settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS
+        started = time.monotonic()
+        while True:
+            # O cliente Redis é síncrono; roda fora do event loop
+            wait = await asyncio.to_thread(self._try_acquire, kind, model, tokens)
+            if wait <= 0:
+                break
+            if time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"Rate limit de {kind} ({model}) não liberou em {settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS}s")
+            await asyncio.sleep(wait)
+        LLM_RATE_LIMIT_WAIT.observe(time.monotonic() - started, kind=kind)
+
+    def _try_acquire(self, kind: str, model: str, tokens: int) -> float:
+        """
+        0 quando a chamada pode seguir; senão, segundos até tentar de novo.
+        """
+        rpm, tpm = self._limits(kind)
+        key, pause_key = BUCKET_KEY.format(kind=kind, model=model), PAUSE_KEY.format(kind=kind, model=model)
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                wait_ms = self._script(redis_client, ACQUIRE_SCRIPT)(
+                    keys=[key, pause_key], args=[rpm, tpm, tokens, BUCKET_IDLE_TTL_MS]
+                )
+                return int(wait_ms) / 1000
+            except RedisError as exc:
+                logger.warning("Rate limit do LLM sem Redis (usando bucket local): %s", exc)
+        return self._local.acquire(key, pause_key, rpm, tpm, tokens)
+
+    def _after_response(self, kind: str, model: str, reserved: int, headers, response):
+        """
+        Acerta o bucket com os tokens realmente cobrados e, se os headers mostram
+        a cota esgotada, pausa todos os workers até o reset informado.
+        """
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        _, tpm = self._limits(kind)
+        if used is not None and tpm > 0 and used != reserved:
+            key = BUCKET_KEY.format(kind=kind, model=model)
+            redis_client = get_redis()
+            try:
+                if redis_client is None:
+                    self._local.settle(key, tpm, reserved - used)
+                else:
+                    self._script(redis_client, SETTLE_SCRIPT)(keys=[key], args=[tpm, reserved - used])
+            except RedisError as exc:
+                logger.warning("Falha ao acertar o rate limit do LLM no Redis: %s", exc)
+
+        pause = 0.0
+        for resource in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{resource}") == "0":
+                pause = max(pause, parse_duration(headers.get(f"x-ratelimit-reset-{resource}")) or 0.0)
+        if pause > 0:
+            self._pause(kind, model, pause)
+
+    def _retry_delay(self, kind: str, model: str, exc: Exception, attempt: int) -> Optional[float]:
+        """
+        Segundos até a próxima tentativa, ou None se o erro não deve ser repetido.
+        """
+        import openai
+
+        if attempt >= settings.LLM_MAX_RETRIES:
+            return None
+        if isinstance(exc, openai.APIConnectionError):
+            reason = "timeout" if isinstance(exc, openai.APITimeoutError) else "connection"
+        elif isinstance(exc, openai.RateLimitError):
+            # Cota da conta esgotada não se resolve esperando
+            if getattr(exc, "code", None) == "insufficient_quota":
+                return None
+            reason = "rate_limit"
+        elif isinstance(exc, openai.APIStatusError) and (exc.status_code >= 500 or exc.status_code in (408, 409)):
+            reason = "server_error"
+        else:
+            return None
+
+        backoff = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+        hinted = self._hinted_delay(getattr(exc, "response", None))
+        if hinted is not None:
+            # O provedor disse quando tentar; o jitter espalha os workers que receberam o mesmo header
+            delay = min(settings.LLM_RETRY_MAX_SECONDS, hinted) + random.uniform(0, settings.LLM_RETRY_BASE_SECONDS)
+            if reason == "rate_limit":
+                self._pause(kind, model, hinted)
+        else:
+            delay = random.uniform(0, backoff)  # full jitter
+        LLM_RETRIES.inc(kind=kind, reason=reason)
+        logger.warning("Chamada %s ao LLM falhou (%s, tentativa %d); nova tentativa em %.2fs",
+                       kind, reason, attempt + 1, delay)
+        return delay
+
+    @staticmethod
+    def _hinted_delay(response) -> Optional[float]:
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        hinted = parse_duration(headers.get("retry-after"))
+        if hinted is not None:
+            return hinted
+        resets = [parse_duration(headers.get(f"x-ratelimit-reset-{resource}")) for resource in ("requests", "tokens")]
+        resets = [value for value in resets if value is not None]
+        return max(resets) if resets else None
+
+    def _pause(self, kind: str, model: str, seconds: float):
+        pause_key = PAUSE_KEY.format(kind=kind, model=model)
+        self._local.pause(pause_key, seconds)
+        redis_client = get_redis()
+        if redis_client is None:
+            return
+        try:
+            redis_client.set(pause_key, 1, px=max(1, int(seconds * 1000)))
+        except RedisError as exc:
+            logger.warning("Falha ao pausar o rate limit do LLM no Redis: %s", exc)
+
+    def _script(self, redis_client, source: str):
+        # register_script usa EVALSHA e reenvia o script se o Redis não o tiver em cache
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = redis_client.register_script(source)
+        return script
+
+
+llm_gateway = LLMGateway()
@@ -1,78 +1,342 @@
-import os
-from typing import List, Dict, Any
+import asyncio
+import time
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, Optional, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from openai import OpenAI
+from app.Core.config import settings
+from app.Core import metrics
+from app.Core.chunking import content_hash
 from app.Database.db import get_db
 from app.Database.models import Context
-from dotenv import load_dotenv
+from app.Database.vector_index import apply_search_params, apply_search_params_async, similarity_statement
+from app.Services.AnswerCache import answer_cache
+from app.Services.EmbeddingCache import embedding_cache
+from app.Services.LLMGateway import llm_gateway
+from app.Services.VectorIndexService import VectorIndexService
 
-load_dotenv()
+EMBEDDING_MODEL = settings.OPENAI_EMBEDDING_MODEL
+CHAT_MODEL = settings.OPENAI_CHAT_MODEL
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+CHAT_TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "llm_chat_time_to_first_token_seconds", "Tempo até o primeiro token do chat em streaming", ["model"]
+)
+CHAT_STREAMS_CANCELLED = metrics.counter(
+    "llm_chat_streams_cancelled_total", "Streams de chat interrompidos antes do fim", ["model"]
+)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 class LLMService:
 
     @staticmethod
     def generate_embedding(text: str) -> List[float]:
         """
-        Gera embedding usando OpenAI e retorna vetor.
+        Gera embedding usando OpenAI e retorna vetor (consultando o cache antes).
         """
-        response = client.embeddings.create(
-            input=text,
-            model=EMBEDDING_MODEL
-        )
-        return response.data[0].embedding
+        return LLMService.generate_embeddings([text])[0]
+
+    @staticmethod
+    def generate_embeddings(texts: List[str]) -> List[List[float]]:
+        """
+        Gera embeddings para vários textos, enviando-os à API em lotes
+        limitados por quantidade de itens e por tokens. Mantém a ordem de entrada.
+        Textos já vistos vêm do cache e textos repetidos são enviados uma única vez.
+        """
+        cached: Dict[int, List[float]] = {}
+        if settings.EMBEDDING_CACHE_ENABLED:
+            cached = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+
+        missing = list(dict.fromkeys(text for pos, text in enumerate(texts) if pos not in cached))
+        generated: Dict[str, List[float]] = {}
+        for batch in LLMService._batch_texts(missing):
+            response = llm_gateway.embeddings(batch, EMBEDDING_MODEL, tokens=LLMService._batch_tokens(batch))
+            generated.update(LLMService._embeddings_by_text(batch, response))
+
+        if generated and settings.EMBEDDING_CACHE_ENABLED:
+            embedding_cache.set_many(EMBEDDING_MODEL, list(generated.items()))
+
+        return [cached[pos] if pos in cached else generated[text] for pos, text in enumerate(texts)]
+
+    @staticmethod
+    async def agenerate_embeddings(texts: List[str]) -> List[List[float]]:
+        """
+        Versão assíncrona de generate_embeddings (AsyncOpenAI).
+        """
+        cached: Dict[int, List[float]] = {}
+        if settings.EMBEDDING_CACHE_ENABLED:
+            # O nível Redis do cache é síncrono; roda fora do event loop
+            cached = await asyncio.to_thread(embedding_cache.get_many, EMBEDDING_MODEL, texts)
+
+        missing = list(dict.fromkeys(text for pos, text in enumerate(texts) if pos not in cached))
+        generated: Dict[str, List[float]] = {}
+        for batch in LLMService._batch_texts(missing):
+            response = await llm_gateway.aembeddings(batch, EMBEDDING_MODEL, tokens=LLMService._batch_tokens(batch))
+            generated.update(LLMService._embeddings_by_text(batch, response))
+
+        if generated and settings.EMBEDDING_CACHE_ENABLED:
+            await asyncio.to_thread(embedding_cache.set_many, EMBEDDING_MODEL, list(generated.items()))
+
+        return [cached[pos] if pos in cached else generated[text] for pos, text in enumerate(texts)]
+
+    @staticmethod
+    async def agenerate_embedding(text: str) -> List[float]:
+        return (await LLMService.agenerate_embeddings([text]))[0]
+
+    @staticmethod
+    def _embeddings_by_text(batch: List[str], response) -> Dict[str, List[float]]:
+        # A API não garante a ordem dos itens; usa o índice de cada um
+        return {batch[item.index]: item.embedding for item in response.data}
 
     @staticmethod
     def store_embedding(db: Session, ticket_id: int, chunks: List[str]):
         """
-        Divide texto em chunks, gera embeddings e armazena no banco.
+        Gera embeddings dos chunks do ticket em lote e armazena no banco.
         """
-        for idx, chunk in enumerate(chunks):
-            embedding = LLMService.generate_embedding(chunk)
-            context_entry = Context(
-                ticket_id=ticket_id,
-                chunk_index=idx,
-                chunk_text=chunk,
-                embedding=embedding
-            )
-            db.add(context_entry)
+        LLMService.store_context_chunks(db, chunks, ticket_id=ticket_id)
         db.commit()
 
     @staticmethod
-    def search_similar(db: Session, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def store_context_chunks(db: Session, chunks: Iterable[str], category_id: Optional[int] = None,
+                             ticket_id: Optional[int] = None, start_index: int = 0) -> int:
         """
-        Busca contexto semântico no banco usando pgvector.
+        Gera embeddings em lote e grava as linhas de Context, um INSERT por lote de
+        EMBEDDING_BATCH_SIZE chunks. Chunks que a categoria já possui (mesmo
+        content_hash) são ignorados. Não faz commit; retorna a quantidade de linhas inseridas.
         """
-        query_embedding = LLMService.generate_embedding(query)
+        inserted = 0
+        batch: List[str] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= settings.EMBEDDING_BATCH_SIZE:
+                inserted += LLMService._store_chunk_batch(db, batch, category_id, ticket_id, start_index + inserted)
+                batch = []
+        if batch:
+            inserted += LLMService._store_chunk_batch(db, batch, category_id, ticket_id, start_index + inserted)
+        return inserted
 
-        sql = """
-        SELECT ticket_id, chunk_text, 1 - (embedding <=> %s) AS similarity
-        FROM context
-        ORDER BY embedding <=> %s
-        LIMIT %s
+    @staticmethod
+    def _store_chunk_batch(db: Session, chunks: List[str], category_id: Optional[int],
+                           ticket_id: Optional[int], start_index: int) -> int:
+        hashes = [content_hash(chunk) for chunk in chunks]
+        if category_id is not None:
+            existing = set(db.scalars(
+                select(Context.content_hash)
+                .where(Context.category_id == category_id, Context.content_hash.in_(set(hashes)))
+            ))
+            kept = [(chunk, digest) for chunk, digest in zip(chunks, hashes) if digest not in existing]
+        else:
+            kept = list(zip(chunks, hashes))
+        items = [(start_index + idx, chunk, digest) for idx, (chunk, digest) in enumerate(kept)]
+        return LLMService.insert_context_rows(db, items, category_id=category_id, ticket_id=ticket_id)
+
+    @staticmethod
+    def insert_context_rows(db: Session, items: List[Tuple[int, str, str]], category_id: Optional[int] = None,
+                            ticket_id: Optional[int] = None, document_id: Optional[int] = None) -> int:
+        """
+        Grava linhas de Context a partir de (chunk_index, texto, content_hash) com um único INSERT.
+        Embeddings de chunks que a categoria já tem (mesmo hash) são reaproveitados do banco;
+        só o restante vai para a API. Não faz commit.
+        """
+        if not items:
+            return 0
+
+        reused: Dict[str, Any] = {}
+        if category_id is not None:
+            reused = dict(db.execute(
+                select(Context.content_hash, Context.embedding)
+                .where(Context.category_id == category_id, Context.content_hash.in_({digest for _, _, digest in items}))
+            ).all())
+        missing = list(dict.fromkeys(chunk for _, chunk, digest in items if digest not in reused))
+        generated = dict(zip(missing, LLMService.generate_embeddings(missing))) if missing else {}
+
+        rows = [
+            {
+                "category_id": category_id,
+                "ticket_id": ticket_id,
+                "document_id": document_id,
+                "chunk_index": chunk_index,
+                "chunk_text": chunk,
+                "content_hash": digest,
+                "embedding": reused[digest] if digest in reused else generated[chunk],
+            }
+            for chunk_index, chunk, digest in items
+        ]
+        context_ids = db.execute(
+            insert(Context).returning(Context.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        if category_id is not None:
+            VectorIndexService.add_on_commit(db, category_id, context_ids, [row["embedding"] for row in rows])
+            answer_cache.invalidate_on_commit(db, category_id)
+        return len(rows)
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Estimativa barata de tokens (~4 caracteres por token), suficiente para dimensionar lotes.
+        """
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def _batch_tokens(texts: List[str]) -> int:
+        return sum(LLMService.estimate_tokens(text) for text in texts)
+
+    @staticmethod
+    def _chat_tokens(messages: List[Dict[str, str]]) -> int:
+        """
+        Tokens reservados no rate limit: prompt estimado + resposta esperada.
+        """
+        prompt = sum(LLMService.estimate_tokens(message["content"]) for message in messages)
+        return prompt + settings.LLM_CHAT_COMPLETION_TOKENS_ESTIMATE
+
+    @staticmethod
+    def _batch_texts(texts: List[str], max_items: Optional[int] = None,
+                     max_tokens: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Agrupa textos em lotes que respeitam os limites de itens e de tokens por requisição.
+        """
+        max_items = max_items or settings.EMBEDDING_BATCH_SIZE
+        max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = LLMService.estimate_tokens(text)
+            if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    @staticmethod
+    def search_similar(db: Session, query: str, top_k: int = 5, category_id: Optional[int] = None,
+                       query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Busca contexto semântico no banco usando pgvector (índice ANN).
+        Com category_id, considera apenas os chunks daquela categoria.
         """
-        result = db.execute(sql, (query_embedding, query_embedding, top_k)).fetchall()
+        query_embedding = query_embedding or LLMService.generate_embedding(query)
+
+        if VectorIndexService.is_enabled_for(category_id):
+            results = VectorIndexService.search(db, category_id, query_embedding, top_k)
+            if results is not None:
+                return results
+
+        apply_search_params(db, top_k)
+        result = db.execute(LLMService._similarity_statement(query_embedding, top_k, category_id)).fetchall()
 
         return [{"ticket_id": row[0], "text": row[1], "score": float(row[2])} for row in result]
 
     @staticmethod
-    def generate_response(db: Session, user_message: str, top_k: int = 5) -> str:
+    async def asearch_similar(db: AsyncSession, query: str, top_k: int = 5, category_id: Optional[int] = None,
+                              query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """
+        Versão assíncrona de search_similar.
+        """
+        query_embedding = query_embedding or await LLMService.agenerate_embedding(query)
+
+        if VectorIndexService.is_enabled_for(category_id):
+            results = await VectorIndexService.asearch(db, category_id, query_embedding, top_k)
+            if results is not None:
+                return results
+
+        await apply_search_params_async(db, top_k)
+        result = (await db.execute(LLMService._similarity_statement(query_embedding, top_k, category_id))).fetchall()
+
+        return [{"ticket_id": row[0], "text": row[1], "score": float(row[2])} for row in result]
+
+    @staticmethod
+    def _similarity_statement(query_embedding: List[float], top_k: int, category_id: Optional[int]):
+        criteria = [Context.category_id == category_id] if category_id is not None else []
+        return similarity_statement(
+            Context.embedding, [Context.ticket_id, Context.chunk_text], query_embedding, top_k, *criteria
+        )
+
+    @staticmethod
+    def generate_response(db: Session, user_message: str, top_k: int = 5, category_id: Optional[int] = None) -> str:
         """
         Gera resposta utilizando contexto do banco (RAG).
         Passos:
+        0. Procura uma pergunta quase idêntica já respondida (cache semântico)
         1. Busca os chunks mais relevantes
         2. Monta um prompt com esses chunks
         3. Envia para o modelo de chat da OpenAI
         """
+        query_embedding = None
+        if settings.ANSWER_CACHE_ENABLED:
+            # O mesmo embedding serve para o cache e para a recuperação
+            query_embedding = LLMService.generate_embedding(user_message)
+            cached = answer_cache.get(CHAT_MODEL, category_id, top_k, query_embedding)
+            if cached is not None:
+                return cached
+
+        # 1-3. Buscar os chunks mais relevantes e montar as mensagens
+        messages = LLMService.build_rag_messages(db, user_message, top_k=top_k, category_id=category_id,
+                                                 query_embedding=query_embedding)
+
+        # 4. Gerar resposta
+        response = llm_gateway.chat(messages, CHAT_MODEL, tokens=LLMService._chat_tokens(messages), temperature=0.5)
+
+        return LLMService._remember_answer(query_embedding, category_id, top_k, response)
+
+    @staticmethod
+    async def agenerate_response(db: AsyncSession, user_message: str, top_k: int = 5,
+                                 category_id: Optional[int] = None) -> str:
+        """
+        Versão assíncrona de generate_response (AsyncSession + AsyncOpenAI).
+        """
+        query_embedding = None
+        if settings.ANSWER_CACHE_ENABLED:
+            query_embedding = await LLMService.agenerate_embedding(user_message)
+            cached = answer_cache.get(CHAT_MODEL, category_id, top_k, query_embedding)
+            if cached is not None:
+                return cached
+
+        messages = await LLMService.abuild_rag_messages(db, user_message, top_k=top_k, category_id=category_id,
+                                                        query_embedding=query_embedding)
+        response = await llm_gateway.achat(messages, CHAT_MODEL, tokens=LLMService._chat_tokens(messages), temperature=0.5)
+        return LLMService._remember_answer(query_embedding, category_id, top_k, response)
 
+    @staticmethod
+    def _remember_answer(query_embedding: Optional[List[float]], category_id: Optional[int], top_k: int,
+                         response) -> str:
+        answer = response.choices[0].message.content
+        # Respostas cortadas (finish_reason "length", filtro de conteúdo) não vão para o cache
+        if query_embedding is not None and answer and response.choices[0].finish_reason == "stop":
+            usage = getattr(response, "usage", None)
+            answer_cache.set(
+                CHAT_MODEL, category_id, top_k, query_embedding, answer,
+                prompt_tokens=getattr(usage, "prompt_tokens", None) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+            )
+        return answer
+
+    @staticmethod
+    def build_rag_messages(db: Session, user_message: str, top_k: int = 5, category_id: Optional[int] = None,
+                           query_embedding: Optional[List[float]] = None) -> List[Dict[str, str]]:
+        """
+        Faz a recuperação (RAG) e monta as mensagens para o modelo de chat.
+        Com top_k <= 0 a recuperação é pulada.
+        """
         # 1. Buscar os chunks mais relevantes
-        relevant_chunks = LLMService.search_similar(db, user_message, top_k=top_k)
+        relevant_chunks = []
+        if top_k > 0:
+            relevant_chunks = LLMService.search_similar(db, user_message, top_k=top_k, category_id=category_id,
+                                                        query_embedding=query_embedding)
+        return LLMService._rag_messages(user_message, relevant_chunks)
 
+    @staticmethod
+    async def abuild_rag_messages(db: AsyncSession, user_message: str, top_k: int = 5, category_id: Optional[int] = None,
+                                  query_embedding: Optional[List[float]] = None) -> List[Dict[str, str]]:
+        relevant_chunks = []
+        if top_k > 0:
+            relevant_chunks = await LLMService.asearch_similar(db, user_message, top_k=top_k, category_id=category_id,
+                                                               query_embedding=query_embedding)
+        return LLMService._rag_messages(user_message, relevant_chunks)
+
+    @staticmethod
+    def _rag_messages(user_message: str, relevant_chunks: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         # 2. Criar um contexto com os chunks
         context_text = "\n\n".join([f"- {chunk['text']}" for chunk in relevant_chunks])
         system_prompt = (
@@ -83,16 +347,84 @@ class LLMService:
         )
 
         # 3. Montar mensagens para ChatGPT
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ]
 
-        # 4. Gerar resposta
-        response = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=messages,
-            temperature=0.5
-        )
+    @staticmethod
+    def stream_chat(messages: List[Dict[str, str]]) -> "ChatStream":
+        """
+        Abre uma resposta do modelo de chat em modo streaming.
+        """
+        return ChatStream(messages)
+
+    @staticmethod
+    async def astream_chat(messages: List[Dict[str, str]], stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Versão assíncrona do streaming de chat. Se o consumidor parar de iterar
+        (ex.: cliente desconectou), a conexão com a OpenAI é fechada.
+        Em stats é gravado time_to_first_token (segundos).
+        """
+        stats = stats if stats is not None else {}
+        started = time.perf_counter()
+        finished = False
+        # O gateway mede até a resposta começar; o tempo até o primeiro token vai em CHAT_TIME_TO_FIRST_TOKEN
+        stream = await llm_gateway.achat_stream(messages, CHAT_MODEL, tokens=LLMService._chat_tokens(messages),
+                                                temperature=0.5)
+        try:
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if "time_to_first_token" not in stats:
+                    stats["time_to_first_token"] = time.perf_counter() - started
+                    CHAT_TIME_TO_FIRST_TOKEN.observe(stats["time_to_first_token"], model=CHAT_MODEL)
+                yield chunk.choices[0].delta.content
+            finished = True
+        finally:
+            if not finished:
+                CHAT_STREAMS_CANCELLED.inc(model=CHAT_MODEL)
+            await stream.close()
+
+
+class ChatStream:
+    """
+    Itera sobre os trechos de texto do chat conforme chegam. close() pode ser
+    chamado de outra thread (ex.: cliente desconectou): fecha a conexão HTTP com
+    a OpenAI, o que interrompe a geração e a cobrança de tokens.
+    """
+
+    def __init__(self, messages: List[Dict[str, str]], model: str = None):
+        self.model = model or CHAT_MODEL
+        self.started = time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+        self.finished = False
+        self.closed = False
+        self._stream = llm_gateway.chat_stream(messages, self.model, tokens=LLMService._chat_tokens(messages),
+                                               temperature=0.5)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - self.started
+                    CHAT_TIME_TO_FIRST_TOKEN.observe(self.time_to_first_token, model=self.model)
+                yield delta
+            self.finished = True
+        except Exception:
+            # Leitura interrompida por close() não é erro
+            if not self.closed:
+                raise
 
-        return response.choices[0].message["content"]
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if not self.finished:
+            CHAT_STREAMS_CANCELLED.inc(model=self.model)
+        self._stream.close()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+from sqlalchemy.exc import SQLAlchemyError
+from app.Core import metrics
+from app.Core.config import settings
+from app.Database.db import dispose_engines, get_async_engine, get_engine, get_replica_router, warm_up_async_pools, warm_up_pools
+from app.Database.vector_index import prewarm_vector_index
+from app.Services.LLMGateway import close_clients, get_async_client, get_client
+from app.Services.PasswordHasher import password_hasher
+from app.Services.VectorIndexService import VectorIndexService
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = metrics.histogram(
+    "app_startup_phase_seconds", "Duração das fases de inicialização do worker", ["phase"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+APP_READY = metrics.gauge("app_ready", "1 quando o worker terminou o startup e aceita tráfego")
+
+
+class LifecycleService:
+    """
+    Inicialização e encerramento dos recursos compartilhados do worker (engines,
+    clientes da OpenAI, pools), chamados pelo lifespan do app. Os módulos não criam
+    nada no import; sem o lifespan (scripts, worker de embeddings), tudo é criado
+    no primeiro uso.
+    """
+
+    ready = False
+
+    @staticmethod
+    async def startup():
+        started = time.perf_counter()
+        get_engine()
+        get_async_engine()
+        get_replica_router()
+        get_client()
+        get_async_client()
+        STARTUP_SECONDS.observe(time.perf_counter() - started, phase="resources")
+
+        if settings.WARMUP_ENABLED:
+            await LifecycleService.warm_up()
+        LifecycleService.ready = True
+        APP_READY.set(1)
+        logger.info("Worker pronto em %.2fs", time.perf_counter() - started)
+
+    @staticmethod
+    async def warm_up() -> Dict[str, object]:
+        """
+        Abre conexões dos pools e pré-carrega os índices vetoriais antes do worker
+        aceitar tráfego. Falhas são registradas e não impedem o startup: o custo
+        só volta para as primeiras requisições.
+        """
+        summary: Dict[str, object] = {}
+        connections = settings.WARMUP_DB_CONNECTIONS
+
+        started = time.perf_counter()
+        try:
+            if settings.ASYNC_MODE:
+                summary["async_pools"] = await warm_up_async_pools(connections)
+            # As rotas síncronas, o worker de embeddings e as réplicas usam os pools psycopg2
+            summary["pools"] = await asyncio.to_thread(warm_up_pools, connections)
+        except (SQLAlchemyError, OSError) as exc:
+            logger.warning("Falha ao aquecer o pool de conexões: %s", exc)
+        STARTUP_SECONDS.observe(time.perf_counter() - started, phase="db_pools")
+
+        if settings.WARMUP_VECTOR_INDEXES:
+            started = time.perf_counter()
+            try:
+                summary["pgvector_blocks"] = await asyncio.to_thread(LifecycleService._prewarm_pgvector)
+            except (SQLAlchemyError, OSError) as exc:
+                logger.warning("Falha ao pré-carregar o índice pgvector: %s", exc)
+            try:
+                summary["mmap_rows"] = await asyncio.to_thread(VectorIndexService.preload)
+            except (OSError, KeyError, ValueError) as exc:
+                # Diretório ou meta.json corrompido: a busca dessas categorias cai para o pgvector
+                logger.warning("Falha ao pré-carregar os índices mmap: %s", exc)
+            STARTUP_SECONDS.observe(time.perf_counter() - started, phase="vector_indexes")
+
+        logger.info("Warm-up concluído: %s", summary)
+        return summary
+
+    @staticmethod
+    async def shutdown():
+        LifecycleService.ready = False
+        APP_READY.set(0)
+        await close_clients()
+        password_hasher.shutdown()
+        await dispose_engines()
+
+    @staticmethod
+    def _prewarm_pgvector():
+        with get_engine().begin() as conn:
+            blocks = prewarm_vector_index(conn)
+        if blocks is None:
+            logger.info("Extensão pg_prewarm não instalada; índice pgvector não pré-carregado")
+        return blocks
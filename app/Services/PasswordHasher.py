@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.Core import metrics
+from app.Core.config import settings
+
+# Hashes com custo diferente de BCRYPT_ROUNDS são marcados para re-hash no próximo login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+QUEUE_DEPTH = metrics.gauge("password_hash_queue_depth", "Operações de bcrypt aguardando ou em execução")
+WAIT_SECONDS = metrics.histogram("password_hash_wait_seconds", "Espera na fila até o bcrypt começar", ["op"])
+DURATION_SECONDS = metrics.histogram("password_hash_duration_seconds", "Duração do bcrypt no processo dedicado", ["op"])
+REJECTED = metrics.counter("password_hash_rejected_total", "Operações recusadas com a fila cheia", ["op"])
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Fila de bcrypt cheia; a API responde 503 em vez de acumular requisições.
+    """
+
+
+def _hash_in_worker(password: str) -> Tuple[str, float, float]:
+    started = time.time()
+    return pwd_context.hash(password), started, time.time()
+
+
+def _verify_in_worker(password: str, hashed_password: str) -> Tuple[Tuple[bool, Optional[str]], float, float]:
+    started = time.time()
+    return pwd_context.verify_and_update(password, hashed_password), started, time.time()
+
+
+class PasswordHasher:
+    """
+    Executa bcrypt em um pool de processos dedicado e limitado, fora do GIL e do
+    threadpool das requisições. Com PASSWORD_HASH_WORKERS=0 roda na própria thread.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def hash(self, password: str) -> str:
+        return self._submit("hash", _hash_in_worker, password).result()
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return self._submit("verify", _verify_in_worker, password, hashed_password).result()
+
+    async def ahash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit("hash", _hash_in_worker, password))
+
+    async def averify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await asyncio.wrap_future(self._submit("verify", _verify_in_worker, password, hashed_password))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _submit(self, op: str, fn, *args) -> Future:
+        if self.workers <= 0:
+            future: Future = Future()
+            result, _, _ = fn(*args)
+            future.set_result(result)
+            return future
+
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                REJECTED.inc(op=op)
+                raise PasswordHasherBusy("Fila de processamento de senhas cheia")
+            self._in_flight += 1
+            QUEUE_DEPTH.set(self._in_flight)
+        submitted = time.time()
+        outer: Future = Future()
+
+        def _finish(done: Optional[Future], exc: Optional[BaseException] = None):
+            with self._lock:
+                self._in_flight -= 1
+                QUEUE_DEPTH.set(self._in_flight)
+            if exc is None and done.cancelled():
+                outer.cancel()
+                return
+            exc = exc if exc is not None else done.exception()
+            if exc is not None:
+                outer.set_exception(exc)
+                return
+            result, started, finished = done.result()
+            WAIT_SECONDS.observe(max(started - submitted, 0.0), op=op)
+            DURATION_SECONDS.observe(finished - started, op=op)
+            outer.set_result(result)
+
+        def _start(retry: bool):
+            # Um processo morto quebra o pool inteiro: troca o executor e tenta de novo uma vez
+            executor = self._get_executor()
+            try:
+                inner = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                if not retry:
+                    raise
+                _start(False)
+                return
+            inner.add_done_callback(lambda done: _done(done, executor, retry))
+
+        def _done(done: Future, executor: ProcessPoolExecutor, retry: bool):
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self._replace_executor(executor)
+                if retry:
+                    try:
+                        _start(False)
+                    except BrokenProcessPool as exc:
+                        _finish(None, exc)
+                    return
+            _finish(done)
+
+        try:
+            _start(True)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+                QUEUE_DEPTH.set(self._in_flight)
+            raise
+        return outer
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            # Outra operação pode já ter trocado o executor quebrado
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,190 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Float, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.Core.config import settings
+from app.Database.models import Context, Ticket
+from app.Database.vector_index import apply_search_params, apply_search_params_async, similarity_statement
+from app.Services.LLMService import LLMService
+
+SEARCH_SCOPES = ("all", "tickets", "context")
+
+
+class SearchService:
+    """
+    Busca híbrida em tickets e chunks de conhecimento: ranking por palavras-chave
+    (tsvector + GIN, bom para códigos de erro e nomes de produto) e ranking
+    vetorial (pgvector), combinados por Reciprocal Rank Fusion. Os dois rankings
+    e a fusão de tickets e de chunks saem de um único SELECT.
+    """
+
+    @staticmethod
+    def search(db: Session, query: str, scope: str = "all", status: Optional[str] = None,
+               category_id: Optional[int] = None, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        query_embedding = LLMService.generate_embedding(query)
+        apply_search_params(db, settings.SEARCH_CANDIDATES)
+        row = db.execute(SearchService._statement(query, query_embedding, scope, status, category_id, limit)).one()
+        return SearchService._parse(row)
+
+    @staticmethod
+    async def asearch(db: AsyncSession, query: str, scope: str = "all", status: Optional[str] = None,
+                      category_id: Optional[int] = None, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        query_embedding = await LLMService.agenerate_embedding(query)
+        await apply_search_params_async(db, settings.SEARCH_CANDIDATES)
+        row = (await db.execute(SearchService._statement(query, query_embedding, scope, status, category_id, limit))).one()
+        return SearchService._parse(row)
+
+    @staticmethod
+    def _statement(query: str, query_embedding: List[float], scope: str, status: Optional[str],
+                   category_id: Optional[int], limit: int):
+        if scope not in SEARCH_SCOPES:
+            raise ValueError(f"scope deve ser um de {SEARCH_SCOPES}")
+        # Não há cast de varchar para regconfig: o nome (já validado) vai como literal
+        if not re.fullmatch(r"\w+", settings.SEARCH_TEXT_CONFIG):
+            raise ValueError(f"SEARCH_TEXT_CONFIG inválido: {settings.SEARCH_TEXT_CONFIG}")
+        tsquery = func.websearch_to_tsquery(literal_column(f"'{settings.SEARCH_TEXT_CONFIG}'::regconfig"), query)
+        columns = []
+        if scope in ("all", "tickets"):
+            columns.append(SearchService._tickets(tsquery, query_embedding, status, category_id, limit).label("tickets"))
+        if scope in ("all", "context"):
+            columns.append(SearchService._chunks(tsquery, query_embedding, category_id, limit).label("chunks"))
+        return select(*columns)
+
+    @staticmethod
+    def _tickets(tsquery, query_embedding: List[float], status: Optional[str], category_id: Optional[int], limit: int):
+        filters = []
+        if status:
+            filters.append(Ticket.status == status)
+        if category_id is not None:
+            filters.append(Ticket.category_id == category_id)
+
+        rank = func.ts_rank_cd(Ticket.search_vector, tsquery)
+        keyword = (
+            select(Ticket.id.label("id"), func.row_number().over(order_by=(rank.desc(), Ticket.id)).label("rank"))
+            .where(Ticket.search_vector.op("@@")(tsquery), *filters)
+            .order_by(rank.desc(), Ticket.id)
+            .limit(settings.SEARCH_CANDIDATES)
+            .cte("ticket_keyword")
+        )
+
+        # Chunks de tickets mais próximos pelo índice ANN; cada ticket vale pelo melhor chunk
+        chunks = similarity_statement(
+            Context.embedding, [Context.ticket_id], query_embedding, settings.SEARCH_CANDIDATES,
+            Context.ticket_id.isnot(None),
+        ).subquery("ticket_chunks")
+        best = func.max(chunks.c.similarity)
+        vector = (
+            select(Ticket.id.label("id"), func.row_number().over(order_by=(best.desc(), Ticket.id)).label("rank"))
+            .join(chunks, chunks.c.ticket_id == Ticket.id)
+            .where(*filters)
+            .group_by(Ticket.id)
+            .cte("ticket_vector")
+        )
+
+        fused = SearchService._fuse(keyword, vector, "ticket_fused", limit)
+        result = (
+            select(
+                func.json_build_object(
+                    "ticket_id", Ticket.id,
+                    "title", Ticket.title,
+                    "status", Ticket.status,
+                    "priority", Ticket.priority,
+                    "category_id", Ticket.category_id,
+                    "created_at", Ticket.created_at,
+                    "score", fused.c.score,
+                    "keyword_rank", fused.c.keyword_rank,
+                    "vector_rank", fused.c.vector_rank,
+                ).label("item"),
+                fused.c.score,
+            )
+            .join(fused, fused.c.id == Ticket.id)
+            .subquery("ticket_results")
+        )
+        return SearchService._json_array(result)
+
+    @staticmethod
+    def _chunks(tsquery, query_embedding: List[float], category_id: Optional[int], limit: int):
+        # Só conhecimento da categoria (documentos/contexto); chunks de tickets entram na busca de tickets
+        filters = [Context.ticket_id.is_(None)]
+        if category_id is not None:
+            filters.append(Context.category_id == category_id)
+
+        rank = func.ts_rank_cd(Context.search_vector, tsquery)
+        keyword = (
+            select(Context.id.label("id"), func.row_number().over(order_by=(rank.desc(), Context.id)).label("rank"))
+            .where(Context.search_vector.op("@@")(tsquery), *filters)
+            .order_by(rank.desc(), Context.id)
+            .limit(settings.SEARCH_CANDIDATES)
+            .cte("chunk_keyword")
+        )
+        nearest = similarity_statement(
+            Context.embedding, [Context.id], query_embedding, settings.SEARCH_CANDIDATES, *filters
+        ).subquery("chunk_nearest")
+        vector = (
+            select(nearest.c.id, func.row_number().over(order_by=(nearest.c.similarity.desc(), nearest.c.id)).label("rank"))
+            .cte("chunk_vector")
+        )
+
+        fused = SearchService._fuse(keyword, vector, "chunk_fused", limit)
+        result = (
+            select(
+                func.json_build_object(
+                    "context_id", Context.id,
+                    "category_id", Context.category_id,
+                    "document_id", Context.document_id,
+                    "chunk_index", Context.chunk_index,
+                    "text", Context.chunk_text,
+                    "score", fused.c.score,
+                    "keyword_rank", fused.c.keyword_rank,
+                    "vector_rank", fused.c.vector_rank,
+                ).label("item"),
+                fused.c.score,
+            )
+            .join(fused, fused.c.id == Context.id)
+            .subquery("chunk_results")
+        )
+        return SearchService._json_array(result)
+
+    @staticmethod
+    def _fuse(keyword, vector, name: str, limit: int):
+        """
+        Reciprocal Rank Fusion: score = soma de 1 / (SEARCH_RRF_K + posição) em cada ranking.
+        """
+        k = float(settings.SEARCH_RRF_K)
+        score = (
+            func.coalesce(1.0 / (k + cast(keyword.c.rank, Float)), 0.0)
+            + func.coalesce(1.0 / (k + cast(vector.c.rank, Float)), 0.0)
+        )
+        return (
+            select(
+                func.coalesce(keyword.c.id, vector.c.id).label("id"),
+                score.label("score"),
+                keyword.c.rank.label("keyword_rank"),
+                vector.c.rank.label("vector_rank"),
+            )
+            .select_from(keyword.join(vector, keyword.c.id == vector.c.id, full=True))
+            .order_by(score.desc(), func.coalesce(keyword.c.id, vector.c.id))
+            .limit(limit)
+            .cte(name)
+        )
+
+    @staticmethod
+    def _json_array(results):
+        return (
+            select(func.coalesce(
+                func.json_agg(aggregate_order_by(results.c.item, results.c.score.desc())),
+                func.json_build_array(),
+            ))
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def _parse(row) -> Dict[str, List[Dict[str, Any]]]:
+        # psycopg2 devolve json já decodificado; asyncpg devolve texto
+        return {
+            key: json.loads(value) if isinstance(value, str) else value
+            for key, value in row._mapping.items()
+        }
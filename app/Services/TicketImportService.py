@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import logging
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import String, func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.Core.config import settings
+from app.Database.models import Ticket, TicketCategory, TicketHistory, User
+from app.Services.DashboardService import DashboardService
+from app.Services.EmbeddingQueueService import EmbeddingQueueService
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+TICKET_COPY_COLUMNS = ("id", "title", "description", "status", "priority", "user_id", "category_id", "embedding_status")
+HISTORY_COPY_COLUMNS = ("ticket_id", "action", "performed_by")
+
+# Um único round trip reserva os ids do lote, para o histórico referenciar os tickets no mesmo COPY
+RESERVE_IDS_SQL = text(
+    "SELECT nextval(pg_get_serial_sequence('help_desk.tickets', 'id')) FROM generate_series(1, :count)"
+)
+
+ImportRow = Tuple[int, BaseModel]
+
+# O texto é decodificado em blocos: o erro aparece na primeira linha ainda não lida do bloco
+ENCODING_ERROR = "Arquivo não está em UTF-8 a partir desta linha; leitura interrompida"
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class TicketImportService:
+    """
+    Importação em massa de tickets a partir de NDJSON ou CSV. O arquivo é lido
+    linha a linha, cada linha é validada com o schema da API e os lotes válidos
+    vão para tickets/ticket_history via COPY, com um commit por lote.
+    A geração de embeddings fica para depois da carga: vai para a fila quando
+    houver, senão roda em lotes ao final. Produz eventos (dicts) de progresso e
+    de erro por linha, para a rota transmitir sem acumular o arquivo em memória.
+    """
+
+    @staticmethod
+    def detect_format(filename: Optional[str], requested: Optional[str] = None) -> str:
+        fmt = (requested or "").lower()
+        if not fmt and filename:
+            extension = filename.rsplit(".", 1)[-1].lower()
+            fmt = {"jsonl": "ndjson", "json": "ndjson"}.get(extension, extension)
+        if fmt not in IMPORT_FORMATS:
+            raise ImportFormatError(f"Formato não suportado; use {' ou '.join(IMPORT_FORMATS)}")
+        return fmt
+
+    @staticmethod
+    def iter_records(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Lê o arquivo sob demanda e gera (linha, registro, erro de parse). Um erro que
+        impede continuar a leitura (encoding inválido, CSV malformado) gera um último
+        registro de erro com a linha e encerra o arquivo; os lotes anteriores são mantidos.
+        """
+        reader = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        try:
+            if fmt == "csv":
+                rows = csv.DictReader(reader)
+                try:
+                    for record in rows:
+                        # Campos vazios assumem o default do schema; colunas extras são ignoradas
+                        yield rows.line_num, {k: v for k, v in record.items() if k is not None and v not in ("", None)}, None
+                except csv.Error as exc:
+                    # line_num conta só as linhas lidas sem erro
+                    yield rows.line_num + 1, None, f"CSV inválido: {exc}; leitura interrompida"
+                except UnicodeDecodeError:
+                    yield rows.line_num + 1, None, ENCODING_ERROR
+                return
+
+            line_no = 0
+            try:
+                for line_no, line in enumerate(reader, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError as exc:
+                        yield line_no, None, f"JSON inválido: {exc.msg}"
+                        continue
+                    if not isinstance(record, dict):
+                        yield line_no, None, "Cada linha deve ser um objeto JSON"
+                        continue
+                    yield line_no, record, None
+            except UnicodeDecodeError:
+                yield line_no + 1, None, ENCODING_ERROR
+        finally:
+            reader.detach()
+
+    @staticmethod
+    def import_tickets(db: Session, stream: BinaryIO, fmt: str, schema: Type[BaseModel],
+                       batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        batch_size = batch_size or settings.TICKET_IMPORT_BATCH_SIZE
+        category_ids = set(db.scalars(select(TicketCategory.id)))
+        totals = {"processed": 0, "imported": 0, "failed": 0}
+        batch: List[ImportRow] = []
+        # Lotes de embeddings sem fila: ids guardados só até o fim da carga
+        pending_index: List[int] = []
+
+        for line_no, record, error in TicketImportService.iter_records(stream, fmt):
+            totals["processed"] += 1
+            errors = [error] if error else []
+            row = None
+            if record is not None:
+                try:
+                    row = schema.model_validate(record)
+                except ValidationError as exc:
+                    errors = [f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in exc.errors()]
+            if row is not None and not errors:
+                errors = TicketImportService._check_row(row, category_ids)
+            if errors:
+                totals["failed"] += 1
+                yield {"event": "error", "line": line_no, "errors": errors}
+                continue
+
+            batch.append((line_no, row))
+            if len(batch) >= batch_size:
+                yield from TicketImportService._load_batch(db, batch, totals, pending_index)
+                batch = []
+
+        if batch:
+            yield from TicketImportService._load_batch(db, batch, totals, pending_index)
+
+        yield from TicketImportService._index_pending(db, pending_index)
+        yield {"event": "done", **totals}
+
+    @staticmethod
+    def _check_row(row: BaseModel, category_ids: set) -> List[str]:
+        errors = []
+        if row.category_id not in category_ids:
+            errors.append(f"category_id: categoria {row.category_id} não existe")
+        # COPY rejeita o lote inteiro se um valor estourar a coluna; melhor acusar a linha
+        for name, value in row.model_dump().items():
+            column = Ticket.__table__.c.get(name)
+            if column is not None and isinstance(column.type, String) and column.type.length \
+                    and isinstance(value, str) and len(value) > column.type.length:
+                errors.append(f"{name}: máximo de {column.type.length} caracteres")
+        return errors
+
+    @staticmethod
+    def _load_batch(db: Session, batch: List[ImportRow], totals: Dict[str, int],
+                    pending_index: List[int]) -> Iterator[Dict[str, Any]]:
+        user_ids = {row.user_id for _, row in batch}
+        known_users = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+        valid: List[ImportRow] = []
+        for line_no, row in batch:
+            if row.user_id in known_users:
+                valid.append((line_no, row))
+            else:
+                totals["failed"] += 1
+                yield {"event": "error", "line": line_no, "errors": [f"user_id: usuário {row.user_id} não existe"]}
+
+        if valid:
+            try:
+                ticket_ids = TicketImportService._copy_rows(db, [row for _, row in valid])
+                queued = EmbeddingQueueService.is_enabled()
+                if queued:
+                    for ticket_id in ticket_ids:
+                        EmbeddingQueueService.enqueue_ticket(db, ticket_id)
+                db.commit()
+            except SQLAlchemyError as exc:
+                db.rollback()
+                logger.error("Lote de importação rejeitado: %s", exc)
+                totals["failed"] += len(valid)
+                for line_no, _ in valid:
+                    yield {"event": "error", "line": line_no, "errors": ["Lote rejeitado pelo banco de dados"]}
+            else:
+                totals["imported"] += len(ticket_ids)
+                if not queued:
+                    pending_index.extend(ticket_ids)
+
+        yield {"event": "progress", **totals}
+
+    @staticmethod
+    def _copy_rows(db: Session, rows: List[BaseModel]) -> List[int]:
+        ticket_ids = list(db.scalars(RESERVE_IDS_SQL, {"count": len(rows)}))
+
+        tickets, history = io.StringIO(), io.StringIO()
+        ticket_writer, history_writer = csv.writer(tickets), csv.writer(history)
+        for ticket_id, row in zip(ticket_ids, rows):
+            ticket_writer.writerow((ticket_id, row.title, row.description, "open", row.priority or "medium",
+                                    row.user_id, row.category_id, "pending"))
+            history_writer.writerow((ticket_id, f"Ticket importado para o usuário {row.user_id}", row.user_id))
+        tickets.seek(0)
+        history.seek(0)
+
+        DashboardService.record_created(db, (
+            {"status": "open", "category_id": row.category_id, "priority": row.priority or "medium",
+             "assigned_to": None, "resolved_at": None}
+            for row in rows
+        ), db.scalar(select(func.current_date())))
+
+        # COPY usa a mesma conexão (e transação) da sessão
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(TicketImportService._copy_sql(Ticket, TICKET_COPY_COLUMNS), tickets)
+            cursor.copy_expert(TicketImportService._copy_sql(TicketHistory, HISTORY_COPY_COLUMNS), history)
+        except Exception as exc:
+            raise SQLAlchemyError(str(exc)) from exc
+        finally:
+            cursor.close()
+        return ticket_ids
+
+    @staticmethod
+    def _copy_sql(model, columns: Tuple[str, ...]) -> str:
+        table = model.__table__
+        return f"COPY {table.schema}.{table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    @staticmethod
+    def _index_pending(db: Session, ticket_ids: List[int]) -> Iterator[Dict[str, Any]]:
+        """
+        Sem fila: gera os embeddings dos tickets importados em lotes, após a carga.
+        Falhas deixam o ticket com embedding_status "pending" para nova tentativa.
+        """
+        batch_size = settings.EMBEDDING_QUEUE_BATCH_SIZE
+        indexed = 0
+        for start in range(0, len(ticket_ids), batch_size):
+            chunk = ticket_ids[start:start + batch_size]
+            try:
+                EmbeddingQueueService.process_jobs(db, [{"type": "ticket", "ticket_id": ticket_id} for ticket_id in chunk])
+            except Exception as exc:
+                db.rollback()
+                logger.error("Falha ao indexar tickets importados %s..%s: %s", chunk[0], chunk[-1], exc)
+                yield {"event": "index_error", "ticket_ids": chunk}
+                continue
+            indexed += len(chunk)
+            yield {"event": "indexing", "indexed": indexed, "total": len(ticket_ids)}
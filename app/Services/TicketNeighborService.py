@@ -0,0 +1,206 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.Core.config import settings
+from app.Database.models import Context, Ticket, TicketNeighbor
+from app.Database.vector_index import apply_search_params, similarity_statement
+
+logger = logging.getLogger(__name__)
+
+
+class TicketNeighborService:
+    """
+    Vizinhos mais próximos de cada ticket, gravados em ticket_neighbors quando o
+    ticket é indexado. A busca vetorial roda uma vez por ticket; abrir um ticket
+    ou checar duplicatas só lê até SIMILAR_TICKETS_K linhas pela chave primária.
+    """
+
+    @staticmethod
+    def refresh(db: Session, ticket_ids: Iterable[int]):
+        """
+        Recalcula os vizinhos dos tickets recém-indexados e os inclui nas listas
+        dos vizinhos encontrados, mantendo cada lista com até SIMILAR_TICKETS_K
+        itens. Não faz commit; os embeddings dos tickets já devem estar gravados.
+        """
+        ticket_ids = sorted(set(ticket_ids))
+        if not ticket_ids:
+            return
+
+        apply_search_params(db, settings.SIMILAR_TICKETS_CANDIDATES)
+        found: Dict[int, List[Tuple[int, float]]] = {
+            ticket_id: TicketNeighborService._nearest(db, ticket_id) for ticket_id in ticket_ids
+        }
+
+        involved = set(ticket_ids) | {neighbor_id for pairs in found.values() for neighbor_id, _ in pairs}
+        tickets = {
+            row.id: row for row in db.execute(
+                select(Ticket.id, Ticket.title, Ticket.status).where(Ticket.id.in_(involved))
+            )
+        }
+
+        # Relação simétrica: o novo ticket também entra na lista de cada vizinho
+        scores: Dict[Tuple[int, int], float] = {}
+        for ticket_id, pairs in found.items():
+            for neighbor_id, similarity in pairs:
+                if neighbor_id in tickets:
+                    scores[(ticket_id, neighbor_id)] = similarity
+                    scores.setdefault((neighbor_id, ticket_id), similarity)
+
+        db.execute(delete(TicketNeighbor).where(TicketNeighbor.ticket_id.in_(ticket_ids)))
+        if scores:
+            # Ordem fixa das chaves evita deadlock entre workers atualizando as mesmas listas
+            rows = [
+                {
+                    "ticket_id": ticket_id,
+                    "neighbor_id": neighbor_id,
+                    "similarity": similarity,
+                    "neighbor_title": tickets[neighbor_id].title,
+                    "neighbor_status": tickets[neighbor_id].status,
+                }
+                for (ticket_id, neighbor_id), similarity in sorted(scores.items())
+            ]
+            stmt = pg_insert(TicketNeighbor).values(rows)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[TicketNeighbor.ticket_id, TicketNeighbor.neighbor_id],
+                set_={"similarity": stmt.excluded.similarity, "neighbor_status": stmt.excluded.neighbor_status},
+            ))
+            TicketNeighborService._trim(db, {ticket_id for ticket_id, _ in scores})
+
+    @staticmethod
+    def update_status(db: Session, ticket_id: int, status: str):
+        """
+        Propaga a mudança de status (ex.: fechamento) para as listas em que o ticket aparece.
+        """
+        db.execute(
+            update(TicketNeighbor)
+            .where(TicketNeighbor.neighbor_id == ticket_id)
+            .values(neighbor_status=status)
+        )
+
+    @staticmethod
+    def get_similar(db: Session, ticket_id: int, limit: Optional[int] = None, status: Optional[str] = None,
+                    min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Tickets semelhantes já calculados, do mais para o menos parecido.
+        status="open" / "closed" filtra pelos status de DASHBOARD_CLOSED_STATUSES.
+        """
+        query = (
+            select(TicketNeighbor)
+            .where(TicketNeighbor.ticket_id == ticket_id)
+            .order_by(TicketNeighbor.similarity.desc(), TicketNeighbor.neighbor_id)
+        )
+        if min_score is not None:
+            query = query.where(TicketNeighbor.similarity >= min_score)
+        if status == "open":
+            # NOT IN descarta NULL: vizinho sem status conta como aberto
+            query = query.where(or_(
+                TicketNeighbor.neighbor_status.notin_(settings.DASHBOARD_CLOSED_STATUSES),
+                TicketNeighbor.neighbor_status.is_(None),
+            ))
+        elif status == "closed":
+            query = query.where(TicketNeighbor.neighbor_status.in_(settings.DASHBOARD_CLOSED_STATUSES))
+        query = query.limit(limit or settings.SIMILAR_TICKETS_K)
+        return [
+            {
+                "ticket_id": row.neighbor_id,
+                "title": row.neighbor_title,
+                "status": row.neighbor_status,
+                "similarity": row.similarity,
+            }
+            for row in db.scalars(query)
+        ]
+
+    @staticmethod
+    def get_possible_duplicates(db: Session, ticket_id: int) -> List[Dict[str, Any]]:
+        """
+        Tickets abertos quase idênticos ao informado (DUPLICATE_TICKET_MIN_SCORE).
+        """
+        return TicketNeighborService.get_similar(
+            db, ticket_id, status="open", min_score=settings.DUPLICATE_TICKET_MIN_SCORE
+        )
+
+    @staticmethod
+    def backfill(db: Session, batch_size: int = 100) -> int:
+        """
+        Calcula os vizinhos de todos os tickets já indexados (carga inicial), com um commit por lote.
+        """
+        from app.Services.EmbeddingQueueService import STATUS_INDEXED
+
+        total = 0
+        last_id = 0
+        while True:
+            ticket_ids = db.scalars(
+                select(Ticket.id)
+                .where(Ticket.id > last_id, Ticket.embedding_status == STATUS_INDEXED)
+                .order_by(Ticket.id)
+                .limit(batch_size)
+            ).all()
+            if not ticket_ids:
+                return total
+            TicketNeighborService.refresh(db, ticket_ids)
+            db.commit()
+            total += len(ticket_ids)
+            last_id = ticket_ids[-1]
+
+    @staticmethod
+    def _nearest(db: Session, ticket_id: int) -> List[Tuple[int, float]]:
+        """
+        Vetor médio dos chunks do ticket contra o índice ANN de Context; a
+        similaridade de cada vizinho é a do seu chunk mais próximo.
+        """
+        probe = db.scalar(select(func.avg(Context.embedding, type_=Context.embedding.type)).where(Context.ticket_id == ticket_id))
+        if probe is None:
+            return []
+
+        candidates = db.execute(similarity_statement(
+            Context.embedding, [Context.ticket_id], probe, settings.SIMILAR_TICKETS_CANDIDATES,
+            Context.ticket_id.isnot(None), Context.ticket_id != ticket_id,
+        )).all()
+
+        best: Dict[int, float] = defaultdict(float)
+        for neighbor_id, similarity in candidates:
+            if similarity >= settings.SIMILAR_TICKETS_MIN_SCORE:
+                best[neighbor_id] = max(best[neighbor_id], float(similarity))
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:settings.SIMILAR_TICKETS_K]
+
+    @staticmethod
+    def _trim(db: Session, ticket_ids: Iterable[int]):
+        ranked = (
+            select(
+                TicketNeighbor.ticket_id,
+                TicketNeighbor.neighbor_id,
+                func.row_number().over(
+                    partition_by=TicketNeighbor.ticket_id,
+                    order_by=(TicketNeighbor.similarity.desc(), TicketNeighbor.neighbor_id),
+                ).label("rank"),
+            )
+            .where(TicketNeighbor.ticket_id.in_(sorted(ticket_ids)))
+            .subquery()
+        )
+        db.execute(
+            delete(TicketNeighbor)
+            .where(
+                TicketNeighbor.ticket_id == ranked.c.ticket_id,
+                TicketNeighbor.neighbor_id == ranked.c.neighbor_id,
+                ranked.c.rank > settings.SIMILAR_TICKETS_K,
+            )
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.Database.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Calcula os tickets semelhantes de todos os tickets indexados")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    db = SessionLocal()
+    try:
+        logger.info("Vizinhos calculados para %d tickets", TicketNeighborService.backfill(db, args.batch_size))
+    finally:
+        db.close()
@@ -1,13 +1,21 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import delete, tuple_
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, Dict, List, Optional, Tuple
+from app.Core.chunking import iter_chunks
+from app.Core.config import settings
+from app.Core.pagination import clamp_page_size, decode_cursor, encode_cursor
 from app.Database.models import Ticket, TicketMessage, TicketHistory, Context
+from app.Services.DashboardService import DashboardService
 from app.Services.LLMService import LLMService
+from app.Services.EmbeddingQueueService import EmbeddingQueueService
+from app.Services.TicketNeighborService import TicketNeighborService
 from datetime import datetime
 
 class TicketService:
 
     @staticmethod
-    def create_ticket(db: Session, title: str, description: str, user_id: int, category_id: int, priority: str = "medium"):
+    def create_ticket(db: Session, title: str, description: str, user_id: int, category_id: int, priority: str = "medium",
+                      index_now: bool = False):
         new_ticket = Ticket(
             title=title,
             description=description,
@@ -17,20 +25,45 @@ class TicketService:
             category_id=category_id
         )
         db.add(new_ticket)
-        db.commit()
-        db.refresh(new_ticket)
+        db.flush()  # obtém o id; ticket, histórico e embeddings vão no mesmo commit
 
         # Registrar histórico
         TicketService._log_history(db, new_ticket.id, f"Ticket criado por usuário {user_id}", user_id) # Pensar melhor nisso
 
-        # Gerar embeddings (IA) com base no título + descrição
-        chunks = TicketService._split_text(f"{title}\n\n{description}")
-        LLMService.store_embedding(db, new_ticket.id, chunks) # Colocar um interpretador de imagem?
+        # Gerar embeddings (IA) com base no título + descrição, em background quando houver fila.
+        # index_now indexa já (e calcula os vizinhos) para a checagem de duplicatas na criação
+        EmbeddingQueueService.enqueue_ticket(db, new_ticket.id, inline=index_now) # Colocar um interpretador de imagem?
+
+        # Por último: mantém o lock das linhas de resumo pelo menor tempo possível
+        DashboardService.record_created(db, [DashboardService.snapshot(new_ticket)], new_ticket.created_at.date())
 
+        db.commit()
         return new_ticket
 
     @staticmethod
-    def list_tickets(db: Session, status: Optional[str] = None, category_id: Optional[int] = None, user_id: Optional[int] = None) -> List[Ticket]:
+    def get_indexing_status(db: Session, ticket_id: int) -> Optional[str]:
+        ticket = db.query(Ticket.embedding_status).filter(Ticket.id == ticket_id).first()
+        return ticket.embedding_status if ticket else None
+
+    @staticmethod
+    def _index_ticket(db: Session, ticket: Ticket):
+        """
+        Gera os embeddings do título + descrição do ticket (sem commit). Substitui os
+        chunks anteriores do ticket: reprocessar o mesmo job (ex.: worker que caiu
+        depois do commit) ou reindexar após uma edição não duplica linhas.
+        """
+        db.execute(delete(Context).where(Context.ticket_id == ticket.id))
+        chunks = iter_chunks(f"{ticket.title}\n\n{ticket.description}")
+        LLMService.store_context_chunks(db, chunks, ticket_id=ticket.id)
+
+    @staticmethod
+    def list_tickets(db: Session, status: Optional[str] = None, category_id: Optional[int] = None, user_id: Optional[int] = None,
+                     limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Ticket], Optional[str]]:
+        """
+        Lista tickets do mais recente para o mais antigo, paginando por (created_at, id).
+        Retorna a página e o cursor da próxima (None na última).
+        """
+        limit = clamp_page_size(limit, settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX)
         query = db.query(Ticket)
         if status:
             query = query.filter(Ticket.status == status)
@@ -38,23 +71,98 @@ class TicketService:
             query = query.filter(Ticket.category_id == category_id)
         if user_id:
             query = query.filter(Ticket.user_id == user_id)
-        return query.all()
+        if cursor:
+            created_at, ticket_id = decode_cursor(cursor)
+            query = query.filter(tuple_(Ticket.created_at, Ticket.id) < tuple_(created_at, ticket_id))
+
+        # Busca um a mais para saber se existe próxima página
+        tickets = query.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(tickets) > limit:
+            tickets = tickets[:limit]
+            next_cursor = encode_cursor(tickets[-1].created_at, tickets[-1].id)
+        return tickets, next_cursor
 
 
     @staticmethod
     def get_ticket_by_id(db: Session, ticket_id: int):
         return db.query(Ticket).filter(Ticket.id == ticket_id).first()
 
+    @staticmethod
+    def get_ticket_detail(db: Session, ticket_id: int, messages_limit: Optional[int] = None,
+                          history_limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Ticket com criador, responsável e categoria, mais a página mais recente de
+        mensagens e de histórico. Sempre 3 queries, qualquer que seja o tamanho da conversa.
+        """
+        ticket = (
+            db.query(Ticket)
+            .options(
+                joinedload(Ticket.user),
+                joinedload(Ticket.assigned_to_user),
+                joinedload(Ticket.category),
+            )
+            .filter(Ticket.id == ticket_id)
+            .first()
+        )
+        if not ticket:
+            return None
+
+        messages, messages_cursor = TicketService.list_messages(db, ticket_id, messages_limit)
+        history, history_cursor = TicketService.list_history(db, ticket_id, history_limit)
+        return {
+            "ticket": ticket,
+            "messages": {"items": messages, "next_cursor": messages_cursor},
+            "history": {"items": history, "next_cursor": history_cursor},
+        }
+
+    @staticmethod
+    def list_messages(db: Session, ticket_id: int, limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> Tuple[List[TicketMessage], Optional[str]]:
+        """
+        Mensagens do ticket da mais recente para a mais antiga, com o remetente.
+        """
+        query = db.query(TicketMessage).options(joinedload(TicketMessage.sender))
+        return TicketService._ticket_page(query, TicketMessage, ticket_id, limit, cursor)
+
+    @staticmethod
+    def list_history(db: Session, ticket_id: int, limit: Optional[int] = None,
+                     cursor: Optional[str] = None) -> Tuple[List[TicketHistory], Optional[str]]:
+        query = db.query(TicketHistory).options(joinedload(TicketHistory.performer))
+        return TicketService._ticket_page(query, TicketHistory, ticket_id, limit, cursor)
+
+    @staticmethod
+    def _ticket_page(query, model, ticket_id: int, limit: Optional[int], cursor: Optional[str]):
+        # Usa os índices (ticket_id, created_at, id) de mensagens e histórico
+        limit = clamp_page_size(limit, settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX)
+        query = query.filter(model.ticket_id == ticket_id)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return rows, next_cursor
+
     @staticmethod
     def update_ticket(db: Session, ticket_id: int, status: Optional[str] = None, priority: Optional[str] = None, assigned_to: Optional[int] = None):
         ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
         if not ticket:
             return None
 
+        before = DashboardService.snapshot(ticket)
         changes = []
         if status and ticket.status != status:
             ticket.status = status
             changes.append(f"Status alterado para {status}")
+            TicketNeighborService.update_status(db, ticket.id, status)
+            if DashboardService.is_closed(status) and not ticket.resolved_at:
+                ticket.resolved_at = datetime.utcnow()
+            elif not DashboardService.is_closed(status):
+                ticket.resolved_at = None
         if priority and ticket.priority != priority:
             ticket.priority = priority
             changes.append(f"Prioridade alterada para {priority}")
@@ -63,49 +171,28 @@ class TicketService:
             changes.append(f"Atribuído ao usuário {assigned_to}")
 
         ticket.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(ticket)
 
         # Registrar histórico
         for change in changes:
             TicketService._log_history(db, ticket.id, change, assigned_to or ticket.user_id)
 
+        DashboardService.record_change(db, before, DashboardService.snapshot(ticket))
+        db.commit()
         return ticket
 
     @staticmethod
     def add_message(db: Session, ticket_id: int, sender_id: int, message: str):
         new_message = TicketMessage(ticket_id=ticket_id, sender_id=sender_id, message=message)
         db.add(new_message)
-        db.commit()
-        db.refresh(new_message)
 
         # Registrar histórico
         TicketService._log_history(db, ticket_id, f"Mensagem adicionada pelo usuário {sender_id}", sender_id)
 
+        db.commit()
         return new_message
 
     @staticmethod
     def _log_history(db: Session, ticket_id: int, action: str, performed_by: int):
+        # Sem commit: o histórico entra na transação da operação que o gerou
         log = TicketHistory(ticket_id=ticket_id, action=action, performed_by=performed_by)
         db.add(log)
-        db.commit()
-
-    @staticmethod
-    def _split_text(text: str, chunk_size: int = 400) -> List[str]:
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_length = 0
-
-        for word in words:
-            if current_length + len(word) + 1 > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = []
-                current_length = 0
-            current_chunk.append(word)
-            current_length += len(word) + 1
-
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-
-        return chunks
@@ -0,0 +1,147 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+from redis.exceptions import RedisError
+from app.Core.config import settings
+from app.Core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "auth:principal:{user_id}"
+INVALIDATION_CHANNEL = "auth:principal:invalidate"
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """
+    Dados do usuário autenticado que a API precisa em cada requisição.
+    """
+    id: int
+    full_name: str
+    email: str
+    role: str
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user) -> "UserPrincipal":
+        return cls(id=user.id, full_name=user.full_name, email=user.email,
+                   role=user.role, is_active=bool(user.is_active))
+
+
+class UserPrincipalCache:
+    """
+    Cache de curta duração do usuário autenticado, para não consultar o banco
+    em toda requisição. Nível local por processo + Redis opcional compartilhado.
+    invalidate() apaga a entrada no Redis e avisa os outros workers via pub/sub.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, local_ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = local_ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, UserPrincipal]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscriber = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[UserPrincipal]:
+        self._ensure_subscribed()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+
+        principal = self._redis_get(user_id)
+        with self._lock:
+            if principal:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if principal:
+            self._remember(principal)
+        return principal
+
+    def set(self, principal: UserPrincipal):
+        self._remember(principal)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.set(REDIS_KEY.format(user_id=principal.id), json.dumps(asdict(principal)), ex=self.ttl_seconds)
+        except RedisError as exc:
+            logger.warning("Falha ao gravar usuário no cache Redis: %s", exc)
+
+    def invalidate(self, user_id: int):
+        self._forget(user_id)
+        client = get_redis()
+        if client is None:
+            return
+        try:
+            client.delete(REDIS_KEY.format(user_id=user_id))
+            client.publish(INVALIDATION_CHANNEL, str(user_id))
+        except RedisError as exc:
+            logger.warning("Falha ao invalidar usuário no cache Redis: %s", exc)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, principal: UserPrincipal):
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.local_ttl_seconds, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def _redis_get(self, user_id: int) -> Optional[UserPrincipal]:
+        client = get_redis()
+        if client is None:
+            return None
+        try:
+            data = client.get(REDIS_KEY.format(user_id=user_id))
+        except RedisError as exc:
+            logger.warning("Falha ao ler usuário do cache Redis: %s", exc)
+            return None
+        return UserPrincipal(**json.loads(data)) if data else None
+
+    def _ensure_subscribed(self):
+        """
+        Assina o canal de invalidação (uma vez por processo) para descartar
+        entradas locais quando outro worker altera ou remove um usuário.
+        """
+        if self._subscriber is not None:
+            return
+        client = get_redis()
+        if client is None:
+            self._subscriber = False
+            return
+        with self._lock:
+            if self._subscriber is not None:
+                return
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: lambda message: self._forget(int(message["data"]))})
+                self._subscriber = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            except RedisError as exc:
+                # Sem pub/sub, as entradas locais ainda expiram em local_ttl_seconds
+                logger.warning("Falha ao assinar invalidações de usuário: %s", exc)
+                self._subscriber = False
+
+
+user_cache = UserPrincipalCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    local_ttl_seconds=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+)
@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
 from app.Database.models import User
+from app.Services.UserPrincipalCache import user_cache
 
 class UserService:
 
@@ -36,6 +37,7 @@ class UserService:
             user.is_active = is_active
         db.commit()
         db.refresh(user)
+        user_cache.invalidate(user_id)
         return user
 
     @staticmethod
@@ -45,4 +47,5 @@ class UserService:
             return None
         db.delete(user)
         db.commit()
+        user_cache.invalidate(user_id)
         return True
@@ -0,0 +1,433 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.Core.config import settings
+from app.Database.models import Context
+
+logger = logging.getLogger(__name__)
+
+DELETED_ID = -1
+SEARCH_BLOCK_ROWS = 65_536
+# Índices float16 são convertidos para float32 por bloco (o numpy não tem BLAS em
+# float16): o bloco é limitado em bytes para a cópia não crescer com a dimensão
+CONVERT_BLOCK_BYTES = 16 * 1024 * 1024
+SESSION_PENDING_KEY = "vector_index_pending"
+SESSION_LISTENING_KEY = "vector_index_listening"
+
+
+class MmapVectorIndex:
+    """
+    Índice vetorial de uma categoria em arquivos mapeados em memória:
+
+        <dir>/category_<id>/meta.json          dimensão e dtype
+        <dir>/category_<id>/CURRENT            geração ativa
+        <dir>/category_<id>/vectors.<gen>.bin  matriz contígua (n x dim), float32 ou float16
+        <dir>/category_<id>/ids.<gen>.bin      ids de Context (int64); -1 marca linha removida
+
+    Inclusões são anexadas ao fim dos arquivos e remoções viram tombstones, sem
+    reconstrução. Quando há tombstones demais, a compactação grava uma nova geração
+    e troca CURRENT atomicamente. Como o mapeamento é somente leitura e compartilhado,
+    todos os workers usam as mesmas páginas do page cache do sistema.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state: Optional[Tuple] = None  # (assinatura, vetores, ids)
+        self.dim: Optional[int] = None
+        self.dtype: Optional[np.dtype] = None
+        self._load_meta()
+
+    # Leitura -----------------------------------------------------------------
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.path, "CURRENT"))
+
+    def search(self, query: Sequence[float], top_k: int) -> Optional[List[Tuple[int, float]]]:
+        """
+        Top-k por similaridade de cosseno (produto interno de vetores normalizados).
+        Retorna None se os arquivos do índice sumiram (ex.: categoria removida ou
+        compactação em andamento): quem chama cai para o pgvector.
+        """
+        mapped = self._mapped()
+        if mapped is None:
+            return None
+        vectors, ids = mapped
+        n = len(ids)
+        if n == 0:
+            return []
+
+        q = np.asarray(query, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = np.empty(n, dtype=np.float32)
+        if vectors.dtype == np.float32:
+            for start in range(0, n, SEARCH_BLOCK_ROWS):
+                block = vectors[start:start + SEARCH_BLOCK_ROWS]
+                np.matmul(block, q, out=scores[start:start + len(block)])
+        else:
+            # Um único buffer float32 reaproveitado em todos os blocos, com acumulação em float32
+            rows = max(1, CONVERT_BLOCK_BYTES // (self.dim * 4))
+            buffer = np.empty((min(rows, n), self.dim), dtype=np.float32)
+            for start in range(0, n, rows):
+                block = vectors[start:start + rows]
+                converted = buffer[:len(block)]
+                np.copyto(converted, block)
+                np.matmul(converted, q, out=scores[start:start + len(block)])
+        scores[ids == DELETED_ID] = -np.inf
+
+        k = min(top_k, n)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[pos]), float(scores[pos])) for pos in top if ids[pos] != DELETED_ID]
+
+    def preload(self) -> int:
+        """
+        Mapeia os arquivos e lê todas as páginas, trazendo-as para o page cache antes
+        da primeira busca. Retorna o número de linhas carregadas.
+        """
+        mapped = self._mapped()
+        if mapped is None:
+            return 0
+        vectors, ids = mapped
+        for start in range(0, len(ids), SEARCH_BLOCK_ROWS):
+            # Uma leitura por bloco basta para o kernel carregar as páginas
+            np.add.reduce(vectors[start:start + SEARCH_BLOCK_ROWS], axis=None)
+        np.count_nonzero(ids == DELETED_ID)
+        return len(ids)
+
+    def _mapped(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        signature = self._signature()
+        if signature is None:
+            return None
+        with self._lock:
+            if self._state is None or self._state[0] != signature:
+                self._load_meta()
+                gen, vec_size, ids_size = signature
+                rows = min(ids_size // 8, vec_size // (self.dim * self.dtype.itemsize))
+                if rows == 0:
+                    vectors = np.empty((0, self.dim), dtype=self.dtype)
+                    ids = np.empty(0, dtype=np.int64)
+                else:
+                    vectors = np.memmap(self._file("vectors", gen), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+                    ids = np.memmap(self._file("ids", gen), dtype=np.int64, mode="r", shape=(rows,))
+                self._state = (signature, vectors, ids)
+            return self._state[1], self._state[2]
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        gen = self._current_gen()
+        if gen is None:
+            return None
+        try:
+            return gen, os.path.getsize(self._file("vectors", gen)), os.path.getsize(self._file("ids", gen))
+        except FileNotFoundError:
+            return None
+
+    # Escrita -----------------------------------------------------------------
+
+    def add(self, context_ids: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """
+        Anexa vetores a um índice existente. Sem índice, não faz nada: criar um aqui
+        deixaria de fora as linhas que a categoria já tem (a carga inicial é o
+        replace_all, via rebuild_category), e até lá a busca cai para o pgvector.
+        """
+        if not context_ids:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+        if not self.exists():
+            return
+        with self._writer():
+            gen = self._current_gen()
+            if gen is None:
+                return
+            # Vetores primeiro: leitores usam o menor número de linhas completo entre os dois arquivos
+            with open(self._file("vectors", gen), "ab") as fh:
+                fh.write(matrix.astype(self.dtype).tobytes())
+            with open(self._file("ids", gen), "ab") as fh:
+                fh.write(np.asarray(context_ids, dtype=np.int64).tobytes())
+
+    def remove(self, context_ids: Sequence[int]):
+        if not context_ids or not self.exists():
+            return
+        with self._writer():
+            gen = self._current_gen()
+            ids_path = self._file("ids", gen)
+            rows = os.path.getsize(ids_path) // 8
+            if rows == 0:
+                return
+            ids = np.memmap(ids_path, dtype=np.int64, mode="r+", shape=(rows,))
+            ids[np.isin(ids, np.asarray(context_ids, dtype=np.int64))] = DELETED_ID
+            ids.flush()
+            deleted_ratio = float(np.count_nonzero(ids == DELETED_ID)) / rows
+            del ids
+            if deleted_ratio >= settings.VECTOR_MMAP_COMPACT_RATIO:
+                self._compact(gen)
+
+    def replace_all(self, context_ids: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """
+        Reconstrói o índice inteiro em uma nova geração (carga inicial).
+        """
+        with self._writer():
+            previous = self._current_gen()
+            gen = (previous if previous is not None else -1) + 1
+            matrix = np.asarray(vectors, dtype=np.float32).reshape(len(context_ids), -1)
+            if len(context_ids):
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+            self._write_meta(matrix.shape[1] if len(context_ids) else settings.VECTOR_MMAP_DIM)
+            with open(self._file("vectors", gen), "wb") as fh:
+                fh.write(matrix.astype(self.dtype).tobytes())
+            with open(self._file("ids", gen), "wb") as fh:
+                fh.write(np.asarray(context_ids, dtype=np.int64).tobytes())
+            self._set_current(gen)
+            if previous is not None:
+                for name in ("vectors", "ids"):
+                    os.unlink(self._file(name, previous))
+
+    def drop(self):
+        with self._lock:
+            self._state = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _compact(self, gen: int):
+        rows = os.path.getsize(self._file("ids", gen)) // 8
+        ids = np.fromfile(self._file("ids", gen), dtype=np.int64, count=rows)
+        vectors = np.fromfile(self._file("vectors", gen), dtype=self.dtype, count=rows * self.dim).reshape(rows, self.dim)
+        keep = ids != DELETED_ID
+        new_gen = gen + 1
+        vectors[keep].tofile(self._file("vectors", new_gen))
+        ids[keep].tofile(self._file("ids", new_gen))
+        self._set_current(new_gen)
+        # Leitores que ainda mapeiam a geração antiga continuam válidos até remapear
+        for name in ("vectors", "ids"):
+            os.unlink(self._file(name, gen))
+
+    # Arquivos ----------------------------------------------------------------
+
+    @contextmanager
+    def _writer(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load_meta()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _file(self, name: str, gen: int) -> str:
+        return os.path.join(self.path, f"{name}.{gen}.bin")
+
+    def _current_gen(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as fh:
+                return int(fh.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _set_current(self, gen: int):
+        for name in ("vectors", "ids"):
+            open(self._file(name, gen), "ab").close()
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, "w") as fh:
+            fh.write(str(gen))
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+    def _load_meta(self):
+        try:
+            with open(os.path.join(self.path, "meta.json")) as fh:
+                meta = json.load(fh)
+            self.dim, self.dtype = meta["dim"], np.dtype(meta["dtype"])
+        except FileNotFoundError:
+            self.dim, self.dtype = None, np.dtype(settings.VECTOR_MMAP_DTYPE)
+
+    def _write_meta(self, dim: int):
+        self.dim, self.dtype = dim, np.dtype(settings.VECTOR_MMAP_DTYPE)
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as fh:
+            json.dump({"dim": dim, "dtype": self.dtype.name}, fh)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+
+_indexes: Dict[int, MmapVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+class VectorIndexService:
+    """
+    Motor de busca vetorial em memória (mmap) para categorias "quentes",
+    alternativo ao pgvector. Ativado com VECTOR_SEARCH_ENGINE="mmap".
+    """
+
+    @staticmethod
+    def is_enabled_for(category_id: Optional[int]) -> bool:
+        if settings.VECTOR_SEARCH_ENGINE != "mmap" or category_id is None:
+            return False
+        hot = settings.VECTOR_MMAP_CATEGORIES
+        return not hot or category_id in hot
+
+    @staticmethod
+    def get_index(category_id: int) -> MmapVectorIndex:
+        with _indexes_lock:
+            index = _indexes.get(category_id)
+            if index is None:
+                index = MmapVectorIndex(os.path.join(settings.VECTOR_MMAP_DIR, f"category_{category_id}"))
+                _indexes[category_id] = index
+            return index
+
+    @staticmethod
+    def search(db: Session, category_id: int, query_embedding: List[float], top_k: int) -> Optional[List[Dict]]:
+        """
+        Retorna os chunks mais similares da categoria, ou None se o índice ainda não existe
+        (nesse caso quem chama deve cair para o pgvector).
+        """
+        hits = VectorIndexService.search_ids(category_id, query_embedding, top_k)
+        if not hits:
+            return hits
+        rows = db.execute(VectorIndexService._rows_statement(hits)).fetchall()
+        return VectorIndexService._merge_rows(hits, rows)
+
+    @staticmethod
+    async def asearch(db: AsyncSession, category_id: int, query_embedding: List[float], top_k: int) -> Optional[List[Dict]]:
+        # A varredura do mmap é CPU (o numpy solta o GIL): fora do event loop, não trava as outras requisições
+        hits = await asyncio.to_thread(VectorIndexService.search_ids, category_id, query_embedding, top_k)
+        if not hits:
+            return hits
+        rows = (await db.execute(VectorIndexService._rows_statement(hits))).fetchall()
+        return VectorIndexService._merge_rows(hits, rows)
+
+    @staticmethod
+    def search_ids(category_id: int, query_embedding: List[float], top_k: int) -> Optional[List[Tuple[int, float]]]:
+        index = VectorIndexService.get_index(category_id)
+        if not index.exists():
+            return None
+        return index.search(query_embedding, top_k)
+
+    @staticmethod
+    def _rows_statement(hits: List[Tuple[int, float]]):
+        return select(Context.id, Context.ticket_id, Context.chunk_text).where(Context.id.in_([cid for cid, _ in hits]))
+
+    @staticmethod
+    def _merge_rows(hits: List[Tuple[int, float]], rows) -> List[Dict]:
+        by_id = {row.id: row for row in rows}
+        # Ids sem linha (ex.: transação desfeita após anexar ao índice) são ignorados
+        return [
+            {"ticket_id": by_id[cid].ticket_id, "text": by_id[cid].chunk_text, "score": score}
+            for cid, score in hits if cid in by_id
+        ]
+
+    @staticmethod
+    def add(category_id: int, context_ids: List[int], embeddings: List[List[float]]):
+        if VectorIndexService.is_enabled_for(category_id):
+            VectorIndexService.get_index(category_id).add(context_ids, embeddings)
+
+    @staticmethod
+    def remove(category_id: int, context_ids: List[int]):
+        if VectorIndexService.is_enabled_for(category_id):
+            VectorIndexService.get_index(category_id).remove(context_ids)
+
+    @staticmethod
+    def add_on_commit(db: Session, category_id: int, context_ids: List[int], embeddings: List[List[float]]):
+        """
+        Agenda add() para depois do commit da sessão: os arquivos do índice não têm
+        rollback, e um id anexado de uma transação desfeita apontaria para nada.
+        """
+        if VectorIndexService.is_enabled_for(category_id) and context_ids:
+            VectorIndexService._schedule(db, ("add", category_id, list(context_ids), embeddings))
+
+    @staticmethod
+    def remove_on_commit(db: Session, category_id: int, context_ids: List[int]):
+        """
+        Agenda remove() para depois do commit: remover antes e desfazer a transação
+        deixaria linhas vivas marcadas como removidas no índice.
+        """
+        if VectorIndexService.is_enabled_for(category_id) and context_ids:
+            VectorIndexService._schedule(db, ("remove", category_id, list(context_ids), None))
+
+    @staticmethod
+    def _schedule(db: Session, operation: Tuple):
+        if not db.info.get(SESSION_LISTENING_KEY):
+            event.listen(db, "after_commit", VectorIndexService._apply_pending)
+            event.listen(db, "after_soft_rollback", VectorIndexService._discard_pending)
+            db.info[SESSION_LISTENING_KEY] = True
+        db.info.setdefault(SESSION_PENDING_KEY, []).append(operation)
+
+    @staticmethod
+    def _apply_pending(db: Session):
+        # Na ordem da transação: um chunk removido e reinserido termina presente
+        for op, category_id, context_ids, embeddings in db.info.pop(SESSION_PENDING_KEY, []):
+            try:
+                if op == "add":
+                    VectorIndexService.add(category_id, context_ids, embeddings)
+                else:
+                    VectorIndexService.remove(category_id, context_ids)
+            except (OSError, ValueError) as exc:
+                # O banco já tem os dados; o índice volta a ficar consistente com rebuild_category
+                logger.error("Falha ao atualizar o índice mmap da categoria %s (%s): %s", category_id, op, exc)
+
+    @staticmethod
+    def _discard_pending(db: Session, previous_transaction):
+        db.info.pop(SESSION_PENDING_KEY, None)
+
+    @staticmethod
+    def drop_category(category_id: int):
+        VectorIndexService.get_index(category_id).drop()
+        with _indexes_lock:
+            _indexes.pop(category_id, None)
+
+    @staticmethod
+    def preload() -> Dict[int, int]:
+        """
+        Pré-carrega os índices das categorias quentes (ou de todas em VECTOR_MMAP_DIR).
+        Retorna as linhas carregadas por categoria.
+        """
+        if settings.VECTOR_SEARCH_ENGINE != "mmap":
+            return {}
+        category_ids = list(settings.VECTOR_MMAP_CATEGORIES)
+        if not category_ids and os.path.isdir(settings.VECTOR_MMAP_DIR):
+            category_ids = sorted(
+                int(name.split("_", 1)[1]) for name in os.listdir(settings.VECTOR_MMAP_DIR)
+                if name.startswith("category_") and name.split("_", 1)[1].isdigit()
+            )
+        return {category_id: VectorIndexService.get_index(category_id).preload() for category_id in category_ids}
+
+    @staticmethod
+    def rebuild_category(db: Session, category_id: int) -> int:
+        """
+        Carrega do banco todos os embeddings da categoria para o índice mmap.
+        """
+        rows = db.execute(
+            select(Context.id, Context.embedding).where(Context.category_id == category_id).order_by(Context.id)
+        ).fetchall()
+        VectorIndexService.get_index(category_id).replace_all(
+            [row.id for row in rows], [list(row.embedding) for row in rows]
+        )
+        return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.Database.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Reconstrói o índice vetorial mmap a partir do banco")
+    parser.add_argument("category_ids", type=int, nargs="+")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for category_id in args.category_ids:
+            count = VectorIndexService.rebuild_category(db, category_id)
+            print(f"Categoria {category_id}: {count} chunks indexados")
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+"""
+Vazão do chunker compartilhado (app.Core.chunking) em documentos de vários MB,
+comparado ao _split_text antigo (orçamento em caracteres, sem deduplicação).
+O documento sintético mistura parágrafos únicos com rodapés/avisos repetidos,
+como em exportações de e-mail e bases de conhecimento.
+
+Uso:
+    python -m benchmarks.bench_chunking --megabytes 4 --boilerplate-ratio 0.3
+"""
+import argparse
+import json
+import random
+import time
+
+
+WORDS = (
+    "acesso senha vpn rede impressora sistema erro usuário servidor conexão email "
+    "configuração atualização licença backup arquivo pasta permissão login token "
+    "firewall proxy certificado navegador instalação driver monitor teclado chamado"
+).split()
+
+BOILERPLATE = [
+    "Esta mensagem é confidencial e destinada exclusivamente ao destinatário. Caso a tenha recebido por engano, "
+    "apague-a e avise o remetente. Não responda este e-mail, ele é enviado automaticamente pelo sistema.",
+    "Antes de abrir um chamado, consulte a base de conhecimento no portal de suporte. O horário de atendimento "
+    "é de segunda a sexta, das 8h às 18h, exceto feriados.",
+]
+
+
+def legacy_split_text(text: str, chunk_size: int = 400):
+    words = text.split()
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for word in words:
+        if current_length + len(word) + 1 > chunk_size:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = []
+            current_length = 0
+        current_chunk.append(word)
+        current_length += len(word) + 1
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def build_document(megabytes: float, boilerplate_ratio: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    paragraphs, size = [], 0
+    while size < target:
+        if rng.random() < boilerplate_ratio:
+            paragraph = rng.choice(BOILERPLATE)
+            if rng.random() < 0.3:  # variações pequenas (quase duplicatas)
+                paragraph = paragraph.replace("e-mail", "email").replace("8h", "08h")
+        else:
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + "."
+                for _ in range(rng.randint(2, 6))
+            ]
+            paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=float, default=4.0)
+    parser.add_argument("--boilerplate-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    from app.Core.chunking import ChunkDeduplicator, TextChunker, count_tokens, tiktoken
+
+    document = build_document(args.megabytes, args.boilerplate_ratio)
+    size_mb = len(document.encode("utf-8")) / (1024 * 1024)
+
+    start = time.perf_counter()
+    legacy = legacy_split_text(document)
+    legacy_elapsed = time.perf_counter() - start
+
+    dedup = ChunkDeduplicator()
+    start = time.perf_counter()
+    chunks = TextChunker().split(document, dedup)
+    elapsed = time.perf_counter() - start
+
+    legacy_tokens = sum(count_tokens(chunk) for chunk in legacy)
+    tokens = sum(count_tokens(chunk) for chunk in chunks)
+    print(json.dumps({
+        "document_mb": round(size_mb, 2),
+        "tokenizer": "tiktoken" if tiktoken is not None else "estimate",
+        "legacy": {
+            "chunks": len(legacy),
+            "unique_chunks": len(set(legacy)),
+            "embedding_tokens": legacy_tokens,
+            "mb_per_second": round(size_mb / legacy_elapsed, 2),
+        },
+        "chunker": {
+            "chunks": len(chunks),
+            "exact_duplicates_dropped": dedup.exact_duplicates,
+            "near_duplicates_dropped": dedup.near_duplicates,
+            "embedding_tokens": tokens,
+            "mb_per_second": round(size_mb / elapsed, 2),
+        },
+        "embedding_tokens_saved": round(1 - tokens / legacy_tokens, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Mede o custo de subir um worker: o tempo de import dos módulos de entrada
+(main, serviços, worker de embeddings) em interpretadores novos, descontado o
+próprio interpretador, e os módulos que mais pesam (-X importtime). Com
+--startup, mede também o lifespan do app (criação de engines e clientes, e o
+warm-up se WARMUP_ENABLED estiver ligado).
+
+O import roda sem DATABASE_URL: nada deve exigir banco ou chave da OpenAI só
+por ser importado.
+
+Uso:
+    python -m benchmarks.bench_import_time --repeat 7 --top 15
+    python -m benchmarks.bench_import_time --startup   # requer DATABASE_URL e OPENAI_API_KEY
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+MODULES = ["main", "app.Services.LLMService", "app.Database.db", "worker"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(without_services: bool) -> Dict[str, str]:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    if without_services:
+        for name in ("DATABASE_URL", "OPENAI_API_KEY", "REDIS_URL"):
+            env.pop(name, None)
+    return env
+
+
+def wall_time(statement: str, env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-W", "ignore", "-c", statement], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def import_profile(module: str, env: Dict[str, str], top: int) -> List[Dict]:
+    """
+    Pacotes mais caros de importar: cumulativo (microssegundos do -X importtime) do
+    módulo raiz de cada pacote, em qualquer nível. Um pacote importado por outro
+    aparece nos dois.
+    """
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    )
+    own = {module.split(".")[0], "app"}
+    totals: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit() or "." in name or name in own:
+            continue
+        totals[name] = totals.get(name, 0) + int(cumulative)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure_startup() -> Dict[str, float]:
+    sys.path.insert(0, ROOT)
+    from fastapi.testclient import TestClient
+
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    with TestClient(main.app) as client:
+        ready = time.perf_counter()
+        status = client.get("/health/ready").status_code
+    return {
+        "import_s": round(imported - start, 3),
+        "lifespan_startup_s": round(ready - imported, 3),
+        "ready_status": status,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="interpretadores novos por módulo")
+    parser.add_argument("--top", type=int, default=10, help="módulos mais caros listados por entrada")
+    parser.add_argument("--startup", action="store_true", help="mede também o lifespan do app")
+    parser.add_argument("--output", default=None, help="grava o JSON também neste arquivo")
+    args = parser.parse_args()
+
+    env = _env(without_services=True)
+    baseline = statistics.median(wall_time("pass", env) for _ in range(args.repeat))
+    report = {"python": sys.version.split()[0], "interpreter_s": round(baseline, 3), "modules": {}}
+    for module in MODULES:
+        samples = [wall_time(f"import {module}", env) - baseline for _ in range(args.repeat)]
+        report["modules"][module] = {
+            "median_s": round(statistics.median(samples), 3),
+            "min_s": round(min(samples), 3),
+            "max_s": round(max(samples), 3),
+            "top_imports": import_profile(module, env, args.top),
+        }
+    if args.startup:
+        report["startup"] = measure_startup()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
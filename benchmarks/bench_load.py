@@ -0,0 +1,439 @@
+"""
+Teste de carga reprodutível da aplicação inteira: popula um Postgres com pgvector
+(usuários, categorias, tickets e chunks de contexto), sobe o LLM falso
+(benchmarks.fake_openai) com latência configurável, inicia main:app com uvicorn
+e dispara uma mistura de operações (login, criar/listar/obter/atualizar ticket,
+mensagens, RAG e busca híbrida). O resultado é um JSON com vazão e p50/p95/p99 por operação,
+pensado para ser versionado e comparado entre releases (mesma --seed, mesmos dados).
+
+Requer um banco DEDICADO em DATABASE_URL: o schema help_desk é criado pelo
+benchmark e, com --reset, apagado antes de popular.
+
+Uso:
+    python -m benchmarks.bench_load --reset --tickets 20000 --contexts 50000 \\
+        --duration 60 --concurrency 64 --output bench-load.json
+    python -m benchmarks.bench_load --skip-seed --mix rag=5,ticket_list=5
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+import numpy as np
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_async_concurrency import wait_until_ready
+from benchmarks.bench_chunking import WORDS
+from benchmarks.fake_openai import EMBEDDING_DIM
+
+SCHEMA = "help_desk"
+PASSWORD = "bench-password"
+STATUSES = ["open", "in_progress", "waiting", "resolved", "closed"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
+DEFAULT_MIX = "login=1,ticket_create=2,ticket_list=4,ticket_get=3,ticket_update=2,message_post=2,rag=2,search=2"
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Operação desconhecida em --mix: {name} (use {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def sentence(rng: random.Random, low: int = 6, high: int = 20) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{v:.6f}" for v in vector) + "]"
+
+
+def copy_rows(cursor, table: str, columns: List[str], rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {SCHEMA}.{table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+# ---------------------------------------------------------------------------
+# Dados
+# ---------------------------------------------------------------------------
+
+def seed_database(database_url: str, args) -> dict:
+    """
+    Cria o schema e popula as tabelas com COPY. Os dados dependem só de --seed,
+    então duas execuções com os mesmos parâmetros produzem o mesmo banco.
+    """
+    from app.Core.chunking import content_hash
+    from app.Database.models import Base
+    from app.Services.AuthService import AuthService
+    from app.Services.DashboardService import DashboardService
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        if args.reset:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {SCHEMA}.users)")).scalar():
+            raise SystemExit("O schema help_desk já tem dados: use --reset (banco dedicado) ou --skip-seed")
+
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+    password_hash = AuthService.hash_password(PASSWORD)
+    started = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        copy_rows(cursor, "users", ["id", "full_name", "email", "password_hash", "role", "is_active"], (
+            (i, f"Usuário {i}", f"bench-{i}@bench.local", password_hash, "agent" if i % 10 == 0 else "user", "t")
+            for i in range(1, args.users + 1)
+        ))
+        copy_rows(cursor, "ticket_categories", ["id", "name"], (
+            (i, f"Categoria {i}") for i in range(1, args.categories + 1)
+        ))
+
+        now = datetime.utcnow()
+        ticket_rows = []
+        for i in range(1, args.tickets + 1):
+            status = rng.choice(STATUSES)
+            created_at = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+            resolved_at = created_at + timedelta(hours=rng.randint(1, 72)) if status in ("resolved", "closed") else None
+            ticket_rows.append((
+                i, sentence(rng, 3, 8)[:150], " ".join(sentence(rng) for _ in range(rng.randint(1, 4))),
+                status, rng.choice(PRIORITIES), rng.randint(1, args.users), rng.randint(1, args.categories),
+                rng.randint(1, args.users) if rng.random() < 0.6 else None, "indexed",
+                created_at, created_at, resolved_at,
+            ))
+        copy_rows(cursor, "tickets", [
+            "id", "title", "description", "status", "priority", "user_id", "category_id",
+            "assigned_to", "embedding_status", "created_at", "updated_at", "resolved_at",
+        ], ticket_rows)
+        del ticket_rows
+
+        step = 10_000
+        for start in range(0, args.contexts, step):
+            count = min(step, args.contexts - start)
+            vectors = np_rng.standard_normal((count, EMBEDDING_DIM), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            rows = []
+            for offset, vector in enumerate(vectors):
+                chunk = " ".join(sentence(rng) for _ in range(rng.randint(2, 6)))
+                # Metade dos chunks vem de tickets, metade do contexto da categoria
+                ticket_id = rng.randint(1, args.tickets) if args.tickets and rng.random() < 0.5 else None
+                rows.append((
+                    rng.randint(1, args.categories), ticket_id, start + offset, chunk,
+                    content_hash(chunk), vector_literal(vector),
+                ))
+            copy_rows(cursor, "context", [
+                "category_id", "ticket_id", "chunk_index", "chunk_text", "content_hash", "embedding",
+            ], rows)
+
+        for table in ("users", "ticket_categories", "tickets"):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{SCHEMA}.{table}', 'id'), "
+                           f"(SELECT COALESCE(MAX(id), 1) FROM {SCHEMA}.{table}))")
+        raw.commit()
+    finally:
+        raw.close()
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    with Session(engine) as db:
+        DashboardService.reconcile(db)
+    engine.dispose()
+    return {
+        "users": args.users,
+        "categories": args.categories,
+        "tickets": args.tickets,
+        "contexts": args.contexts,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def load_ids(database_url: str) -> dict:
+    from app.Database.models import Ticket, TicketCategory, User
+
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            users = conn.execute(select(func.max(User.id))).scalar() or 0
+            categories = conn.execute(select(func.max(TicketCategory.id))).scalar() or 0
+            tickets = conn.execute(select(func.max(Ticket.id))).scalar() or 0
+    finally:
+        engine.dispose()
+    if not users or not categories:
+        raise SystemExit("Banco sem dados do benchmark: rode sem --skip-seed")
+    return {"users": users, "categories": categories, "tickets": tickets}
+
+
+# ---------------------------------------------------------------------------
+# Carga
+# ---------------------------------------------------------------------------
+
+class Workload:
+    """
+    Estado compartilhado pelos usuários virtuais: ids existentes (inclui os
+    tickets criados durante a carga) e as latências coletadas por operação.
+    """
+
+    def __init__(self, ids: dict, rng: random.Random):
+        self.users = ids["users"]
+        self.categories = ids["categories"]
+        self.ticket_ids = list(range(1, ids["tickets"] + 1))
+        self.rng = rng
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.db_queries: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def user_id(self) -> int:
+        return self.rng.randint(1, self.users)
+
+    def category_id(self) -> int:
+        return self.rng.randint(1, self.categories)
+
+    def ticket_id(self) -> int:
+        return self.rng.choice(self.ticket_ids) if self.ticket_ids else 1
+
+
+async def op_login(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    return await client.post("/auth/login", json={"email": f"bench-{w.user_id()}@bench.local", "password": PASSWORD})
+
+
+async def op_ticket_create(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    response = await client.post("/tickets/", json={
+        "title": sentence(w.rng, 3, 8)[:150],
+        "description": " ".join(sentence(w.rng) for _ in range(3)),
+        "user_id": w.user_id(),
+        "category_id": w.category_id(),
+        "priority": w.rng.choice(PRIORITIES),
+    })
+    if response.status_code == 200:
+        w.ticket_ids.append(response.json()["id"])
+    return response
+
+
+async def op_ticket_list(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    params = {"limit": 20}
+    choice = w.rng.random()
+    if choice < 0.3:
+        params["status"] = w.rng.choice(STATUSES)
+    elif choice < 0.6:
+        params["category_id"] = w.category_id()
+    return await client.get("/tickets/", params=params)
+
+
+async def op_ticket_get(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    return await client.get(f"/tickets/{w.ticket_id()}")
+
+
+async def op_ticket_update(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    return await client.put(f"/tickets/{w.ticket_id()}", json={
+        "status": w.rng.choice(STATUSES),
+        "priority": w.rng.choice(PRIORITIES),
+    })
+
+
+async def op_message_post(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    return await client.post(f"/tickets/{w.ticket_id()}/messages", json={
+        "sender_id": w.user_id(),
+        "message": sentence(w.rng),
+    })
+
+
+async def op_rag(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    return await client.post("/assistant/answer", json={
+        "message": sentence(w.rng, 5, 12),
+        "category_id": w.category_id() if w.rng.random() < 0.7 else None,
+        "top_k": 5,
+    })
+
+
+async def op_search(client: httpx.AsyncClient, w: Workload) -> httpx.Response:
+    params = {"q": " ".join(w.rng.choice(WORDS) for _ in range(w.rng.randint(1, 3))), "limit": 20}
+    if w.rng.random() < 0.5:
+        params["status"] = w.rng.choice(STATUSES)
+    return await client.get("/search/", params=params)
+
+
+OPERATIONS = {
+    "login": op_login,
+    "ticket_create": op_ticket_create,
+    "ticket_list": op_ticket_list,
+    "ticket_get": op_ticket_get,
+    "ticket_update": op_ticket_update,
+    "message_post": op_message_post,
+    "rag": op_rag,
+    "search": op_search,
+}
+
+
+async def drive(base_url: str, workload: Workload, mix: Dict[str, float], args) -> float:
+    """
+    Usuários virtuais em laço fechado (cada um espera a resposta antes da próxima
+    requisição) durante --warmup + --duration segundos; só a janela medida entra no resultado.
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def virtual_user(deadline: float):
+            while time.perf_counter() < deadline:
+                name = workload.rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await OPERATIONS[name](client, workload)
+                    ok = response.status_code < 400
+                    queries = int(response.headers.get("X-DB-Queries", 0))
+                except httpx.HTTPError:
+                    ok, queries = False, 0
+                if workload.recording:
+                    workload.latencies[name].append(time.perf_counter() - start)
+                    workload.db_queries[name] += queries
+                    if not ok:
+                        workload.errors[name] += 1
+
+        deadline = time.perf_counter() + args.warmup + args.duration
+        users = [asyncio.create_task(virtual_user(deadline)) for _ in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        workload.recording = True
+        started = time.perf_counter()
+        await asyncio.gather(*users)
+        return time.perf_counter() - started
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    # Nearest-rank: sempre uma latência observada
+    index = max(0, min(len(ordered) - 1, int(np.ceil(q / 100 * len(ordered))) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def summarize(latencies: List[float], errors: int, db_queries: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0}
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1),
+        "p50_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "p99_ms": percentile(ordered, 99),
+        "max_ms": round(ordered[-1] * 1000, 1),
+        "db_queries_per_request": round(db_queries / len(ordered), 2),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga reprodutível de main:app")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--tickets", type=int, default=10_000)
+    parser.add_argument("--contexts", type=int, default=20_000, help="chunks de contexto com embedding")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="apaga o schema help_desk antes de popular")
+    parser.add_argument("--skip-seed", action="store_true", help="reusa os dados já populados")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="pesos por operação, ex.: rag=2,ticket_list=4")
+    parser.add_argument("--concurrency", type=int, default=32, help="usuários virtuais")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos medidos")
+    parser.add_argument("--warmup", type=float, default=5.0, help="segundos descartados no início")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=1, help="workers do uvicorn")
+    parser.add_argument("--async-mode", choices=["true", "false"], default="true")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-per-item-ms", type=float, default=1.0)
+    parser.add_argument("--llm-token-ms", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--output", help="grava o JSON também neste arquivo")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    # Settings exige a chave ao importar os módulos da aplicação usados no seed
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("Defina DATABASE_URL apontando para um Postgres com pgvector dedicado ao benchmark")
+
+    seed_report = None if args.skip_seed else seed_database(database_url, args)
+    ids = load_ids(database_url)
+
+    # LLM falso e aplicação em processos separados para não disputar o GIL com o gerador de carga
+    llm_port = args.port + 1
+    llm = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai", "--port", str(llm_port),
+        "--latency-ms", str(args.llm_latency_ms), "--per-item-ms", str(args.llm_per_item_ms),
+        "--token-ms", str(args.llm_token_ms),
+    ])
+    env = {
+        **os.environ,
+        "ASYNC_MODE": args.async_mode,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "OPENAI_API_KEY": "fake",
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_ready(base_url, timeout=60)
+        workload = Workload(ids, random.Random(args.seed))
+        elapsed = asyncio.run(drive(base_url, workload, mix, args))
+        llm_stats = httpx.get(f"http://127.0.0.1:{llm_port}/v1/stats", timeout=5).json()
+    finally:
+        app.terminate()
+        app.wait()
+        llm.terminate()
+        llm.wait()
+
+    all_latencies = [value for values in workload.latencies.values() for value in values]
+    report = {
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "reset", "skip_seed")},
+        "dataset": ids,
+        "seed": seed_report,
+        "seconds": round(elapsed, 2),
+        "endpoints": {
+            name: summarize(workload.latencies[name], workload.errors[name], workload.db_queries[name], elapsed)
+            for name in mix
+        },
+        "total": summarize(all_latencies, sum(workload.errors.values()), sum(workload.db_queries.values()), elapsed),
+        "llm": llm_stats,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Latência e recall@k da busca vetorial: varredura exata vs índice ANN (HNSW / IVFFlat),
+com e sem filtro por categoria, em 10k, 100k e 1M chunks.
+
+Requer um Postgres com pgvector em DATABASE_URL. Os dados ficam no schema "bench",
+sem tocar nas tabelas da aplicação.
+
+Uso:
+    python -m benchmarks.bench_vector_index --sizes 10000 100000 1000000 --index hnsw
+"""
+import argparse
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from app.Core.config import settings
+
+
+def random_unit_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{v:.6f}" for v in vector) + "]"
+
+
+def load_table(engine, table: str, vectors: np.ndarray, categories: int, rng: np.random.Generator):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS bench"))
+        conn.execute(text(f"DROP TABLE IF EXISTS bench.{table}"))
+        conn.execute(text(
+            f"CREATE TABLE bench.{table} (id serial PRIMARY KEY, category_id int NOT NULL, "
+            f"embedding vector({vectors.shape[1]}) NOT NULL)"
+        ))
+
+    category_ids = rng.integers(1, categories + 1, size=len(vectors))
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        step = 20_000
+        for start in range(0, len(vectors), step):
+            buffer = io.StringIO()
+            for category_id, vector in zip(category_ids[start:start + step], vectors[start:start + step]):
+                buffer.write(f"{category_id}\t{vector_literal(vector)}\n")
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY bench.{table} (category_id, embedding) FROM STDIN", buffer)
+        raw.commit()
+    finally:
+        raw.close()
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX ON bench.{table} (category_id)"))
+        conn.execute(text(f"ANALYZE bench.{table}"))
+
+
+def create_ann_index(engine, table: str, kind: str):
+    if kind == "hnsw":
+        params = f"m = {settings.VECTOR_HNSW_M}, ef_construction = {settings.VECTOR_HNSW_EF_CONSTRUCTION}"
+    else:
+        params = f"lists = {settings.VECTOR_IVFFLAT_LISTS}"
+    with engine.begin() as conn:
+        conn.execute(text("SET maintenance_work_mem = '1GB'"))
+        conn.execute(text(f"CREATE INDEX ON bench.{table} USING {kind} (embedding vector_cosine_ops) WITH ({params})"))
+
+
+def run_queries(engine, table: str, queries: np.ndarray, top_k: int, exact: bool, kind: str,
+                category_id: int = None):
+    where = "WHERE category_id = :category_id" if category_id else ""
+    sql = text(f"SELECT id FROM bench.{table} {where} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k")
+    latencies, results = [], []
+    with engine.connect() as conn:
+        for query in queries:
+            with conn.begin():
+                if exact:
+                    conn.execute(text("SET LOCAL enable_indexscan = off"))
+                    conn.execute(text("SET LOCAL enable_bitmapscan = off"))
+                elif kind == "hnsw":
+                    conn.execute(text(f"SET LOCAL hnsw.ef_search = {settings.VECTOR_HNSW_EF_SEARCH}"))
+                else:
+                    conn.execute(text(f"SET LOCAL ivfflat.probes = {settings.VECTOR_IVFFLAT_PROBES}"))
+                params = {"q": vector_literal(query), "k": top_k, "category_id": category_id}
+                start = time.perf_counter()
+                rows = conn.execute(sql, params).fetchall()
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append([row[0] for row in rows])
+    return latencies, results
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(ordered), 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 2),
+    }
+
+
+def recall(truth, found):
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    total = sum(len(t) for t in truth) or 1
+    return round(hits / total, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--index", choices=["hnsw", "ivfflat"], default=settings.VECTOR_INDEX_TYPE)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(str(settings.DATABASE_URL), future=True)
+    rng = np.random.default_rng(args.seed)
+    queries = random_unit_vectors(rng, args.queries, args.dim)
+    report = []
+
+    for size in args.sizes:
+        table = f"context_{size}"
+        load_table(engine, table, random_unit_vectors(rng, size, args.dim), args.categories, rng)
+        exact_lat, truth = run_queries(engine, table, queries, args.top_k, exact=True, kind=args.index)
+        exact_cat_lat, truth_cat = run_queries(engine, table, queries, args.top_k, exact=True,
+                                               kind=args.index, category_id=1)
+
+        start = time.perf_counter()
+        create_ann_index(engine, table, args.index)
+        build_seconds = time.perf_counter() - start
+
+        ann_lat, found = run_queries(engine, table, queries, args.top_k, exact=False, kind=args.index)
+        ann_cat_lat, found_cat = run_queries(engine, table, queries, args.top_k, exact=False,
+                                             kind=args.index, category_id=1)
+        report.append({
+            "chunks": size,
+            "index": args.index,
+            "index_build_s": round(build_seconds, 1),
+            "exact": summarize(exact_lat),
+            "ann": {**summarize(ann_lat), f"recall@{args.top_k}": recall(truth, found)},
+            "exact_category": summarize(exact_cat_lat),
+            "ann_category": {**summarize(ann_cat_lat), f"recall@{args.top_k}": recall(truth_cat, found_cat)},
+        })
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE bench.{table}"))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Índice ANN sobre vetores completos vs compactos (halfvec e binary_quantize) com
+reordenação exata dos candidatos, como em VECTOR_QUANTIZATION: tamanho do índice,
+tempo de construção, latência e recall@k contra a varredura exata em precisão total.
+
+Requer um Postgres com pgvector >= 0.7 em DATABASE_URL. Os dados ficam no schema
+"bench", sem tocar nas tabelas da aplicação. --clusters gera vetores agrupados
+(mais parecidos com embeddings reais do que vetores uniformes).
+
+Uso:
+    python -m benchmarks.bench_vector_quantization --size 100000 --rerank-factors 1 4 10
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from app.Core.config import settings
+from app.Database.vector_index import QUANTIZED_OPS
+from benchmarks.bench_vector_index import load_table, random_unit_vectors, recall, run_queries, summarize, vector_literal
+
+TABLE = "context_quantization"
+EXPRESSIONS = {
+    "none": "embedding",
+    "halfvec": "(embedding::halfvec({dim}))",
+    "binary": "(binary_quantize(embedding)::bit({dim}))",
+}
+QUERY_DISTANCE = {
+    "halfvec": "(embedding::halfvec({dim})) <=> CAST(:q AS halfvec({dim}))",
+    "binary": "(binary_quantize(embedding)::bit({dim})) <~> binary_quantize(CAST(:q AS vector({dim})))::bit({dim})",
+}
+
+
+def clustered_unit_vectors(rng: np.random.Generator, n: int, dim: int, clusters: int) -> np.ndarray:
+    centroids = random_unit_vectors(rng, clusters, dim)
+    vectors = centroids[rng.integers(0, clusters, size=n)] + rng.standard_normal((n, dim), dtype=np.float32) * 0.03
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def build_index(engine, quantization: str, dim: int) -> dict:
+    params = f"m = {settings.VECTOR_HNSW_M}, ef_construction = {settings.VECTOR_HNSW_EF_CONSTRUCTION}"
+    expression = EXPRESSIONS[quantization].format(dim=dim)
+    name = f"ix_bench_{quantization}"
+    with engine.begin() as conn:
+        conn.execute(text("SET maintenance_work_mem = '1GB'"))
+        start = time.perf_counter()
+        conn.execute(text(
+            f"CREATE INDEX {name} ON bench.{TABLE} USING hnsw ({expression} {QUANTIZED_OPS[quantization]}) WITH ({params})"
+        ))
+        build_seconds = time.perf_counter() - start
+        size = conn.execute(text(f"SELECT pg_relation_size('bench.{name}')")).scalar()
+    return {"name": name, "build_s": round(build_seconds, 1), "index_mb": round(size / 1024 / 1024, 1)}
+
+
+def run_reranked(engine, queries: np.ndarray, top_k: int, quantization: str, factor: int, dim: int):
+    candidates = top_k * factor
+    sql = text(
+        f"SELECT id FROM (SELECT id, embedding FROM bench.{TABLE} "
+        f"ORDER BY {QUERY_DISTANCE[quantization].format(dim=dim)} LIMIT :candidates) c "
+        f"ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    )
+    latencies, results = [], []
+    with engine.connect() as conn:
+        for query in queries:
+            with conn.begin():
+                conn.execute(text(f"SET LOCAL hnsw.ef_search = {max(settings.VECTOR_HNSW_EF_SEARCH, candidates)}"))
+                params = {"q": vector_literal(query), "k": top_k, "candidates": candidates}
+                start = time.perf_counter()
+                rows = conn.execute(sql, params).fetchall()
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append([row[0] for row in rows])
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200, help="0 = vetores uniformes")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(str(settings.DATABASE_URL), future=True)
+    rng = np.random.default_rng(args.seed)
+    if args.clusters:
+        vectors = clustered_unit_vectors(rng, args.size + args.queries, args.dim, args.clusters)
+    else:
+        vectors = random_unit_vectors(rng, args.size + args.queries, args.dim)
+    queries, data = vectors[:args.queries], vectors[args.queries:]
+
+    load_table(engine, TABLE, data, 1, rng)
+    with engine.connect() as conn:
+        table_mb = conn.execute(text(f"SELECT pg_total_relation_size('bench.{TABLE}')")).scalar() / 1024 / 1024
+    exact_lat, truth = run_queries(engine, TABLE, queries, args.top_k, exact=True, kind="hnsw")
+
+    report = {
+        "chunks": args.size,
+        "dim": args.dim,
+        "table_mb": round(table_mb, 1),
+        "bytes_per_vector": {"none": 4 * args.dim + 8, "halfvec": 2 * args.dim + 8, "binary": args.dim // 8 + 8},
+        "exact": summarize(exact_lat),
+        "modes": {},
+    }
+    for quantization in ("none", "halfvec", "binary"):
+        index = build_index(engine, quantization, args.dim)
+        if quantization == "none":
+            lat, found = run_queries(engine, TABLE, queries, args.top_k, exact=False, kind="hnsw")
+            runs = {"ann": {**summarize(lat), f"recall@{args.top_k}": recall(truth, found)}}
+        else:
+            runs = {}
+            for factor in args.rerank_factors:
+                lat, found = run_reranked(engine, queries, args.top_k, quantization, factor, args.dim)
+                runs[f"rerank_x{factor}"] = {**summarize(lat), f"recall@{args.top_k}": recall(truth, found)}
+        report["modes"][quantization] = {"index_build_s": index["build_s"], "index_mb": index["index_mb"], **runs}
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX bench.{index['name']}"))
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE bench.{TABLE}"))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Servidor local que imita os endpoints da OpenAI usados pelo backend
+(/v1/embeddings e /v1/chat/completions), com latência configurável e, com
+--rpm, rate limit por minuto (429 + headers x-ratelimit-* e retry-after-ms).
+
+Uso:
+    python -m benchmarks.fake_openai --port 8099 --latency-ms 80 --per-item-ms 1 --rpm 600
+
+Depois aponte o backend para ele com:
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 1536
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM):
+    """
+    Vetor determinístico e normalizado derivado do hash do texto.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    per_item_ms = 0.0
+    token_ms = 0.0
+    rpm = 0
+    rate_limit_headers = {}
+    recent = deque()  # instantes das requisições aceitas no último minuto
+    stats = {"embedding_requests": 0, "embedding_items": 0, "chat_requests": 0, "rate_limited": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in {**self.rate_limit_headers, **(headers or {})}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.stats_lock:
+                self._send_json(200, dict(self.stats))
+            return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def _rate_limit(self):
+        """
+        Janela deslizante de um minuto. Retorna (headers, aceito).
+        """
+        if not self.rpm:
+            return {}, True
+        now = time.monotonic()
+        with self.stats_lock:
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            accepted = len(self.recent) < self.rpm
+            if accepted:
+                self.recent.append(now)
+            else:
+                self.stats["rate_limited"] += 1
+            reset = 60 - (now - self.recent[0]) if self.recent else 0.0
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-remaining-requests": str(self.rpm - len(self.recent)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+        if not accepted:
+            headers["retry-after-ms"] = str(int(reset * 1000))
+        return headers, accepted
+
+    def do_POST(self):
+        payload = self._read_json()
+        self.rate_limit_headers, accepted = self._rate_limit()
+        if not accepted:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                            "code": "rate_limit_exceeded"}})
+            return
+        if self.path.endswith("/embeddings"):
+            self._handle_embeddings(payload)
+        elif self.path.endswith("/chat/completions"):
+            self._handle_chat(payload)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _handle_embeddings(self, payload: dict):
+        inputs = payload.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep((self.latency_ms + self.per_item_ms * len(inputs)) / 1000.0)
+        with self.stats_lock:
+            self.stats["embedding_requests"] += 1
+            self.stats["embedding_items"] += len(inputs)
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        self._send_json(200, {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": idx, "embedding": fake_embedding(text)}
+                for idx, text in enumerate(inputs)
+            ],
+            "model": payload.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _handle_chat(self, payload: dict):
+        time.sleep(self.latency_ms / 1000.0)
+        with self.stats_lock:
+            self.stats["chat_requests"] += 1
+        words = ["Resposta", "simulada", "pelo", "servidor", "local", "de", "benchmark."]
+        if payload.get("stream"):
+            self._stream_chat(payload, words)
+            return
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake-chat"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": len(words), "total_tokens": 10 + len(words)},
+        })
+
+    def _stream_chat(self, payload: dict, words):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for idx, word in enumerate(words):
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "fake-chat"),
+                    "choices": [{"index": 0, "delta": {"content": (" " if idx else "") + word}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.token_ms / 1000.0)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.stats_lock:
+                self.stats["chat_streams_aborted"] = self.stats.get("chat_streams_aborted", 0) + 1
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 per_item_ms: float = 0.0, token_ms: float = 0.0, rpm: int = 0) -> ThreadingHTTPServer:
+    """
+    Sobe o servidor em uma thread daemon e retorna a instância (porta em server.server_address[1]).
+    """
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), {
+        "latency_ms": latency_ms,
+        "per_item_ms": per_item_ms,
+        "token_ms": token_ms,
+        "rpm": rpm,
+        "recent": deque(),
+        "stats": {"embedding_requests": 0, "embedding_items": 0, "chat_requests": 0, "rate_limited": 0},
+        "stats_lock": threading.Lock(),
+    })
+    server_cls = type("FakeOpenAIServer", (ThreadingHTTPServer,), {"request_queue_size": 1024})
+    server = server_cls((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="latência fixa por requisição")
+    parser.add_argument("--per-item-ms", type=float, default=0.5, help="latência extra por item de embedding")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="intervalo entre tokens no chat em streaming")
+    parser.add_argument("--rpm", type=int, default=0, help="requisições por minuto antes de responder 429 (0 = sem limite)")
+    args = parser.parse_args()
+
+    server = start_server(args.host, args.port, args.latency_ms, args.per_item_ms, args.token_ms, args.rpm)
+    print(f"Fake OpenAI em http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,28 @@
-from fastapi import FastAPI
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.API.router import api_router as router
+from app.Core import metrics, tracing
+from app.Core.config import settings
+from app.Database.db import READ_YOUR_WRITES_COOKIE, get_replica_router, read_from_primary, track_db_stats
+from app.Services.LifecycleService import LifecycleService
+from app.Services.PasswordHasher import PasswordHasherBusy
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engines e clientes são criados aqui (e não no import); com WARMUP_ENABLED, também o warm-up
+    await LifecycleService.startup()
+    try:
+        yield
+    finally:
+        await LifecycleService.shutdown()
+
+
+app = FastAPI(title="Backend", lifespan=lifespan)
 
 app.include_router(router)
 
@@ -15,6 +35,84 @@ app.add_middleware(
 )
 
 
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Latência das requisições por rota", ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = metrics.gauge("http_requests_in_flight", "Requisições em andamento")
+
+
+def _route_template(request: Request) -> str:
+    # Rotas de routers incluídos guardam o path sem o prefixo; o contexto efetivo do FastAPI tem o completo
+    effective = request.scope.get("fastapi", {}).get("effective_route_context")
+    if effective is not None:
+        return effective.path
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+
+def _reads_own_writes(request: Request) -> bool:
+    # Cookie gravado após um commit: até expirar, as leituras do cliente não vão para réplicas
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    started = time.perf_counter()
+    span = tracing.start_span("http.request", method=request.method, path=request.url.path)
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        with track_db_stats() as stats, read_from_primary(_reads_own_writes(request)):
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Template da rota (ex.: /tickets/{ticket_id}) para não explodir a cardinalidade
+        route_path = _route_template(request)
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route_path, status=status)
+        tracing.end_span(span, route=route_path, status=status)
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    response.headers["X-DB-Commits"] = str(stats.commits)
+    if stats.commits and get_replica_router().replicas:
+        window = settings.DB_READ_YOUR_WRITES_SECONDS
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE, f"{time.time() + window:.3f}",
+            max_age=math.ceil(window), httponly=True, samesite="lax",
+        )
+    if span is not None:
+        response.headers["X-Trace-Id"] = span.trace_id
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live", include_in_schema=False)
+def health_live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+def health_ready():
+    # 503 até o startup (e o warm-up) terminar e durante o shutdown: o balanceador ainda não manda tráfego
+    if not LifecycleService.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Serviço de autenticação sobrecarregado, tente novamente"},
+        headers={"Retry-After": "1"},
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
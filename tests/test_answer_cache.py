@@ -0,0 +1,118 @@
+"""
+Cache semântico de respostas do assistente (AnswerCache).
+"""
+import time
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.Core.config import settings
+from app.Services.AnswerCache import AnswerCache
+
+MODEL = "gpt-test"
+
+
+def _vector(*values):
+    return list(values) + [0.0] * (8 - len(values))
+
+
+def _similar(similarity):
+    # Vetor unitário com o cosseno pedido em relação a _vector(1)
+    return _vector(similarity, float(np.sqrt(1 - similarity ** 2)))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_MIN_SIMILARITY", 0.95)
+    monkeypatch.setattr(settings, "ANSWER_CACHE_CATEGORY_MIN_SIMILARITY", {})
+    return AnswerCache(max_entries=10, ttl_seconds=60)
+
+
+def test_similar_question_hits_and_different_one_misses(cache):
+    cache.set(MODEL, 1, 5, _vector(1), "Reinicie o roteador")
+
+    assert cache.get(MODEL, 1, 5, _similar(0.97)) == "Reinicie o roteador"
+    assert cache.get(MODEL, 1, 5, _similar(0.90)) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_category_threshold_overrides_default(cache, monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE_CATEGORY_MIN_SIMILARITY", {2: 0.99})
+    cache.set(MODEL, 2, 5, _vector(1), "Resposta")
+
+    assert cache.get(MODEL, 2, 5, _similar(0.97)) is None
+    assert cache.get(MODEL, 2, 5, _similar(0.995)) == "Resposta"
+
+
+@pytest.mark.parametrize("model, category_id, top_k", [("outro", 1, 5), (MODEL, 2, 5), (MODEL, 1, 3)])
+def test_answers_only_match_the_same_partition(cache, model, category_id, top_k):
+    cache.set(MODEL, 1, 5, _vector(1), "Resposta")
+
+    assert cache.get(model, category_id, top_k, _vector(1)) is None
+
+
+def test_expired_answers_are_dropped(cache, monkeypatch):
+    cache.set(MODEL, 1, 5, _vector(1), "Resposta")
+    later = time.monotonic() + 61
+    monkeypatch.setattr("app.Services.AnswerCache.time.monotonic", lambda: later)
+
+    assert cache.get(MODEL, 1, 5, _vector(1)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_answer_is_evicted(monkeypatch):
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    cache.set(MODEL, 1, 5, _vector(1), "um")
+    cache.set(MODEL, 1, 5, _vector(0, 1), "dois")
+    cache.get(MODEL, 1, 5, _vector(1))
+    cache.set(MODEL, 1, 5, _vector(0, 0, 1), "três")
+
+    assert cache.get(MODEL, 1, 5, _vector(1)) == "um"
+    assert cache.get(MODEL, 1, 5, _vector(0, 1)) is None
+
+
+def test_invalidation_drops_category_and_uncategorized_answers(cache):
+    cache.set(MODEL, 1, 5, _vector(1), "categoria 1")
+    cache.set(MODEL, 2, 5, _vector(1), "categoria 2")
+    cache.set(MODEL, None, 5, _vector(1), "sem categoria")
+
+    cache.invalidate(1)
+
+    assert cache.get(MODEL, 1, 5, _vector(1)) is None
+    assert cache.get(MODEL, None, 5, _vector(1)) is None
+    assert cache.get(MODEL, 2, 5, _vector(1)) == "categoria 2"
+
+
+def test_invalidate_on_commit_waits_for_commit_and_skips_rollback(cache):
+    engine = create_engine("sqlite://")
+    cache.set(MODEL, 1, 5, _vector(1), "Resposta")
+
+    with Session(engine) as db:
+        db.execute(text("SELECT 1"))
+        cache.invalidate_on_commit(db, 1)
+        assert cache.get(MODEL, 1, 5, _vector(1)) == "Resposta"
+        db.rollback()
+        db.commit()
+        assert cache.get(MODEL, 1, 5, _vector(1)) == "Resposta"
+
+        db.execute(text("SELECT 1"))
+        cache.invalidate_on_commit(db, 1)
+        db.commit()
+        assert cache.get(MODEL, 1, 5, _vector(1)) is None
+
+
+def test_invalidation_reaches_other_workers(cache, redis_client):
+    other = AnswerCache(max_entries=10, ttl_seconds=60)
+    other.get(MODEL, 1, 5, _vector(1))  # assina o canal
+    other.set(MODEL, 1, 5, _vector(1), "Resposta")
+    try:
+        cache.invalidate(1)
+        deadline = time.monotonic() + 3
+        while other.stats()["entries"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert other.get(MODEL, 1, 5, _vector(1)) is None
+    finally:
+        other._subscriber.stop()
+        other._subscriber.join(timeout=3)
@@ -0,0 +1,116 @@
+"""
+Streaming das respostas do assistente via Server-Sent Events, com o gateway do LLM substituído.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.API import assistant_routes
+from app.Database.db import get_async_read_db, get_read_db
+from app.Services import LLMService as llm_module
+from app.Services.LLMService import LLMService
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeStream:
+    def __init__(self, pieces, fail_after=None):
+        self.pieces, self.fail_after, self.closed = pieces, fail_after, False
+
+    def _chunks(self):
+        yield SimpleNamespace(choices=[])  # chunks sem texto (ex.: papel, uso) são ignorados
+        for position, piece in enumerate(self.pieces):
+            if position == self.fail_after:
+                raise RuntimeError("segredo do provedor")
+            yield _chunk(piece)
+
+    def __iter__(self):
+        return self._chunks()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    async def __aiter__(self):
+        for chunk in self._chunks():
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeGateway:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def chat_stream(self, messages, model, tokens=None, **kwargs):
+        return self.stream
+
+    async def achat_stream(self, messages, model, tokens=None, **kwargs):
+        return self.stream
+
+
+STREAMS = {"/sync": FakeStream, "/async": FakeAsyncStream}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    messages = [{"role": "user", "content": "oi"}]
+    monkeypatch.setattr(LLMService, "build_rag_messages", staticmethod(lambda db, *a, **kw: messages))
+
+    async def abuild(db, *args, **kwargs):
+        return messages
+    monkeypatch.setattr(LLMService, "abuild_rag_messages", staticmethod(abuild))
+
+    app = FastAPI()
+    app.add_api_route("/sync", assistant_routes.stream_answer, methods=["POST"])
+    app.add_api_route("/async", assistant_routes.stream_answer_async, methods=["POST"])
+    app.dependency_overrides[get_read_db] = lambda: None
+    app.dependency_overrides[get_async_read_db] = lambda: None
+    return TestClient(app)
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.parametrize("path", ["/sync", "/async"])
+def test_deltas_are_streamed_then_done(client, monkeypatch, path):
+    stream = STREAMS[path](["Olá", ", tudo", " bem?"])
+    monkeypatch.setattr(llm_module, "llm_gateway", FakeGateway(stream))
+
+    response = client.post(path, json={"message": "oi"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [data["delta"] for _, data in events[:-1]] == ["Olá", ", tudo", " bem?"]
+    assert events[-1][0] == "done" and events[-1][1]["time_to_first_token_ms"] is not None
+    assert stream.closed
+
+
+@pytest.mark.parametrize("path", ["/sync", "/async"])
+def test_provider_error_becomes_generic_error_event(client, monkeypatch, path):
+    stream = STREAMS[path](["Olá", "nunca"], fail_after=1)
+    monkeypatch.setattr(llm_module, "llm_gateway", FakeGateway(stream))
+
+    response = client.post(path, json={"message": "oi"})
+
+    events = _events(response.text)
+    assert events[0] == ("message", {"delta": "Olá"})
+    assert events[-1] == ("error", {"detail": assistant_routes.STREAM_ERROR_DETAIL})
+    assert "segredo" not in response.text
+    assert stream.closed
+
+
+def test_top_k_is_validated(client):
+    assert client.post("/sync", json={"message": "oi", "top_k": 51}).status_code == 422
@@ -0,0 +1,77 @@
+from app.Core.chunking import ChunkDeduplicator, TextChunker, content_hash, count_tokens, iter_chunks
+
+PARAGRAPH = " ".join(
+    f"O usuário {i} relatou que a impressora do setor financeiro não imprime documentos longos." for i in range(8)
+)
+
+
+def test_single_paragraph_document_yields_one_chunk():
+    assert list(iter_chunks(PARAGRAPH)) == [PARAGRAPH]
+
+
+def test_first_paragraph_is_kept_when_followed_by_short_one():
+    chunks = list(iter_chunks(PARAGRAPH + "\n\nOutro parágrafo curto."))
+
+    assert chunks[0] == PARAGRAPH
+    assert chunks[-1].endswith("Outro parágrafo curto.")
+
+
+def test_repeated_paragraph_is_dropped():
+    footer = "Este e-mail é confidencial e destinado apenas ao destinatário indicado acima."
+    text = f"{PARAGRAPH}\n\n{footer}\n\nSegundo assunto do chamado.\n\n{footer}"
+
+    chunks = TextChunker(max_tokens=40, overlap_tokens=0, min_tokens=1).split(text, ChunkDeduplicator())
+
+    assert sum(footer in chunk for chunk in chunks) == 1
+
+
+def test_chunks_respect_max_tokens_and_overlap():
+    chunker = TextChunker(max_tokens=60, overlap_tokens=30)
+    chunks = chunker.split("\n\n".join([PARAGRAPH] * 1 + [PARAGRAPH.replace("impressora", "rede")]))
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    # Cada chunk começa com a última frase do anterior
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit(". ", 1)[-1]
+        assert current.startswith(last_sentence)
+
+
+def test_string_and_line_iterable_produce_same_chunks():
+    text = f"{PARAGRAPH}\n\nSegundo parágrafo.\nCom duas linhas."
+
+    assert list(iter_chunks(text)) == list(iter_chunks(text.splitlines(keepends=True)))
+
+
+def test_oversized_sentence_is_split():
+    sentence = " ".join(["palavra"] * 500)
+
+    chunks = TextChunker(max_tokens=50, overlap_tokens=0).split(sentence)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+
+
+def test_deduplicator_exact_and_near_duplicates():
+    dedup = ChunkDeduplicator(max_distance=3)
+    text = "O sistema de chamados fica lento ao anexar arquivos grandes no formulário de abertura"
+
+    assert not dedup.is_duplicate(text)
+    assert dedup.is_duplicate(text.upper())
+    # Mesmas palavras com outra pontuação: hash diferente, SimHash igual
+    assert dedup.is_duplicate(text.replace(" ao ", ", ao ") + "!")
+    assert not dedup.is_duplicate("Resetar a senha exige confirmação por e-mail e código enviado ao celular")
+    assert (dedup.exact_duplicates, dedup.near_duplicates) == (1, 1)
+
+
+def test_paragraphs_do_not_mark_chunks_as_seen():
+    dedup = ChunkDeduplicator()
+
+    assert not dedup.is_duplicate_paragraph(PARAGRAPH)
+    assert not dedup.is_duplicate(PARAGRAPH)
+
+
+def test_known_hashes_skip_stored_chunks():
+    dedup = ChunkDeduplicator(known_hashes=[content_hash(PARAGRAPH)])
+
+    assert list(TextChunker().iter_chunks(PARAGRAPH, dedup)) == []
@@ -0,0 +1,56 @@
+"""
+Sincronização de versões de um documento de contexto (diff por hash dos chunks).
+"""
+from sqlalchemy import select
+
+from app.Core.chunking import content_hash, iter_chunks
+from app.Database.models import Context
+from app.Services.CategoryService import CategoryService
+
+PARAGRAPHS = [
+    " ".join(f"Passo {i}.{j}: confira o cabo de rede e reinicie o roteador do andar {j}." for j in range(10))
+    for i in range(4)
+]
+
+
+def _stored_hashes(db, category_id):
+    rows = db.execute(
+        select(Context.content_hash).where(Context.category_id == category_id).order_by(Context.chunk_index)
+    ).scalars().all()
+    return list(rows)
+
+
+def test_sync_then_edited_version_only_embeds_changed_chunks(db, category):
+    v1 = "\n\n".join(PARAGRAPHS)
+    first = CategoryService.sync_context_document(db, category.id, "manual", v1)
+    db.commit()
+
+    v1_hashes = [content_hash(chunk) for chunk in iter_chunks(v1)]
+    assert first["embedded"] == len(v1_hashes) > 1
+    assert _stored_hashes(db, category.id) == v1_hashes
+
+    unchanged = CategoryService.sync_context_document(db, category.id, "manual", v1)
+    db.commit()
+    assert unchanged["embedded"] == 0 and unchanged["deleted"] == 0
+
+    edited = PARAGRAPHS[:1] + [PARAGRAPHS[1].replace("roteador", "switch")] + PARAGRAPHS[2:] + [
+        "Se nada resolver, abra um chamado para a equipe de infraestrutura com o número do patrimônio."
+    ]
+    v2 = "\n\n".join(edited)
+    second = CategoryService.sync_context_document(db, category.id, "manual", v2)
+    db.commit()
+
+    v2_hashes = [content_hash(chunk) for chunk in iter_chunks(v2)]
+    assert second["version"] == first["version"] + 2
+    assert second["embedded"] == len(set(v2_hashes) - set(v1_hashes))
+    assert second["deleted"] == len(set(v1_hashes) - set(v2_hashes))
+    assert second["kept"] == len(v2_hashes) - second["embedded"] > 0
+    assert _stored_hashes(db, category.id) == v2_hashes
+
+
+def test_single_paragraph_document_is_stored(db, category):
+    stats = CategoryService.sync_context_document(db, category.id, "faq", PARAGRAPHS[0])
+    db.commit()
+
+    assert stats["embedded"] == 1
+    assert _stored_hashes(db, category.id) == [content_hash(PARAGRAPHS[0])]
@@ -0,0 +1,67 @@
+"""
+Contadores incrementais do dashboard (ticket_stats / ticket_daily_stats).
+"""
+from collections import Counter
+from datetime import date, datetime
+
+import pytest
+
+from app.Services.DashboardService import DashboardService
+from app.Services.TicketService import TicketService
+
+
+def _snap(status="open", category_id=1, priority="medium", assigned_to=None, resolved_at=None):
+    return {"status": status, "category_id": category_id, "priority": priority,
+            "assigned_to": assigned_to, "resolved_at": resolved_at}
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    calls = []
+    monkeypatch.setattr(DashboardService, "_apply", staticmethod(lambda db, stats, daily: calls.append((stats, daily))))
+    return calls
+
+
+def test_created_tickets_count_once_per_dimension(applied):
+    DashboardService.record_created(None, [_snap(), _snap(priority="high")], date(2024, 3, 1))
+
+    stats, daily = applied[0]
+    assert stats[("status", "open", "open")] == 2
+    assert stats[("priority", "high", "open")] == 1
+    assert stats[("assignee", "", "open")] == 2  # sem responsável
+    assert daily == {date(2024, 3, 1): (2, 0)}
+
+
+def test_closing_a_ticket_moves_every_dimension_to_closed(applied):
+    resolved_at = datetime(2024, 3, 2, 10)
+
+    DashboardService.record_change(None, _snap(), _snap(status="resolved", resolved_at=resolved_at))
+
+    stats, daily = applied[0]
+    changed = {key: delta for key, delta in stats.items() if delta}
+    assert changed[("status", "open", "open")] == -1
+    assert changed[("status", "resolved", "closed")] == 1
+    assert changed[("category", "1", "open")] == -1 and changed[("category", "1", "closed")] == 1
+    assert daily == {date(2024, 3, 2): (0, 1)}
+
+
+def test_unchanged_ticket_produces_no_deltas(applied):
+    DashboardService.record_change(None, _snap(), _snap())
+
+    stats, daily = applied[0]
+    assert not +Counter(stats) and not -Counter(stats)
+    assert daily == {}
+
+
+def test_incremental_counters_match_a_full_recount(db, user, category):
+    DashboardService.reconcile(db)  # linha de base: outros testes também criam tickets
+    tickets = [TicketService.create_ticket(db, f"Ticket {i}", "Descrição", user.id, category.id) for i in range(3)]
+    TicketService.update_ticket(db, tickets[0].id, status="resolved")
+    TicketService.update_ticket(db, tickets[1].id, priority="high", assigned_to=user.id)
+    TicketService.update_ticket(db, tickets[0].id, status="open")  # reaberto
+
+    assert DashboardService.reconcile(db) == {"stats": 0, "daily": 0}
+
+    summary = DashboardService.get_summary(db)
+    by_category = {entry["value"]: entry for entry in summary["by_category"]}
+    assert by_category[category.id]["open"] == 3
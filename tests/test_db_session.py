@@ -0,0 +1,61 @@
+"""
+Dependência get_db: o que a rota gravou é confirmado ao fim da requisição.
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.Database import db as db_module
+from app.Database.db import get_db
+
+
+@pytest.fixture
+def sqlite_sessions(monkeypatch):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    monkeypatch.setattr(db_module, "SessionLocal", sessionmaker(bind=engine))
+    yield engine
+    engine.dispose()
+
+
+def _request(handler):
+    dependency = get_db()
+    session = next(dependency)
+    try:
+        handler(session)
+    except Exception as exc:
+        with pytest.raises(type(exc)):
+            dependency.throw(exc)
+        return
+    with pytest.raises(StopIteration):
+        next(dependency)
+
+
+def _names(engine):
+    with engine.connect() as conn:
+        return [row.name for row in conn.execute(text("SELECT name FROM items ORDER BY id"))]
+
+
+def test_core_dml_is_committed(sqlite_sessions):
+    _request(lambda session: session.execute(text("INSERT INTO items (name) VALUES ('core')")))
+
+    assert _names(sqlite_sessions) == ["core"]
+
+
+def test_request_without_transaction_does_not_commit(sqlite_sessions):
+    commits = []
+    _request(lambda session: commits.append(session.in_transaction()))
+
+    assert commits == [False]
+    assert _names(sqlite_sessions) == []
+
+
+def test_database_error_rolls_back(sqlite_sessions):
+    def handler(session):
+        session.execute(text("INSERT INTO items (name) VALUES ('partial')"))
+        session.execute(text("INSERT INTO missing_table VALUES (1)"))
+
+    _request(handler)
+
+    assert _names(sqlite_sessions) == []
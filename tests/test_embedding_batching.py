@@ -0,0 +1,69 @@
+"""
+Geração de embeddings em lote (LLMService.generate_embeddings), com a API substituída.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.Core.config import settings
+from app.Services import LLMService as llm_module
+from app.Services.EmbeddingCache import EmbeddingCache
+from app.Services.LLMService import LLMService
+
+
+class RecordingGateway:
+    """
+    Devolve um vetor por texto, com os itens fora de ordem como a API pode fazer.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def embeddings(self, batch, model, tokens=None):
+        self.batches.append(list(batch))
+        items = [SimpleNamespace(index=idx, embedding=[float(len(text)), float(idx)]) for idx, text in enumerate(batch)]
+        return SimpleNamespace(data=list(reversed(items)))
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gateway = RecordingGateway()
+    monkeypatch.setattr(llm_module, "llm_gateway", gateway)
+    monkeypatch.setattr(llm_module, "embedding_cache", EmbeddingCache(max_entries=100, ttl_seconds=60))
+    return gateway
+
+
+def test_batches_respect_item_and_token_limits():
+    texts = ["texto de exemplo para o lote"] * 5
+    two_texts = 2 * LLMService.estimate_tokens(texts[0])
+
+    assert [len(batch) for batch in LLMService._batch_texts(texts, max_items=2)] == [2, 2, 1]
+    assert [len(batch) for batch in LLMService._batch_texts(texts, max_items=10, max_tokens=two_texts)] == [2, 2, 1]
+
+
+def test_oversized_text_still_gets_its_own_batch():
+    assert [len(batch) for batch in LLMService._batch_texts(["palavra " * 100, "y"], max_items=10, max_tokens=10)] == [1, 1]
+
+
+def test_results_follow_input_order_and_duplicates_are_sent_once(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 2)
+
+    vectors = LLMService.generate_embeddings(["aa", "b", "aa", "cccc"])
+
+    assert gateway.batches == [["aa", "b"], ["cccc"]]
+    assert [vector[0] for vector in vectors] == [2.0, 1.0, 2.0, 4.0]
+    assert vectors[0] == vectors[2]
+
+
+def test_cached_texts_are_not_sent_again(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", True)
+    LLMService.generate_embeddings(["aa", "b"])
+
+    LLMService.generate_embeddings(["b", "novo", "aa"])
+
+    assert gateway.batches == [["aa", "b"], ["novo"]]
+
+
+def test_single_embedding_uses_the_batch_path(gateway):
+    assert LLMService.generate_embedding("abc") == [3.0, 0.0]
+    assert gateway.batches == [["abc"]]
@@ -0,0 +1,59 @@
+"""
+Cache de embeddings em dois níveis (memória + Redis).
+"""
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.Core.config import Settings
+from app.Services.EmbeddingCache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def test_memory_tier_hits_and_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=60)
+    cache.set_many(MODEL, [("a", [1.0]), ("b", [2.0])])
+    cache.get(MODEL, "a")  # "b" passa a ser o menos usado
+    cache.set(MODEL, "c", [3.0])
+
+    assert cache.get_many(MODEL, ["a", "b", "c"]) == {0: [1.0], 2: [3.0]}
+    assert cache.stats() == {"entries": 2, "hits_memory": 3, "hits_redis": 0, "misses": 1}
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = EmbeddingCache(max_entries=10, ttl_seconds=60)
+    cache.set(MODEL, "a", [1.0])
+    clock = time.monotonic() + 61
+    monkeypatch.setattr("app.Services.EmbeddingCache.time.monotonic", lambda: clock)
+
+    assert cache.get(MODEL, "a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_key_depends_on_model():
+    assert EmbeddingCache.make_key("model-a", "texto") != EmbeddingCache.make_key("model-b", "texto")
+
+
+def test_vectors_round_trip_as_float32():
+    assert EmbeddingCache.unpack(EmbeddingCache.pack([0.5, -1.25])) == [0.5, -1.25]
+
+
+def test_redis_tier_is_shared_and_always_expires(redis_client):
+    writer = EmbeddingCache(max_entries=10, ttl_seconds=3600)
+    writer.set(MODEL, "compartilhado", [0.5, 0.25])
+    key = EmbeddingCache.make_key(MODEL, "compartilhado")
+
+    # volatile-lru só remove chaves com TTL: sem TTL, o cache cresceria até o maxmemory
+    assert 0 < redis_client.ttl(key) <= 3600
+
+    reader = EmbeddingCache(max_entries=10, ttl_seconds=3600)
+    assert reader.get(MODEL, "compartilhado") == [0.5, 0.25]
+    assert reader.stats()["hits_redis"] == 1
+
+
+@pytest.mark.parametrize("name", ["EMBEDDING_CACHE_TTL_SECONDS", "USER_CACHE_TTL_SECONDS"])
+def test_redis_cache_ttls_must_be_positive(name):
+    with pytest.raises(ValidationError):
+        Settings(**{name: 0})
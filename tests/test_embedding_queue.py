@@ -0,0 +1,130 @@
+"""
+Worker da fila de embeddings contra um Redis real (TEST_REDIS_URL). O processamento
+dos jobs é substituído, então estes testes não precisam de banco.
+"""
+import json
+import time
+from unittest import mock
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.Core.config import settings
+from app.Services import EmbeddingQueueService as queue_module
+from app.Services.EmbeddingQueueService import (
+    DEAD_KEY, DELAYED_KEY, JOB_STATUS_KEY, PENDING_KEY, PROCESSING_KEY, WORKER_KEY, EmbeddingQueueService,
+    EmbeddingWorker,
+)
+
+POISON_TICKET = 666
+
+
+def _job(ticket_id):
+    return {"type": "ticket", "ticket_id": ticket_id, "id": f"job-{ticket_id}", "attempts": 0}
+
+
+def _process(db, jobs, commit=True):
+    if any(job["ticket_id"] == POISON_TICKET for job in jobs):
+        raise ValueError("ticket corrompido")
+
+
+@pytest.fixture
+def worker(redis_client, monkeypatch):
+    monkeypatch.setattr(EmbeddingQueueService, "process_jobs", staticmethod(_process))
+    return EmbeddingWorker(mock.MagicMock, name="test")
+
+
+def _status(client, job_id):
+    return {k.decode(): v.decode() for k, v in client.hgetall(JOB_STATUS_KEY.format(job_id=job_id)).items()}
+
+
+def _delayed_jobs(client):
+    return [json.loads(raw) for raw in client.zrange(DELAYED_KEY, 0, -1)]
+
+
+def test_poisoned_job_does_not_charge_the_rest_of_the_batch(worker, redis_client):
+    EmbeddingQueueService._push([_job(1), _job(POISON_TICKET), _job(2)])
+
+    assert worker.run_once() == 3
+
+    assert _status(redis_client, "job-1")["status"] == "indexed"
+    assert _status(redis_client, "job-2")["status"] == "indexed"
+    delayed = _delayed_jobs(redis_client)
+    assert [(job["ticket_id"], job["attempts"]) for job in delayed] == [(POISON_TICKET, 1)]
+    assert redis_client.llen(worker.processing_key) == 0
+
+
+def test_job_is_dead_lettered_after_max_attempts(worker, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_QUEUE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_QUEUE_RETRY_BASE_SECONDS", 0.0)
+    EmbeddingQueueService._push([_job(POISON_TICKET)])
+
+    worker.run_once()
+    worker.run_once()  # promove o job atrasado e falha de novo
+
+    assert redis_client.zcard(DELAYED_KEY) == 0
+    assert [json.loads(raw)["attempts"] for raw in redis_client.lrange(DEAD_KEY, 0, -1)] == [2]
+    assert _status(redis_client, f"job-{POISON_TICKET}")["status"] == "failed"
+
+
+def test_redis_error_after_commit_does_not_reschedule(worker, redis_client, monkeypatch):
+    EmbeddingQueueService._push([_job(1)])
+    monkeypatch.setattr(worker, "_finish", mock.Mock(side_effect=RedisError("conexão perdida")))
+
+    with pytest.raises(RedisError):
+        worker.run_once()
+
+    # Continua na lista de processamento (será recuperado), sem tentativa gasta
+    assert redis_client.zcard(DELAYED_KEY) == 0
+    assert redis_client.llen(worker.processing_key) == 1
+
+
+def test_due_delayed_jobs_are_promoted_once(worker, redis_client):
+    due, later = _job(1), _job(2)
+    redis_client.zadd(DELAYED_KEY, {json.dumps(due): time.time() - 1, json.dumps(later): time.time() + 3600})
+
+    worker._promote_delayed()
+    worker._promote_delayed()
+
+    assert [json.loads(raw)["ticket_id"] for raw in redis_client.lrange(PENDING_KEY, 0, -1)] == [1]
+    assert redis_client.zcard(DELAYED_KEY) == 1
+
+
+def test_job_status_is_unavailable_when_redis_fails(redis_client, monkeypatch):
+    monkeypatch.setattr(redis_client, "hgetall", mock.Mock(side_effect=RedisError("down")))
+
+    with pytest.raises(queue_module.QueueUnavailable):
+        EmbeddingQueueService.get_job_status("job-1")
+
+
+def test_sweep_recovers_jobs_of_dead_workers_only(worker, redis_client):
+    redis_client.lpush(PROCESSING_KEY.format(worker="dead"), json.dumps(_job(1)))
+    redis_client.lpush(PROCESSING_KEY.format(worker="alive"), json.dumps(_job(2)))
+    redis_client.set(WORKER_KEY.format(worker="alive"), 1)
+
+    assert worker._recover_orphans() == 1
+
+    assert [json.loads(raw)["ticket_id"] for raw in redis_client.lrange(PENDING_KEY, 0, -1)] == [1]
+    assert redis_client.llen(PROCESSING_KEY.format(worker="alive")) == 1
+
+
+def test_sweep_requeues_stale_pending_tickets_once(worker, redis_client):
+    session = mock.MagicMock()
+    session.scalars.return_value.all.return_value = [7, 8]
+    worker.session_factory = lambda: session
+
+    assert worker._requeue_stale_tickets() == 2
+    assert worker._requeue_stale_tickets() == 0
+
+    assert sorted(json.loads(raw)["ticket_id"] for raw in redis_client.lrange(PENDING_KEY, 0, -1)) == [7, 8]
+
+
+def test_sweep_runs_once_per_interval(worker, redis_client, monkeypatch):
+    monkeypatch.setattr(worker, "sweep", mock.Mock(return_value={}))
+    other = EmbeddingWorker(mock.MagicMock, name="other")
+    monkeypatch.setattr(other, "sweep", mock.Mock(return_value={}))
+
+    worker.sweep_if_due()
+    other.sweep_if_due()
+
+    assert worker.sweep.call_count + other.sweep.call_count == 1
@@ -0,0 +1,150 @@
+"""
+Inicialização preguiçosa (nada é criado no import), startup/shutdown do worker e warm-up.
+"""
+import asyncio
+import os
+import ssl
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.Core.config import settings
+from app.Database import db as db_module
+from app.Database.db import _asyncpg_url
+from app.Services import LifecycleService as lifecycle_module
+from app.Services.LifecycleService import LifecycleService
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_the_app_creates_no_engines_or_clients():
+    env = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "OPENAI_API_KEY")}
+    script = (
+        "import main\n"
+        "from app.Database.db import engines_initialized\n"
+        "from app.Services.LLMGateway import _clients\n"
+        "print(engines_initialized(), bool(_clients))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_engines_require_database_url_only_on_first_use(monkeypatch):
+    monkeypatch.setattr(db_module, "_engines", {})
+    monkeypatch.setattr(settings, "DATABASE_URL", None)
+
+    with pytest.raises(ValueError, match="DATABASE_URL"):
+        db_module.get_engine()
+
+
+def test_asyncpg_url_translates_libpq_parameters(caplog):
+    url, connect_args = _asyncpg_url(
+        "postgresql+psycopg2://u:p@db:5432/app?sslmode=require&connect_timeout=5"
+        "&application_name=api&target_session_attrs=read-write&keepalives=1"
+    )
+
+    assert url.drivername == "postgresql+asyncpg"
+    assert dict(url.query) == {"target_session_attrs": "read-write"}
+    assert connect_args == {"ssl": "require", "timeout": 5.0, "server_settings": {"application_name": "api"}}
+    assert "keepalives" in caplog.text
+
+
+def test_asyncpg_url_builds_ssl_context_from_certificates(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(ssl, "create_default_context", lambda cafile=None: ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT))
+    monkeypatch.setattr(ssl.SSLContext, "load_cert_chain", lambda self, cert, key=None: loaded.append((cert, key)))
+
+    _, connect_args = _asyncpg_url(
+        "postgresql://u:p@db/app?sslmode=verify-full&sslrootcert=/ca.pem&sslcert=/c.pem&sslkey=/k.pem"
+    )
+
+    context = connect_args["ssl"]
+    assert isinstance(context, ssl.SSLContext)
+    assert context.check_hostname and context.verify_mode == ssl.CERT_REQUIRED
+    assert loaded == [("/c.pem", "/k.pem")]
+
+
+def test_readiness_is_503_until_startup_finishes(monkeypatch):
+    import main
+
+    monkeypatch.setattr(LifecycleService, "ready", False)
+    client = TestClient(main.app)  # sem o bloco with: o lifespan não roda
+
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health/live").status_code == 200
+
+    monkeypatch.setattr(LifecycleService, "ready", True)
+    assert client.get("/health/ready").json() == {"status": "ready"}
+
+
+@pytest.fixture
+def no_resources(monkeypatch):
+    """
+    Troca os recursos externos do ciclo de vida por registros das chamadas.
+    """
+    calls = []
+    for name in ("get_engine", "get_async_engine", "get_replica_router", "get_client", "get_async_client"):
+        monkeypatch.setattr(lifecycle_module, name, lambda name=name: calls.append(name))
+
+    async def close(name):
+        calls.append(name)
+
+    monkeypatch.setattr(lifecycle_module, "close_clients", lambda: close("close_clients"))
+    monkeypatch.setattr(lifecycle_module, "dispose_engines", lambda: close("dispose_engines"))
+    monkeypatch.setattr(lifecycle_module.password_hasher, "shutdown", lambda: calls.append("password_hasher"))
+    monkeypatch.setattr(LifecycleService, "ready", False)
+    return calls
+
+
+def test_startup_creates_resources_and_shutdown_releases_them(no_resources, monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", False)
+
+    asyncio.run(LifecycleService.startup())
+    assert LifecycleService.ready
+    assert no_resources == ["get_engine", "get_async_engine", "get_replica_router", "get_client", "get_async_client"]
+
+    asyncio.run(LifecycleService.shutdown())
+    assert not LifecycleService.ready
+    assert no_resources[-3:] == ["close_clients", "password_hasher", "dispose_engines"]
+
+
+def test_warm_up_failures_do_not_block_startup(no_resources, monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(settings, "ASYNC_MODE", True)
+    monkeypatch.setattr(settings, "WARMUP_VECTOR_INDEXES", True)
+
+    async def pools_down(connections):
+        raise OperationalError("SELECT 1", {}, OSError("connection refused"))
+
+    def broken(*args):
+        raise OSError("sem acesso")
+
+    def corrupt_meta():
+        raise ValueError("meta.json inválido")
+
+    monkeypatch.setattr(lifecycle_module, "warm_up_async_pools", pools_down)
+    monkeypatch.setattr(LifecycleService, "_prewarm_pgvector", staticmethod(broken))
+    monkeypatch.setattr(lifecycle_module.VectorIndexService, "preload", staticmethod(corrupt_meta))
+
+    asyncio.run(LifecycleService.startup())
+
+    assert LifecycleService.ready
+
+
+def test_warm_up_reports_what_was_loaded(monkeypatch):
+    monkeypatch.setattr(settings, "ASYNC_MODE", False)
+    monkeypatch.setattr(settings, "WARMUP_VECTOR_INDEXES", True)
+    monkeypatch.setattr(settings, "WARMUP_DB_CONNECTIONS", 2)
+    monkeypatch.setattr(lifecycle_module, "warm_up_pools", lambda connections: {"primary": connections})
+    monkeypatch.setattr(LifecycleService, "_prewarm_pgvector", staticmethod(lambda: 128))
+    monkeypatch.setattr(lifecycle_module.VectorIndexService, "preload", staticmethod(lambda: {1: 500}))
+
+    summary = asyncio.run(LifecycleService.warm_up())
+
+    assert summary == {"pools": {"primary": 2}, "pgvector_blocks": 128, "mmap_rows": {1: 500}}
@@ -0,0 +1,231 @@
+"""
+Gateway das chamadas ao LLM: token bucket, retentativas e coalescência.
+"""
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.Core.config import settings
+from app.Services import LLMGateway as gateway_module
+from app.Services.LLMGateway import LLMGateway, LocalBucket, RateLimitTimeout, SingleFlight, parse_duration
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _status_error(cls, status, headers=None, code=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls("erro", response=response, body={"code": code} if code else None)
+
+
+class FakeRaw:
+    def __init__(self, response, headers=None):
+        self.response = response
+        self.headers = headers or {}
+
+    def parse(self):
+        return self.response
+
+
+class FakeClient:
+    """
+    Cliente OpenAI falso: cada chamada consome o próximo item de `outcomes`
+    (exceção para levantar ou FakeRaw para devolver).
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=self.create)))
+
+    def create(self, **request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CHAT_RPM", 0)
+    monkeypatch.setattr(settings, "LLM_CHAT_TPM", 0)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_SECONDS", 0.5)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_SECONDS", 30.0)
+    monkeypatch.setattr(gateway_module, "get_redis", lambda: None)
+    sleeps = []
+    monkeypatch.setattr(gateway_module.time, "sleep", sleeps.append)
+    gateway = LLMGateway()
+    gateway.sleeps = sleeps
+    return gateway
+
+
+def _use_client(monkeypatch, client):
+    monkeypatch.setattr(gateway_module, "get_client", lambda: client)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("20ms", 0.02), ("1.5s", 1.5), ("6m0s", 360.0), ("1h", 3600.0), ("2", 2.0), ("", None), ("nunca", None),
+])
+def test_parse_duration(value, expected):
+    if expected is None:
+        assert parse_duration(value) is None
+    else:
+        assert parse_duration(value) == pytest.approx(expected)
+
+
+def test_local_bucket_limits_requests_per_minute():
+    bucket = LocalBucket()
+
+    assert bucket.acquire("k", "p", rpm=2, tpm=0, cost=1) == 0
+    assert bucket.acquire("k", "p", rpm=2, tpm=0, cost=1) == 0
+    # Sem requisições sobrando: espera ~30s para repor uma (2 por minuto)
+    assert bucket.acquire("k", "p", rpm=2, tpm=0, cost=1) == pytest.approx(30, abs=0.1)
+
+
+def test_local_bucket_limits_tokens_and_refunds_unused_reservation():
+    bucket = LocalBucket()
+
+    assert bucket.acquire("k", "p", rpm=0, tpm=1000, cost=800) == 0
+    assert bucket.acquire("k", "p", rpm=0, tpm=1000, cost=800) > 0
+    bucket.settle("k", tpm=1000, refund=700)  # a chamada usou só 100 dos 800 reservados
+    assert bucket.acquire("k", "p", rpm=0, tpm=1000, cost=800) == 0
+
+
+def test_local_bucket_pause_blocks_even_without_limits():
+    bucket = LocalBucket()
+    bucket.pause("p", 5)
+
+    assert bucket.acquire("k", "p", rpm=0, tpm=0, cost=1) == pytest.approx(5, abs=0.1)
+    assert bucket.acquire("k", "outro", rpm=0, tpm=0, cost=1) == 0
+
+
+def test_acquire_gives_up_after_max_wait(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CHAT_RPM", 1)
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_MAX_WAIT_SECONDS", 5)
+    gateway._acquire("chat", "gpt", 1)
+
+    with pytest.raises(RateLimitTimeout):
+        gateway._acquire("chat", "gpt", 1)
+
+
+def test_transient_errors_are_retried_with_backoff(gateway, monkeypatch):
+    response = SimpleNamespace(usage=None)
+    client = FakeClient([
+        openai.APIConnectionError(request=REQUEST),
+        _status_error(openai.InternalServerError, 503),
+        FakeRaw(response),
+    ])
+    _use_client(monkeypatch, client)
+
+    assert gateway.chat([{"role": "user", "content": "oi"}], model="gpt", tokens=10) is response
+    assert client.calls == 3
+    # Full jitter: cada espera fica entre 0 e base * 2^tentativa
+    assert len(gateway.sleeps) == 2
+    assert 0 <= gateway.sleeps[0] <= 0.5 and 0 <= gateway.sleeps[1] <= 1.0
+
+
+def test_retry_after_header_is_respected_and_pauses_the_bucket(gateway, monkeypatch):
+    client = FakeClient([
+        _status_error(openai.RateLimitError, 429, headers={"retry-after-ms": "2000"}),
+        FakeRaw(SimpleNamespace(usage=None)),
+    ])
+    _use_client(monkeypatch, client)
+    pauses = []
+    monkeypatch.setattr(gateway, "_pause", lambda kind, model, seconds: pauses.append((kind, model, seconds)))
+
+    gateway.chat([], model="gpt", tokens=10)
+
+    assert 2.0 <= gateway.sleeps[0] <= 2.5
+    assert pauses == [("chat", "gpt", 2.0)]
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(openai.BadRequestError, 400),
+    _status_error(openai.RateLimitError, 429, code="insufficient_quota"),
+])
+def test_permanent_errors_are_not_retried(gateway, monkeypatch, error):
+    client = FakeClient([error])
+    _use_client(monkeypatch, client)
+
+    with pytest.raises(type(error)):
+        gateway.chat([], model="gpt", tokens=10)
+    assert client.calls == 1 and gateway.sleeps == []
+
+
+def test_gives_up_after_max_retries(gateway, monkeypatch):
+    client = FakeClient([openai.APIConnectionError(request=REQUEST)] * 4)
+    _use_client(monkeypatch, client)
+
+    with pytest.raises(openai.APIConnectionError):
+        gateway.chat([], model="gpt", tokens=10)
+    assert client.calls == settings.LLM_MAX_RETRIES + 1
+
+
+def test_exhausted_quota_headers_pause_later_calls(gateway):
+    headers = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "3s"}
+    gateway._after_response("chat", "gpt", 10, headers, SimpleNamespace(usage=None))
+
+    assert gateway._try_acquire("chat", "gpt", 10) == pytest.approx(3, abs=0.1)
+    assert gateway._try_acquire("embeddings", "gpt", 10) == 0
+
+
+def test_identical_concurrent_calls_share_one_request():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "resposta"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("chat", "k", slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flights.do("chat", "k", slow)))
+    follower.start()
+    # Dá tempo do segundo chegar enquanto o primeiro ainda está em andamento
+    follower.join(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ["resposta", "resposta"]
+    assert len(calls) == 1
+    assert flights.do("chat", "k", lambda: "nova") == "nova"
+
+
+def test_coalesced_callers_receive_the_same_error():
+    flights = SingleFlight()
+
+    async def scenario():
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("falhou")
+
+        results = await asyncio.gather(
+            flights.ado("chat", "k", failing), flights.ado("chat", "k", failing), return_exceptions=True
+        )
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_request_key_ignores_parameter_order():
+    key = LLMGateway._request_key
+
+    assert key({"model": "gpt", "messages": []}) == key({"messages": [], "model": "gpt"})
+    assert key({"model": "gpt", "messages": []}) != key({"model": "gpt", "messages": [], "temperature": 0})
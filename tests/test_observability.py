@@ -0,0 +1,97 @@
+"""
+Métricas no formato do Prometheus, spans de tracing e o middleware HTTP que os alimenta.
+"""
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.Core import metrics, tracing
+from app.Core.config import settings
+
+
+def test_counter_and_gauge_render_with_escaped_labels():
+    counter = metrics.Counter("test_jobs_total", "Jobs", ["queue"])
+    counter.inc(queue='a"b')
+    counter.inc(2, queue='a"b')
+    gauge = metrics.Gauge("test_depth", "Profundidade")
+    gauge.set(5)
+    gauge.dec(2)
+
+    assert counter.value(queue='a"b') == 3
+    assert counter.render()[-1] == 'test_jobs_total{queue="a\\"b"} 3.0'
+    assert gauge.render()[1:] == ["# TYPE test_depth gauge", "test_depth 3"]
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = metrics.Histogram("test_seconds", "Duração", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = histogram.render()[2:]
+
+    assert lines == [
+        'test_seconds_bucket{le="0.1"} 2.0',
+        'test_seconds_bucket{le="1.0"} 3.0',
+        'test_seconds_bucket{le="+Inf"} 4.0',
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4.0",
+    ]
+
+
+def test_registry_returns_the_same_metric_by_name():
+    first = metrics.counter("test_registry_total", "Primeiro")
+
+    assert metrics.counter("test_registry_total", "Outra descrição") is first
+    assert "# TYPE test_registry_total counter" in metrics.render_prometheus()
+
+
+def test_spans_are_disabled_by_default():
+    assert tracing.start_span("nada") is None
+    with tracing.span("nada") as current:
+        assert current is None
+
+
+def test_child_spans_share_the_trace_and_errors_are_logged(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    caplog.set_level(logging.INFO, logger="app.tracing")
+
+    with tracing.span("pai") as parent:
+        with pytest.raises(ValueError):
+            with tracing.span("filho", step=1) as child:
+                assert tracing.current_trace_id() == parent.trace_id
+                raise ValueError("falhou")
+    assert tracing.current_trace_id() is None
+
+    records = [json.loads(record.getMessage()) for record in caplog.records]
+    assert [record["name"] for record in records] == ["filho", "pai"]
+    assert records[0]["parent_id"] == child.parent_id == parent.span_id
+    assert records[0]["error"] == "ValueError: falhou"
+    assert records[0]["attributes"] == {"step": 1}
+
+
+@pytest.fixture
+def client():
+    import main
+
+    return TestClient(main.app)
+
+
+def test_requests_are_measured_by_route_template(client, monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    before = metrics.histogram("http_request_duration_seconds", "").count(method="GET", route="/health/live", status=200)
+
+    response = client.get("/health/live")
+
+    assert response.headers["X-DB-Queries"] == "0"
+    assert len(response.headers["X-Trace-Id"]) == 32
+    after = metrics.histogram("http_request_duration_seconds", "").count(method="GET", route="/health/live", status=200)
+    assert after == before + 1
+
+
+def test_metrics_endpoint_exposes_the_registry(client):
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
@@ -0,0 +1,59 @@
+"""
+Paginação por cursor (keyset) em (created_at, id).
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.Core.pagination import InvalidCursor, clamp_page_size, decode_cursor, encode_cursor
+from app.Database.models import Ticket
+from app.Services.TicketService import TicketService
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+    cursor = encode_cursor(created_at, 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "###", "bm9wZQ", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("limit, expected", [(None, 50), (0, 50), (-1, 50), (10, 10), (1000, 200)])
+def test_page_size_is_clamped(limit, expected):
+    assert clamp_page_size(limit, 50, 200) == expected
+
+
+def test_pages_cover_every_ticket_once_even_with_equal_timestamps(db, user, category):
+    ids = [
+        TicketService.create_ticket(db, f"Ticket {i}", "Descrição", user.id, category.id).id
+        for i in range(7)
+    ]
+    # Mesmo created_at em todos: a ordem e o cursor dependem do desempate por id
+    db.execute(update(Ticket).where(Ticket.id.in_(ids)).values(created_at=datetime(2024, 1, 1)))
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = TicketService.list_tickets(db, user_id=user.id, limit=3, cursor=cursor)
+        seen.extend(ticket.id for ticket in page)
+        if cursor is None:
+            break
+
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_last_full_page_has_no_cursor(db, user, category):
+    for i in range(2):
+        TicketService.create_ticket(db, f"Ticket {i}", "Descrição", user.id, category.id)
+
+    page, cursor = TicketService.list_tickets(db, user_id=user.id, limit=2)
+
+    assert len(page) == 2 and cursor is None
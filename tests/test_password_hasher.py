@@ -0,0 +1,60 @@
+"""
+bcrypt em pool de processos dedicado e limitado (PasswordHasher).
+"""
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from app.Services.PasswordHasher import PasswordHasher, PasswordHasherBusy, _hash_in_worker
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_queue=0)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_inline_mode_hashes_in_the_calling_thread():
+    hasher = PasswordHasher(workers=0, max_queue=0)
+
+    hashed = hasher.hash("segredo")
+
+    assert hasher._executor is None
+    assert hasher.verify_and_update("segredo", hashed) == (True, None)
+    assert hasher.verify_and_update("errada", hashed)[0] is False
+
+
+def test_process_pool_hash_and_async_verify(hasher):
+    hashed = hasher.hash("segredo")
+
+    assert asyncio.run(hasher.averify_and_update("segredo", hashed)) == (True, None)
+    assert hasher._in_flight == 0
+
+
+def test_full_queue_is_rejected_instead_of_piling_up(hasher):
+    running = hasher._submit("hash", _slow_hash, "segredo")
+
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash("outra")
+
+    assert running.result(timeout=30)
+    assert hasher._in_flight == 0
+
+
+def test_dead_worker_process_does_not_break_the_pool(hasher):
+    hasher.hash("aquece")
+    for process in list(hasher._get_executor()._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+
+    hashed = hasher.hash("segredo")
+
+    assert hasher.verify_and_update("segredo", hashed) == (True, None)
+
+
+def _slow_hash(password):
+    time.sleep(0.5)
+    return _hash_in_worker(password)
@@ -0,0 +1,120 @@
+"""
+Roteamento das sessões de leitura para réplicas, perfis de pool e pre-ping "idle".
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+
+from app.Core.config import settings
+from app.Database import db as db_module
+from app.Database.db import (
+    DB_POOL_PINGS, READ_YOUR_WRITES_COOKIE, ReplicaRouter, _pool_options, install_idle_ping, read_from_primary,
+)
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_LAG_SECONDS", 5.0)
+    router = ReplicaRouter(["sqlite://", "sqlite://"])
+    router._monitor = False  # sem thread de monitor: o lag é definido pelo teste
+    yield router
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+def test_replica_pool_profile_overrides_primary(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 5)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 10)
+    monkeypatch.setattr(settings, "DB_REPLICA_POOL_SIZE", 20)
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_OVERFLOW", None)
+    monkeypatch.setattr(settings, "DB_POOL_PRE_PING", "idle")
+
+    primary, replica = _pool_options(), _pool_options(replica=True)
+
+    assert (primary["pool_size"], primary["max_overflow"]) == (5, 10)
+    assert (replica["pool_size"], replica["max_overflow"]) == (20, 10)
+    assert primary["pool_pre_ping"] is False
+
+
+def test_no_replicas_reads_from_primary():
+    assert ReplicaRouter([]).pick() is None
+
+
+def test_reads_rotate_between_replicas_within_lag(router):
+    first, second = router.replicas
+    first.lag, second.lag = 0.1, 0.2
+
+    assert [router.pick() for _ in range(4)] == [first, second, first, second]
+
+    second.lag = 30.0
+    assert {router.pick() for _ in range(3)} == {first}
+
+
+def test_lagging_or_unmeasured_replicas_fall_back_to_primary(router):
+    first, second = router.replicas
+    first.lag, second.lag = None, 30.0
+
+    assert router.pick() is None
+
+
+def test_read_your_writes_forces_primary(router):
+    for replica in router.replicas:
+        replica.lag = 0.0
+
+    with read_from_primary():
+        assert router.pick() is None
+    assert router.pick() is not None
+
+
+def test_check_measures_lag_and_marks_failures(router, monkeypatch):
+    monkeypatch.setattr(db_module, "REPLICA_LAG_SQL", text("SELECT 1.5"))
+    router.check()
+    assert [(replica.lag, replica.failing) for replica in router.replicas] == [(1.5, False), (1.5, False)]
+
+    # O SQLite não tem pg_is_in_recovery(): a medição falha e a réplica sai de rotação
+    monkeypatch.setattr(db_module, "REPLICA_LAG_SQL", text("SELECT pg_is_in_recovery()"))
+    router.check()
+    assert [(replica.lag, replica.failing) for replica in router.replicas] == [(None, True), (None, True)]
+    assert router.pick() is None
+
+
+def _request(cookie=None):
+    headers = [(b"cookie", f"{READ_YOUR_WRITES_COOKIE}={cookie}".encode())] if cookie is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.mark.parametrize("cookie, expected", [
+    (None, False), (f"{time.time() + 60:.3f}", True), (f"{time.time() - 60:.3f}", False), ("lixo", False),
+])
+def test_read_your_writes_cookie(cookie, expected):
+    import main
+
+    assert main._reads_own_writes(_request(cookie)) is expected
+
+
+def test_idle_ping_replaces_dead_connections(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_PRE_PING_IDLE_SECONDS", 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'ping.db'}", poolclass=QueuePool, pool_size=1)
+    install_idle_ping(engine, "test_idle_ping")
+    pings = []
+
+    def dead_ping(dbapi_connection):
+        pings.append(dbapi_connection)
+        raise OSError("conexão perdida")
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        monkeypatch.setattr(engine.dialect, "do_ping", dead_ping)
+        failed = DB_POOL_PINGS.value(engine="test_idle_ping", result="failed")
+
+        # A conexão parada falha no ping e o pool abre outra no lugar
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert len(pings) == 1
+        assert DB_POOL_PINGS.value(engine="test_idle_ping", result="failed") == failed + 1
+    finally:
+        engine.dispose()
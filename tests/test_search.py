@@ -0,0 +1,82 @@
+"""
+Busca híbrida: fusão dos rankings por Reciprocal Rank Fusion e a consulta completa.
+"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, literal, select, union_all
+
+from app.Core.config import settings
+from app.Services.SearchService import SearchService
+from app.Services.TicketService import TicketService
+
+
+def _ranking(name, ids):
+    rows = [select(literal(item_id).label("id"), literal(rank).label("rank")) for rank, item_id in enumerate(ids, start=1)]
+    return union_all(*rows).cte(name)
+
+
+@pytest.fixture
+def fuse(monkeypatch):
+    """
+    Executa SearchService._fuse em SQLite (FULL JOIN requer SQLite >= 3.39).
+    """
+    monkeypatch.setattr(settings, "SEARCH_RRF_K", 60)
+    engine = create_engine("sqlite://")
+
+    def run(keyword_ids, vector_ids, limit=10):
+        fused = SearchService._fuse(_ranking("keyword", keyword_ids), _ranking("vector", vector_ids), "fused", limit)
+        with engine.connect() as conn:
+            return conn.execute(select(fused)).all()
+
+    yield run
+    engine.dispose()
+
+
+def test_items_in_both_rankings_win(fuse):
+    rows = fuse(keyword_ids=[10, 20, 30], vector_ids=[30, 40, 10])
+
+    assert [row.id for row in rows][:2] == [10, 30]
+    top = rows[0]
+    assert top.score == pytest.approx(1 / 61 + 1 / 63)
+    assert (top.keyword_rank, top.vector_rank) == (1, 3)
+
+
+def test_items_from_a_single_ranking_are_kept(fuse):
+    rows = {row.id: row for row in fuse(keyword_ids=[1], vector_ids=[2])}
+
+    assert rows[1].vector_rank is None and rows[1].score == pytest.approx(1 / 61)
+    assert rows[2].keyword_rank is None
+
+
+def test_ties_are_broken_by_id_and_limit_applies(fuse):
+    rows = fuse(keyword_ids=[7, 3], vector_ids=[3, 7], limit=1)
+
+    assert [row.id for row in rows] == [3]
+
+
+def test_invalid_scope_and_text_config_are_rejected(monkeypatch):
+    with pytest.raises(ValueError):
+        SearchService._statement("erro 42", [0.0], "everything", None, None, 10)
+
+    monkeypatch.setattr(settings, "SEARCH_TEXT_CONFIG", "portuguese'; --")
+    with pytest.raises(ValueError):
+        SearchService._statement("erro 42", [0.0], "all", None, None, 10)
+
+
+def test_json_columns_are_parsed_for_both_drivers():
+    row = SimpleNamespace(_mapping={"tickets": '[{"ticket_id": 1}]', "chunks": [{"context_id": 2}]})
+
+    assert SearchService._parse(row) == {"tickets": [{"ticket_id": 1}], "chunks": [{"context_id": 2}]}
+
+
+def test_keyword_match_finds_ticket_by_error_code(db, user, category):
+    target = TicketService.create_ticket(db, "Falha ERR-4471 no faturamento", "O sistema mostra ERR-4471 ao emitir nota.",
+                                         user.id, category.id, index_now=True)
+    TicketService.create_ticket(db, "Teclado sem resposta", "Algumas teclas não funcionam.", user.id, category.id,
+                                index_now=True)
+
+    results = SearchService.search(db, "ERR-4471", scope="tickets", limit=5)
+
+    assert results["tickets"][0]["ticket_id"] == target.id
+    assert results["tickets"][0]["keyword_rank"] == 1
@@ -0,0 +1,60 @@
+"""
+Leitura dos arquivos de importação (TicketImportService.iter_records), sem banco.
+"""
+import csv
+import io
+
+from app.Services.TicketImportService import ENCODING_ERROR, TicketImportService
+
+
+def _records(data: bytes, fmt: str):
+    return list(TicketImportService.iter_records(io.BytesIO(data), fmt))
+
+
+def test_ndjson_reports_bad_lines_and_keeps_going():
+    records = _records(b'{"title": "a"}\n\n{oops\n[1]\n{"title": "b"}\n', "ndjson")
+
+    assert [(line, record, error is not None) for line, record, error in records] == [
+        (1, {"title": "a"}, False), (3, None, True), (4, None, True), (5, {"title": "b"}, False),
+    ]
+
+
+def test_ndjson_invalid_utf8_stops_with_line_number():
+    records = _records(b'{"title": "a"}\n{"title": "\xff"}\n{"title": "c"}\n', "ndjson")
+
+    # O decodificador lê em blocos: o erro pode surgir antes de a primeira linha ser entregue
+    line, record, error = records[-1]
+    assert record is None and error == ENCODING_ERROR
+    assert line in (1, 2)
+    assert all(error is None for _, _, error in records[:-1])
+
+
+def test_csv_strips_empty_fields_and_tracks_lines():
+    records = _records(b"\xef\xbb\xbftitle,description\nImpressora,\nRede,Cabo solto\n", "csv")
+
+    assert records == [(2, {"title": "Impressora"}, None), (3, {"title": "Rede", "description": "Cabo solto"}, None)]
+
+
+def test_malformed_csv_stops_with_line_number():
+    # Campo acima de csv.field_size_limit() (ex.: aspas não fechadas engolindo o resto do arquivo)
+    oversized = b'"' + b"x" * (csv.field_size_limit() + 1)
+    records = _records(b"title,description\nok,linha boa\nnova," + oversized + b"\nfim,fim\n", "csv")
+
+    assert records[0] == (2, {"title": "ok", "description": "linha boa"}, None)
+    line, record, error = records[-1]
+    assert (line, record) == (3, None)
+    assert error.startswith("CSV inválido")
+    assert len(records) == 2
+
+
+def test_csv_invalid_utf8_stops_cleanly():
+    records = _records(b"title\nok\n\xff\xfe\n", "csv")
+
+    assert records[-1][1:] == (None, ENCODING_ERROR)
+
+
+def test_stream_is_left_open_for_the_caller():
+    stream = io.BytesIO(b'{"title": "a"}\n')
+    list(TicketImportService.iter_records(stream, "ndjson"))
+
+    assert not stream.closed
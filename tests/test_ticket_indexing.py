@@ -0,0 +1,25 @@
+"""
+Indexação de tickets: reprocessar o mesmo job não pode duplicar os chunks do ticket.
+"""
+from sqlalchemy import func, select
+
+from app.Database.models import Context
+from app.Services.EmbeddingQueueService import EmbeddingQueueService
+from app.Services.TicketService import TicketService
+
+
+def _context_rows(db, ticket_id):
+    return db.scalar(select(func.count()).select_from(Context).where(Context.ticket_id == ticket_id))
+
+
+def test_replayed_ticket_job_does_not_duplicate_chunks(db, user, category):
+    ticket = TicketService.create_ticket(db, "VPN cai", "A VPN desconecta a cada dez minutos.", user.id, category.id,
+                                         index_now=True)
+    indexed = _context_rows(db, ticket.id)
+    assert indexed > 0
+
+    job = {"type": "ticket", "ticket_id": ticket.id, "id": "replay", "attempts": 0}
+    EmbeddingQueueService.process_jobs(db, [job])
+    EmbeddingQueueService.process_jobs(db, [job])
+
+    assert _context_rows(db, ticket.id) == indexed
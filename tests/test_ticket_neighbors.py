@@ -0,0 +1,50 @@
+"""
+Vizinhos pré-calculados (ticket_neighbors): gravados na indexação e lidos pela chave primária.
+Os embeddings vêm do servidor falso da OpenAI: textos iguais geram vetores iguais.
+"""
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+
+from app.Services.TicketNeighborService import TicketNeighborService
+from app.Services.TicketService import TicketService
+
+DUPLICATE = ("Impressora do financeiro sem papel", "A impressora do terceiro andar acusa falta de papel.")
+
+
+def _create(db, user, category, title, description):
+    return TicketService.create_ticket(db, title, description, user.id, category.id, index_now=True)
+
+
+def test_open_filter_keeps_neighbors_without_status():
+    db = mock.Mock()
+    db.scalars.return_value = []
+
+    TicketNeighborService.get_similar(db, 1, status="open")
+
+    sql = str(db.scalars.call_args[0][0].compile(dialect=postgresql.dialect()))
+    assert "neighbor_status NOT IN" in sql and "neighbor_status IS NULL" in sql
+
+
+def test_identical_tickets_become_symmetric_neighbors(db, user, category):
+    first = _create(db, user, category, *DUPLICATE)
+    other = _create(db, user, category, "Senha expirada", "Não consigo entrar no e-mail desde ontem.")
+    second = _create(db, user, category, *DUPLICATE)
+
+    similar = TicketNeighborService.get_similar(db, second.id)
+    assert similar[0]["ticket_id"] == first.id
+    assert similar[0]["similarity"] > 0.99
+    assert other.id not in [item["ticket_id"] for item in similar]
+    # O ticket antigo ganha o novo na sua lista sem ser reindexado
+    assert second.id in [item["ticket_id"] for item in TicketNeighborService.get_similar(db, first.id)]
+
+
+def test_closed_duplicates_are_not_reported(db, user, category):
+    first = _create(db, user, category, *DUPLICATE)
+    second = _create(db, user, category, *DUPLICATE)
+    assert first.id in [item["ticket_id"] for item in TicketNeighborService.get_possible_duplicates(db, second.id)]
+
+    TicketService.update_ticket(db, first.id, status="closed")
+
+    assert first.id not in [item["ticket_id"] for item in TicketNeighborService.get_possible_duplicates(db, second.id)]
+    assert first.id in [item["ticket_id"] for item in TicketNeighborService.get_similar(db, second.id, status="closed")]
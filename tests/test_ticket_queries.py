@@ -0,0 +1,72 @@
+"""
+Guardas de regressão do número de commits e queries por operação (track_db_stats).
+"""
+from app.Database.db import track_db_stats
+from app.Services.TicketService import TicketService
+
+
+def _create_ticket(db, user, category):
+    return TicketService.create_ticket(db, "Impressora não imprime", "A fila trava no primeiro job.", user.id, category.id)
+
+
+def test_create_ticket_commits_once(db, user, category):
+    with track_db_stats() as stats:
+        ticket = _create_ticket(db, user, category)
+
+    assert ticket.id is not None
+    assert stats.commits == 1
+
+
+def test_update_ticket_commits_once(db, user, category):
+    ticket = _create_ticket(db, user, category)
+
+    with track_db_stats() as stats:
+        TicketService.update_ticket(db, ticket.id, status="in_progress", priority="high", assigned_to=user.id)
+
+    assert stats.commits == 1
+
+
+def test_update_ticket_without_changes_commits_once(db, user, category):
+    ticket = _create_ticket(db, user, category)
+
+    with track_db_stats() as stats:
+        TicketService.update_ticket(db, ticket.id, status=ticket.status)
+
+    assert stats.commits == 1
+
+
+def test_ticket_detail_is_three_queries(db, user, category):
+    ticket = _create_ticket(db, user, category)
+    db.expunge_all()
+
+    with track_db_stats() as stats:
+        detail = TicketService.get_ticket_detail(db, ticket.id)
+
+    assert detail["ticket"].id == ticket.id
+    assert stats.queries == 3
+    assert stats.commits == 0
+
+
+def test_ticket_detail_queries_do_not_grow_with_conversation(db, user, category):
+    ticket = _create_ticket(db, user, category)
+    for i in range(12):
+        TicketService.add_message(db, ticket.id, user.id, f"Mensagem {i}")
+    db.expunge_all()
+
+    with track_db_stats() as stats:
+        detail = TicketService.get_ticket_detail(db, ticket.id, messages_limit=5, history_limit=5)
+        # Atributos carregados por joinedload não podem disparar lazy loads
+        senders = [message.sender.full_name for message in detail["messages"]["items"]]
+        performers = [event.performer.full_name for event in detail["history"]["items"]]
+        _ = (detail["ticket"].user, detail["ticket"].assigned_to_user, detail["ticket"].category)
+
+    assert len(senders) == 5 and len(performers) == 5
+    assert detail["messages"]["next_cursor"] is not None
+    assert stats.queries == 3
+
+
+def test_missing_ticket_detail_is_one_query(db):
+    with track_db_stats() as stats:
+        assert TicketService.get_ticket_detail(db, 0) is None
+
+    assert stats.queries == 1
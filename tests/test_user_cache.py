@@ -0,0 +1,117 @@
+"""
+Cache do usuário autenticado e ordem de resolução em get_current_user.
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.API import auth_routes
+from app.Core.config import settings
+from app.Services.AuthService import AuthService
+from app.Services.UserPrincipalCache import UserPrincipal, UserPrincipalCache
+
+
+def _principal(user_id=1, role="user"):
+    return UserPrincipal(id=user_id, full_name="Ana", email=f"u{user_id}@test.local", role=role, is_active=True)
+
+
+def _cache(**kwargs):
+    return UserPrincipalCache(**{"max_entries": 10, "ttl_seconds": 60, "local_ttl_seconds": 10, **kwargs})
+
+
+def test_local_tier_hits_and_evicts_least_recently_used():
+    cache = _cache(max_entries=2)
+    cache.set(_principal(1))
+    cache.set(_principal(2))
+    cache.get(1)
+    cache.set(_principal(3))
+
+    assert cache.get(1) == _principal(1)
+    assert cache.get(2) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_local_entries_expire(monkeypatch):
+    cache = _cache()
+    cache.set(_principal(1))
+    expired = time.monotonic() + 11
+    monkeypatch.setattr("app.Services.UserPrincipalCache.time.monotonic", lambda: expired)
+
+    assert cache.get(1) is None
+
+
+def test_invalidate_forgets_local_entry():
+    cache = _cache()
+    cache.set(_principal(1))
+
+    cache.invalidate(1)
+
+    assert cache.get(1) is None
+
+
+def test_redis_tier_is_shared_and_invalidated_across_workers(redis_client):
+    writer, reader = _cache(), _cache()
+    writer.set(_principal(1, role="admin"))
+    assert 0 < redis_client.ttl("auth:principal:1") <= 60
+
+    assert reader.get(1).role == "admin"
+
+    try:
+        writer.invalidate(1)
+        # O aviso chega por pub/sub; a entrada local do outro worker some sem esperar o TTL
+        deadline = time.monotonic() + 3
+        while 1 in reader._entries and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert reader.get(1) is None
+    finally:
+        reader._subscriber.stop()
+        reader._subscriber.join(timeout=3)
+
+
+@pytest.fixture
+def resolve(monkeypatch):
+    """
+    get_current_user com banco substituído; retorna (função, consultas ao banco).
+    """
+    lookups = []
+
+    def get_user_by_id(db, user_id):
+        lookups.append(user_id)
+        return SimpleNamespace(id=user_id, full_name="Ana", email="ana@test.local", role="user", is_active=True)
+
+    monkeypatch.setattr(auth_routes.UserService, "get_user_by_id", staticmethod(get_user_by_id))
+    monkeypatch.setattr(auth_routes, "user_cache", _cache())
+    monkeypatch.setattr(settings, "USER_CACHE_ENABLED", True)
+    return (lambda claims: auth_routes.get_current_user(token=claims, db=None)), lookups
+
+
+def test_database_is_queried_once_then_cached(resolve):
+    get_current_user, lookups = resolve
+
+    first = get_current_user({"sub": "7"})
+    second = get_current_user({"sub": "7"})
+
+    assert first == second and first.id == 7
+    assert lookups == [7]
+
+
+def test_recent_token_claims_skip_cache_and_database(resolve, monkeypatch):
+    get_current_user, lookups = resolve
+    monkeypatch.setattr(settings, "AUTH_TRUST_TOKEN_CLAIMS_SECONDS", 30)
+    user = SimpleNamespace(id=5, full_name="Bia", email="bia@test.local", role="agent", is_active=True)
+    claims = {**AuthService.principal_claims(user), "iat": time.time()}
+
+    assert get_current_user(claims) == UserPrincipal(5, "Bia", "bia@test.local", "agent", True)
+    assert lookups == []
+
+
+def test_old_token_claims_are_not_trusted(resolve, monkeypatch):
+    get_current_user, lookups = resolve
+    monkeypatch.setattr(settings, "AUTH_TRUST_TOKEN_CLAIMS_SECONDS", 30)
+    user = SimpleNamespace(id=5, full_name="Bia", email="bia@test.local", role="agent", is_active=True)
+
+    principal = get_current_user({**AuthService.principal_claims(user), "iat": time.time() - 60})
+
+    assert principal.role == "user"  # veio do banco, não do token
+    assert lookups == [5]
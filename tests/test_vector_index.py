@@ -0,0 +1,93 @@
+"""
+Índice vetorial em mmap (MmapVectorIndex): top-k, tombstones, compactação e float16.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from app.Core.config import settings
+from app.Services import VectorIndexService as vector_module
+from app.Services.VectorIndexService import MmapVectorIndex
+
+DIM = 16
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def _expected_top(vectors, ids, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [int(ids[pos]) for pos in np.argsort(-scores)[:k]]
+
+
+@pytest.fixture(params=["float32", "float16"])
+def index(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_MMAP_DTYPE", request.param)
+    return MmapVectorIndex(str(tmp_path / "category_1"))
+
+
+def test_search_returns_top_k_by_cosine(index):
+    vectors, ids = _vectors(200), np.arange(1000, 1200)
+    index.replace_all(ids.tolist(), vectors.tolist())
+    query = _vectors(1, seed=1)[0]
+
+    hits = index.search(query.tolist(), 5)
+
+    assert [cid for cid, _ in hits] == _expected_top(vectors, ids, query, 5)
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
+
+
+def test_float16_search_converts_in_small_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_MMAP_DTYPE", "float16")
+    monkeypatch.setattr(vector_module, "CONVERT_BLOCK_BYTES", DIM * 4 * 7)  # blocos de 7 linhas
+    index = MmapVectorIndex(str(tmp_path / "category_1"))
+    vectors, ids = _vectors(50), np.arange(50)
+    index.replace_all(ids.tolist(), vectors.tolist())
+    query = _vectors(1, seed=2)[0]
+
+    assert [cid for cid, _ in index.search(query.tolist(), 10)] == _expected_top(vectors, ids, query, 10)
+
+
+def test_added_rows_are_searchable_and_removed_rows_are_not(index):
+    index.replace_all([1, 2], _vectors(2).tolist())
+    query = _vectors(1, seed=3)[0]
+    index.add([3], [query.tolist()])
+
+    assert index.search(query.tolist(), 1)[0][0] == 3
+
+    index.remove([3])
+    assert 3 not in [cid for cid, _ in index.search(query.tolist(), 3)]
+
+
+def test_compaction_keeps_live_rows(index, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_MMAP_COMPACT_RATIO", 0.5)
+    vectors = _vectors(4)
+    index.replace_all([1, 2, 3, 4], vectors.tolist())
+
+    index.remove([1, 2])
+
+    assert sorted(cid for cid, _ in index.search(vectors[2].tolist(), 10)) == [3, 4]
+    assert index._current_gen() == 1
+
+
+def test_add_without_index_is_a_no_op(index):
+    index.add([1], _vectors(1).tolist())
+
+    assert not index.exists()
+    assert index.search(_vectors(1)[0].tolist(), 3) is None
+
+
+def test_search_returns_none_when_files_disappear(index):
+    index.replace_all([1], _vectors(1).tolist())
+    os.unlink(index._file("ids", index._current_gen()))
+
+    assert index.search(_vectors(1)[0].tolist(), 3) is None
+
+
+def test_search_with_zero_top_k_is_empty(index):
+    index.replace_all([1], _vectors(1).tolist())
+
+    assert index.search(_vectors(1)[0].tolist(), 0) == []
@@ -0,0 +1,63 @@
+"""
+Índice compacto (halfvec / binary) com reordenação exata dos candidatos.
+"""
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.Core.config import settings
+from app.Database.models import Context
+from app.Database.vector_index import (
+    HNSW_MAX_EF_SEARCH, build_vector_index, configured_index_name, rerank_candidates, similarity_statement,
+)
+
+QUERY = [0.1] * Context.embedding.type.dim
+
+
+def _sql(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+@pytest.fixture(params=["halfvec", "binary"])
+def quantization(request, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_QUANTIZATION", request.param)
+    return request.param
+
+
+def test_full_vectors_need_no_extra_candidates():
+    assert rerank_candidates(10) == 10
+
+
+def test_candidates_grow_with_rerank_factor_within_ef_search_limit(quantization, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_RERANK_FACTOR", 4)
+
+    assert rerank_candidates(10) == 40
+    assert rerank_candidates(400) == HNSW_MAX_EF_SEARCH
+    assert rerank_candidates(2000) == 2000  # nunca menos que o pedido
+
+
+def test_quantized_search_reranks_by_exact_distance(quantization, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_RERANK_FACTOR", 4)
+    statement = similarity_statement(Context.embedding, [Context.ticket_id], QUERY, 5, Context.category_id == 1)
+    sql = _sql(statement)
+
+    inner, outer = sql.split(") AS anon_1")
+    assert ("AS HALFVEC(" in inner) if quantization == "halfvec" else ("binary_quantize" in inner and "<~>" in inner)
+    assert "ORDER BY anon_1.exact_embedding <=>" in outer
+    # 20 candidatos do índice compacto, 5 após a reordenação exata
+    limits = [value for value in statement.compile(dialect=postgresql.dialect()).params.values() if isinstance(value, int)]
+    assert sorted(limits)[-2:] == [5, 20]
+
+
+def test_index_uses_quantized_expression_and_ops(quantization):
+    index = build_vector_index(Context.embedding)
+    ops = {"halfvec": "halfvec_cosine_ops", "binary": "bit_hamming_ops"}[quantization]
+
+    assert index.name == configured_index_name() == f"ix_context_embedding_{quantization}_hnsw"
+    assert index.dialect_options["postgresql"]["ops"] == {"embedding": ops}
+
+
+def test_unknown_quantization_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_QUANTIZATION", "int8")
+
+    with pytest.raises(ValueError):
+        rerank_candidates(10)
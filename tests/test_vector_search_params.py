@@ -0,0 +1,66 @@
+"""
+Parâmetros de busca do índice ANN (SET LOCAL) e forma das consultas de similaridade.
+"""
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.Core.config import settings
+from app.Database.models import Context
+from app.Database.vector_index import HNSW_MAX_EF_SEARCH, search_param_statements, similarity_statement
+
+QUERY = [0.1] * Context.embedding.type.dim
+
+
+def _sql(statements):
+    return [str(statement) for statement in statements]
+
+
+def test_iterative_scan_is_on_by_default():
+    assert _sql(search_param_statements(10))[-1] == "SET LOCAL hnsw.iterative_scan = relaxed_order"
+
+
+def test_ef_search_covers_limit_and_is_clamped(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_HNSW_EF_SEARCH", 40)
+
+    assert _sql(search_param_statements(100))[0] == "SET LOCAL hnsw.ef_search = 100"
+    assert _sql(search_param_statements(5000))[0] == f"SET LOCAL hnsw.ef_search = {HNSW_MAX_EF_SEARCH}"
+
+
+def test_ivfflat_uses_probes(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_TYPE", "ivfflat")
+
+    assert _sql(search_param_statements(10)) == [
+        f"SET LOCAL ivfflat.probes = {settings.VECTOR_IVFFLAT_PROBES}",
+        "SET LOCAL ivfflat.iterative_scan = relaxed_order",
+    ]
+
+
+@pytest.mark.parametrize("mode, index_type", [("bogus; DROP TABLE x", "hnsw"), ("strict_order", "ivfflat")])
+def test_invalid_iterative_scan_is_rejected(monkeypatch, mode, index_type):
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", mode)
+    monkeypatch.setattr(settings, "VECTOR_INDEX_TYPE", index_type)
+
+    with pytest.raises(ValueError):
+        search_param_statements(10)
+
+
+def test_iterative_scan_can_be_disabled_for_old_pgvector(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", None)
+
+    assert all("iterative_scan" not in sql for sql in _sql(search_param_statements(10)))
+
+
+def test_relaxed_order_results_are_reordered():
+    statement = similarity_statement(Context.embedding, [Context.ticket_id], QUERY, 5, Context.category_id == 1)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+
+    # Ordem aproximada do índice dentro da subconsulta, ordem exata por fora
+    assert sql.count("ORDER BY") == 2
+    assert sql.rstrip().endswith("ORDER BY anon_1.similarity DESC")
+
+
+def test_strict_order_keeps_single_query(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", "strict_order")
+    statement = similarity_statement(Context.embedding, [Context.ticket_id], QUERY, 5)
+
+    assert str(statement.compile(dialect=postgresql.dialect())).count("ORDER BY") == 1
@@ -0,0 +1,13 @@
+import argparse
+import logging
+from app.Database.db import SessionLocal
+from app.Services.EmbeddingQueueService import EmbeddingWorker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker da fila de embeddings")
+    parser.add_argument("--name", default=None, help="identificador do worker (padrão: hostname)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    EmbeddingWorker(SessionLocal, name=args.name).run_forever()